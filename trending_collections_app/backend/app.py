@@ -15,30 +15,158 @@ Date: [16/06/25]
 """
 
 import os
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-from models import db, User, TrendingCollection
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
+import database
+from assets import AssetManifest
+from compression import Compressor
+from health import Diagnostics, ReadinessCheck, static_report
+from metrics import Metrics
+from profiler import SQLProfiler
+from models import db, User, TrendingCollection, ReformulatedQuery, normalize_query
+from migrations import LATEST_VERSION, current_version as schema_version, upgrade as upgrade_schema
+from routing import REPLICA_BIND, ReadRouter
+import bulk
+import changes
+import export
+import rollups
+import search
+import versioning
+from response_cache import ResponseCache, cached_response, store_response
+from serializers import (QUERIES_FIELD, FieldsError, JSONBackend, parse_fields, reformulated_queries, serialize_trends,
+                         trend_columns)
+from auth_cache import AuthCache, current_user_version, load_user_record, watch_user_changes
+from hashing import PASSWORD_HASH_METHOD, HashingBusy, HashingPool
+from werkzeug.security import check_password_hash, generate_password_hash
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request
 from flask_jwt_extended.exceptions import NoAuthorizationError, InvalidHeaderError, JWTDecodeError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 import re
+import time
+from urllib.parse import urlencode
+from pagination import CursorError, SORT_ORDERS, apply_keyset, decode_cursor, encode_cursor, parse_limit
 
-# Initialize Flask application with static folder pointing to the React build
-app = Flask(__name__, static_folder='static', static_url_path='')
-CORS(app)  # Enable Cross-Origin Resource Sharing
+# Initialize Flask application. The React build in static/ is served by the
+# catch-all route from an asset manifest (see assets.py), so Flask's own
+# static route is disabled
+app = Flask(__name__, static_folder=None)
+STATIC_FOLDER = os.path.join(app.root_path, 'static')
+CORS(app, expose_headers=['X-Next-Cursor', 'Link'])  # Enable Cross-Origin Resource Sharing
 
 # Application Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'  # SQLite database path
+app.config['SQLALCHEMY_DATABASE_URI'] = database.database_uri()  # DATABASE_URL, else the SQLite file app.db
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])  # Pooling
+if database.replica_uri():
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: database.replica_uri()}  # Read replica, see routing.py
+app.config['HEALTH_READY_TTL'] = float(os.environ.get('HEALTH_READY_TTL', 5))  # Seconds a readiness DB ping is reused
+app.config['SQL_PROFILING_HEADERS'] = os.environ.get('SQL_PROFILING_HEADERS', '').lower() in ('1', 'true')  # X-DB-Queries etc.
+app.config['SQL_SLOW_QUERY_MS'] = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+app.config['SQL_SLOW_QUERY_LOG'] = os.environ.get('SQL_SLOW_QUERY_LOG')  # Rotating log file; unset disables the log
+app.config['SQL_SLOW_QUERY_LOG_PARAMETERS'] = os.environ.get('SQL_SLOW_QUERY_LOG_PARAMETERS', '').lower() in ('1', 'true')  # Never for the user table
+app.config['READ_YOUR_WRITES_SECONDS'] = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))  # Primary-only reads after a write
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key')  # JWT secret key
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False    # Tokens don't expire (for development)
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))  # 0 disables the cache
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['RESPONSE_CACHE_TTL'] = float(os.environ.get('RESPONSE_CACHE_TTL', 60))  # Seconds
+app.config['AUTH_CACHE_MAX_ENTRIES'] = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 1024))  # 0 disables the cache
+app.config['HASHING_POOL_WORKERS'] = int(os.environ.get('HASHING_POOL_WORKERS', 2))  # Concurrent password hashes
+app.config['HASHING_POOL_MAX_QUEUE'] = int(os.environ.get('HASHING_POOL_MAX_QUEUE', 16))  # Waiting hashes before 503
+app.config['HASHING_RETRY_AFTER'] = int(os.environ.get('HASHING_RETRY_AFTER', 1))  # Seconds, sent with the 503
+app.config['JSON_BACKEND'] = os.environ.get('JSON_BACKEND', 'auto')  # orjson if installed, else stdlib
+app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # Smaller bodies are sent as they are
+app.config['COMPRESSION_LEVEL'] = int(os.environ.get('COMPRESSION_LEVEL', 6))  # gzip level 1-9; 0 disables compression
+app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))  # 0-11, when brotli is installed
 db.init_app(app)  # Initialize database with app
+router = ReadRouter(app, db)  # Send read-only endpoints to the replica, if any
+
+# Per-worker cache of user records, validated against the shared user
+# version before every hit (see auth_cache.py)
+auth_cache = AuthCache(max_entries=app.config['AUTH_CACHE_MAX_ENTRIES'])
+watch_user_changes(db.session, auth_cache)
 jwt = JWTManager(app)  # Initialize JWT manager
 
+# Password hashing runs on its own bounded pool so login storms cannot
+# starve the request workers (see hashing.py)
+hashing_pool = HashingPool(
+    max_workers=app.config['HASHING_POOL_WORKERS'],
+    max_queue=app.config['HASHING_POOL_MAX_QUEUE']
+)
+
+# Per-worker cache of serialized trend responses, validated against the
+# shared collection version before every hit (see response_cache.py)
+response_cache = ResponseCache(
+    max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+    ttl=app.config['RESPONSE_CACHE_TTL']
+)
+
+# Encoder for trend payloads (see serializers.py)
+json_backend = JSONBackend(app.config['JSON_BACKEND'])
+
+# Per-request SQL accounting, N+1 warnings and slow query log (see profiler.py)
+profiler = SQLProfiler(app)
+
+# Prometheus metrics at /metrics, aggregated across gunicorn workers when
+# PROMETHEUS_MULTIPROC_DIR is set (see metrics.py and gunicorn.conf.py)
+metrics = Metrics(app, caches={'response': response_cache, 'auth': auth_cache}, hashing_pool=hashing_pool)
+
+# gzip/brotli compression of API responses, negotiated from Accept-Encoding
+# (see compression.py). Registered after the metrics hook so it runs before
+# it, and response sizes are recorded as sent
+compressor = Compressor(app)
+
+# Files of the React build, indexed once at startup; index.html is kept in memory
+asset_manifest = AssetManifest(STATIC_FOLDER, fallback_page=os.path.join(app.root_path, 'static_fallback', 'index.html'))
+
 # Email validation pattern
 EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
-# Create database tables if they don't exist
+# Largest number of rows accepted by one POST /api/trends/bulk request
+BULK_MAX_ROWS = 10000
+
+# Columns GET /api/trends can be sorted by (id is always the tie-breaker)
+TREND_SORT_FIELDS = ('id', 'trend_topic', 'created_at', 'updated_at')
+
+# Fields returned by the legacy /api/test-trends endpoint
+TEST_TREND_FIELDS = ('id', 'original_query', 'trend_topic', 'description', 'reformulated_queries', 'category')
+
+# Create database tables if they don't exist, then bring existing databases
+# up to the current schema (indexes etc.) - see migrations.py
 with app.app_context():
     db.create_all()
+    upgrade_schema(db.engine, verbose=True)
+
+# Probes: readiness reuses one DB ping per HEALTH_READY_TTL, diagnostics
+# are built once here and then only on request (see health.py)
+readiness = ReadinessCheck(ttl=app.config['HEALTH_READY_TTL'])
+
+def build_diagnostics():
+    """Heavy diagnostic report: static build contents and database state"""
+    report = {'static': static_report(STATIC_FOLDER, asset_manifest), 'json_backend': json_backend.name}
+    try:
+        with app.app_context():
+            report['database'] = {
+                'ok': True,
+                'dialect': db.engine.dialect.name,
+                'schema_version': schema_version(db.engine),
+                'latest_schema_version': LATEST_VERSION,
+                'replica_configured': 'SQLALCHEMY_BINDS' in app.config
+            }
+    except Exception as e:
+        print(f"Error in build_diagnostics: {str(e)}")
+        report['database'] = {'ok': False, 'error': str(e)}
+    return report
+
+diagnostics = Diagnostics(build_diagnostics)
+diagnostics.get()
+
+def hashing_busy_response():
+    """503 returned when the password hashing pool refuses more work"""
+    response = jsonify({'error': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = str(app.config['HASHING_RETRY_AFTER'])
+    return response, 503
 
 # API Routes
 @app.route('/api/register', methods=['POST'])
@@ -59,6 +187,7 @@ def register():
     Returns:
         201: User registered successfully
         400: Email already registered or invalid email format
+        503: Password hashing saturated (see Retry-After)
     """
     data = request.get_json()
     
@@ -70,9 +199,14 @@ def register():
     if User.query.filter_by(email=data['email']).first():
         return jsonify({'error': 'Email already registered'}), 400
     
+    # Hash the password on the hashing pool, off the request worker
+    try:
+        password_hash = hashing_pool.submit(generate_password_hash, data['password'], PASSWORD_HASH_METHOD)
+    except HashingBusy:
+        return hashing_busy_response()
+    
     # Create new user
-    user = User(email=data['email'])
-    user.set_password(data['password'])
+    user = User(email=data['email'], password_hash=password_hash)
     db.session.add(user)
     db.session.commit()
     
@@ -96,6 +230,7 @@ def login():
         200: {token, is_admin} - Authentication successful
         400: Invalid email format
         401: Invalid credentials
+        503: Password hashing saturated (see Retry-After)
     """
     data = request.get_json()
     
@@ -105,10 +240,24 @@ def login():
     
     user = User.query.filter_by(email=data['email']).first()
     
-    # Verify user credentials
-    if user and user.check_password(data['password']):
-        # Create JWT token with user email as identity
-        access_token = create_access_token(identity=user.email)
+    # Verify user credentials on the hashing pool
+    try:
+        valid = bool(user) and hashing_pool.submit(check_password_hash, user.password_hash, data['password'])
+    except HashingBusy:
+        return hashing_busy_response()
+    
+    if valid:
+        # Transparently upgrade hashes made with an older work factor. Best
+        # effort: a busy pool just leaves it for the next login
+        if user.needs_rehash():
+            try:
+                user.password_hash = hashing_pool.submit(generate_password_hash, data['password'], PASSWORD_HASH_METHOD)
+                db.session.commit()
+            except HashingBusy:
+                pass
+        
+        # Create JWT token with user email as identity and the role as a claim
+        access_token = create_access_token(identity=user.email, additional_claims={'is_admin': user.is_admin})
         return jsonify({
             'token': access_token,
             'is_admin': user.is_admin
@@ -116,48 +265,406 @@ def login():
     
     return jsonify({'error': 'Invalid credentials'}), 401
 
+def admin_required_error(message):
+    """
+    Check that the current user is an admin, reading only the shared user
+    version once this worker has cached the user.
+    
+    The role comes from the token's is_admin claim and is confirmed against
+    the cached user record, which is dropped as soon as any user's role
+    changes in any process, so a token issued before the user's role changed
+    is rejected and the client has to log in again. Tokens issued before role
+    claims existed fall back to the record alone.
+    
+    Parameters:
+        message (str): Error returned when the user is not an admin
+        
+    Returns:
+        None if the user is an admin, otherwise an error response
+    """
+    user = auth_cache.get_user(get_jwt_identity(), load_user_record, current_user_version())
+    if not user:
+        return jsonify({'error': message}), 403
+    
+    claims = get_jwt()
+    if 'is_admin' in claims and claims['is_admin'] != user.is_admin:
+        return jsonify({'error': 'Your role has changed, please log in again'}), 401
+    
+    if not user.is_admin:
+        return jsonify({'error': message}), 403
+    return None
+
 @app.route('/api/trends', methods=['GET'])
 @jwt_required()
+@router.replica_read
 def get_trends():
+    """
+    List Trends Endpoint
+    
+    Returns one page of trending collections. Filtering, sorting and paging
+    are all evaluated in SQL using keyset (cursor) pagination, so the cost of
+    a page stays flat regardless of how many collections exist.
+    
+    Query parameters:
+        limit (int): Page size (default 100, max 500)
+        cursor (str): Token taken from a previous page's X-Next-Cursor header
+        original_query (str): Only return trends for this original query
+        category (str): Only return trends in this category
+        reformulated_query (str): Only return trends containing this
+            reformulated query (case-insensitive exact match)
+        sort (str): id (default), trend_topic, created_at or updated_at
+        order (str): asc (default) or desc
+        fields (str): Comma-separated subset of the trend fields to return,
+            e.g. id,trend_topic,original_query,category. Only those columns
+            are selected, and reformulated queries are only looked up when
+            requested
+    
+    Responses carry an ETag and Last-Modified derived from the collection
+    version, so revalidation of an unchanged collection returns a 304
+    without reading any trend rows.
+    
+    Returns:
+        200: List of trends. X-Next-Cursor and Link headers are set when
+             another page is available
+        304: Collection unchanged since the client's If-None-Match ETag
+        400: Invalid query parameter or cursor
+    """
     try:
         current_user = get_jwt_identity()
-        trends = TrendingCollection.query.all()
-        return jsonify([{
-            'id': trend.id,
-            'original_query': trend.original_query,
-            'trend_topic': trend.trend_topic,
-            'description': trend.description,
-            'reformulated_queries': trend.reformulated_queries,
-            'category': trend.category,
-            'created_at': trend.created_at.isoformat() if trend.created_at else None,
-            'updated_at': trend.updated_at.isoformat() if trend.updated_at else None
-        } for trend in trends])
+        sort_field = request.args.get('sort', 'id')
+        order = request.args.get('order', 'asc').lower()
+        if sort_field not in TREND_SORT_FIELDS:
+            return jsonify({'error': f"sort must be one of: {', '.join(TREND_SORT_FIELDS)}"}), 400
+        if order not in SORT_ORDERS:
+            return jsonify({'error': 'order must be asc or desc'}), 400
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor, sort_field, order, ('created_at', 'updated_at')) if cursor else None
+            fields = parse_fields(request.args.get('fields'))
+        except (CursorError, FieldsError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Read the version before the rows: if a write lands in between, the
+        # ETag is older than the data and the client simply refetches
+        version, last_modified = versioning.current_version()
+        etag = versioning.make_etag(version)
+        not_modified = versioning.not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        cache_key = ('trends', sort_field, order, limit, cursor, fields, request.args.get('original_query'),
+                     request.args.get('category'), request.args.get('reformulated_query'))
+        cached = response_cache.get(cache_key, version)
+        if cached:
+            return versioning.set_validators(cached_response(response_cache, cached), etag, last_modified)
+        
+        # Plain column tuples rather than ORM instances (see serializers.py),
+        # only for the requested fields. The sort value goes last: the next
+        # cursor needs it even when the client did not ask for that field
+        sort_column = getattr(TrendingCollection, sort_field)
+        query = db.session.query(*trend_columns(db.session.get_bind().dialect, fields),
+                                 sort_column.label('cursor_value'))
+        if request.args.get('original_query'):
+            query = query.filter(TrendingCollection.original_query == request.args['original_query'])
+        if request.args.get('category'):
+            query = query.filter(TrendingCollection.category == request.args['category'])
+        if request.args.get('reformulated_query'):
+            # Index lookup on the normalized text rather than a LIKE scan
+            matching_ids = db.session.query(ReformulatedQuery.trend_id).filter(
+                ReformulatedQuery.normalized_text == normalize_query(request.args['reformulated_query']))
+            query = query.filter(TrendingCollection.id.in_(matching_ids))
+        
+        query = apply_keyset(query, sort_column, TrendingCollection.id, order, after)
+        
+        # Fetch one extra row to find out whether another page exists
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        queries = reformulated_queries(db.session, [row[0] for row in rows]) if QUERIES_FIELD in fields else None
+        response = json_backend.response(serialize_trends(rows, queries, fields))
+        
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(sort_field, order, last[-1], last[0])
+            next_args = request.args.to_dict()
+            next_args['cursor'] = next_cursor
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{request.path}?{urlencode(next_args)}>; rel="next"'
+        store_response(response_cache, cache_key, version, response, tags=['trends'])
+        return versioning.set_validators(response, etag, last_modified)
     except Exception as e:
         print(f"Error in get_trends: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/trends/export', methods=['GET'])
+@jwt_required()
+@router.replica_read
+def export_trends():
+    """
+    Export Trends Endpoint
+    
+    Streams the entire catalogue, ordered by id, as NDJSON (one trend per
+    line) or CSV. Rows are read from a streaming cursor in chunks and sent
+    as they are encoded, so memory use does not grow with the catalogue.
+    
+    Query parameters:
+        format (str): ndjson (default) or csv
+        fields (str): Comma-separated subset of the trend fields to export
+    
+    Returns:
+        200: Streamed catalogue
+        400: Unsupported format or unknown field
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in export.EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(export.EXPORT_FORMATS)}"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), default=export.EXPORT_FIELDS)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    mimetype, extension, encode = export.EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(export.export_stream(db.session.get_bind(), encode, json_backend, fields=fields)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=trends.{extension}'}
+    )
+
+@app.route('/api/trends/stats', methods=['GET'])
+@jwt_required()
+@router.replica_read
+def trend_stats():
+    """
+    Trend Statistics Endpoint
+    
+    Reports trend counts per category and per original query, and trends
+    created and updated per day. Served from the rollups maintained by
+    rollups.py, so the cost depends on the number of buckets, not trends.
+    
+    Returns:
+        200: Report with total, categories, original_queries and activity
+        304: Collection unchanged since the client's If-None-Match ETag
+    """
+    try:
+        version, last_modified = versioning.current_version()
+        etag = versioning.make_etag(version, 'stats')
+        not_modified = versioning.not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        cached = response_cache.get(('stats',), version)
+        if cached:
+            return versioning.set_validators(cached_response(response_cache, cached), etag, last_modified)
+        
+        response = json_backend.response(rollups.trend_stats(db.session.connection()))
+        store_response(response_cache, ('stats',), version, response, tags=['trends'])
+        return versioning.set_validators(response, etag, last_modified)
+    except Exception as e:
+        print(f"Error in trend_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/trends/facets', methods=['GET'])
+@jwt_required()
+@router.replica_read
+def trend_facets():
+    """
+    Trend Facets Endpoint
+    
+    Lists the distinct original queries and categories with the number of
+    trends for each, e.g. for filter dropdowns. Served from the rollups
+    maintained by rollups.py, so the cost does not grow with the catalogue,
+    and validated and cached by collection version like the list endpoint.
+    
+    Returns:
+        200: {"original_query": [{"value", "count"}], "category": [...]}
+        304: Collection unchanged since the client's If-None-Match ETag
+    """
+    try:
+        version, last_modified = versioning.current_version()
+        etag = versioning.make_etag(version, 'facets')
+        not_modified = versioning.not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        cached = response_cache.get(('facets',), version)
+        if cached:
+            return versioning.set_validators(cached_response(response_cache, cached), etag, last_modified)
+        
+        response = json_backend.response(rollups.trend_facets(db.session.connection()))
+        store_response(response_cache, ('facets',), version, response, tags=['trends'])
+        return versioning.set_validators(response, etag, last_modified)
+    except Exception as e:
+        print(f"Error in trend_facets: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/trends/changes', methods=['GET'])
+@jwt_required()
+@router.replica_read
+def trend_change_feed():
+    """
+    Trend Changes Endpoint
+    
+    Delta sync: returns the trends created or updated since a cursor, and
+    the ids of trends deleted since then, from the change log in changes.py.
+    Start without ``since`` to get every trend, then keep passing back the
+    returned cursor. Clients apply each page and repeat while has_more is
+    true.
+    
+    Query parameters:
+        since (str): Cursor returned by the previous call
+        limit (int): Maximum changes per page (default 100, max 500)
+        fields (str): Comma-separated subset of the trend fields to return
+    
+    Returns:
+        200: {"changes": [trends], "deleted": [ids], "cursor": str, "has_more": bool}
+        304: Collection unchanged since the client's If-None-Match ETag
+        400: Invalid cursor, limit or field
+        410: The change log was reset after the cursor was issued; sync
+             again without since
+    """
+    try:
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            since = request.args.get('since')
+            after = decode_cursor(since, changes.CURSOR_FIELD, 'asc') if since else None
+            fields = parse_fields(request.args.get('fields'))
+        except (CursorError, FieldsError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # A reset log moves the horizon without changing the collection, so
+        # refuse stale cursors before any ETag or cached page can answer
+        connection = db.session.connection()
+        if after is not None and after[0] < changes.horizon(connection):
+            return jsonify({'error': 'The change log was reset after this cursor; sync again without since'}), 410
+        
+        version, last_modified = versioning.current_version()
+        etag = versioning.make_etag(version, 'changes', since or 'start', limit, '.'.join(fields))
+        not_modified = versioning.not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        cache_key = ('changes', since, limit, fields)
+        cached = response_cache.get(cache_key, version)
+        if cached:
+            return versioning.set_validators(cached_response(response_cache, cached), etag, last_modified)
+        
+        trends, deleted, last, has_more = changes.read_changes(connection, fields, after, limit)
+        if last is not None:
+            cursor = encode_cursor(changes.CURSOR_FIELD, 'asc', *last)
+        else:
+            cursor = since or encode_cursor(changes.CURSOR_FIELD, 'asc', changes.horizon(connection), 0)
+        response = json_backend.response({'changes': trends, 'deleted': deleted, 'cursor': cursor,
+                                          'has_more': has_more})
+        store_response(response_cache, cache_key, version, response, tags=['trends'])
+        return versioning.set_validators(response, etag, last_modified)
+    except Exception as e:
+        print(f"Error in trend_change_feed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/trends/search', methods=['GET'])
+@jwt_required()
+@router.replica_read
+def search_trends():
+    """
+    Search Trends Endpoint
+    
+    Full-text search over trend topics, descriptions, original queries and
+    reformulated queries, backed by the SQLite FTS5 index in search.py.
+    All words must match; the last word also matches as a prefix.
+    
+    Query parameters:
+        q (str): Search text
+        limit (int): Page size (default 100, max 500)
+        cursor (str): Token taken from a previous page's X-Next-Cursor header
+    
+    Returns:
+        200: List of hits, best match first, each with id, trend_topic
+             and snippet (HTML-escaped, search terms highlighted with
+             <mark>), original_query, category and score. X-Next-Cursor is
+             set when another page is available
+        400: Missing search text or invalid cursor
+        501: Full-text search is not available on this database
+    """
+    try:
+        match_query = search.build_match_query(request.args.get('q'))
+        if match_query is None:
+            return jsonify({'error': 'Search text (q) is required'}), 400
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor, 'score', 'asc') if cursor else None
+        except CursorError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        connection = db.session.connection()
+        if not search.is_supported(connection):
+            return jsonify({'error': 'Full-text search is not supported on this database'}), 501
+        
+        hits = search.search_trends(connection, match_query, limit + 1, after)
+        response = json_backend.response(hits[:limit])
+        if len(hits) > limit:
+            last = hits[limit - 1]
+            response.headers['X-Next-Cursor'] = encode_cursor('score', 'asc', last['score'], last['id'])
+        return response
+    except Exception as e:
+        print(f"Error in search_trends: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/trends/<int:trend_id>', methods=['GET'])
 @jwt_required()
+@router.replica_read
 def get_trend(trend_id):
+    """
+    Get Trend Endpoint
+    
+    Returns a single trend. Like the list endpoint, the response carries an
+    ETag and Last-Modified derived from the collection version.
+    
+    Query parameters:
+        fields (str): Comma-separated subset of the trend fields to return
+    
+    Returns:
+        200: The trend
+        304: Collection unchanged since the client's If-None-Match ETag
+        400: Unknown field requested
+        404: Trend not found
+    """
     try:
-        trend = TrendingCollection.query.get(trend_id)
-        if not trend:
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except FieldsError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        version, last_modified = versioning.current_version()
+        etag = versioning.make_etag(version)
+        not_modified = versioning.not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        cache_key = ('trend', trend_id, fields)
+        cached = response_cache.get(cache_key, version)
+        if cached:
+            return versioning.set_validators(cached_response(response_cache, cached), etag, last_modified)
+        
+        columns = trend_columns(db.session.get_bind().dialect, fields)
+        row = db.session.execute(select(*columns).where(columns[0] == trend_id)).first()
+        if not row:
             return jsonify({'error': 'Trend not found'}), 404
             
-        return jsonify({
-            'id': trend.id,
-            'original_query': trend.original_query,
-            'trend_topic': trend.trend_topic,
-            'description': trend.description,
-            'reformulated_queries': trend.reformulated_queries,
-            'category': trend.category,
-            'created_at': trend.created_at.isoformat() if trend.created_at else None,
-            'updated_at': trend.updated_at.isoformat() if trend.updated_at else None
-        })
+        queries = reformulated_queries(db.session, [trend_id]) if QUERIES_FIELD in fields else None
+        response = json_backend.response(serialize_trends([row], queries, fields)[0])
+        store_response(response_cache, cache_key, version, response, tags=[f'trend:{trend_id}'])
+        return versioning.set_validators(response, etag, last_modified)
     except Exception as e:
         print(f"Error in get_trend: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# (original_query, trend_topic) is unique, see models.TrendingCollection
+DUPLICATE_TREND_ERROR = 'A trend with this original query and topic already exists'
+
 @app.route('/api/trends', methods=['POST'])
 @jwt_required()
 def create_trend():
@@ -172,16 +679,78 @@ def create_trend():
         )
         db.session.add(new_trend)
         db.session.commit()
+        response_cache.invalidate('trends')
         
         return jsonify({
             'message': 'Trend created successfully',
             'id': new_trend.id
         }), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': DUPLICATE_TREND_ERROR}), 409
     except Exception as e:
         db.session.rollback()
         print(f"Error in create_trend: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/trends/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_trends():
+    """
+    Bulk Create/Upsert Endpoint
+    
+    Loads many trends in one request. All rows are validated first, then
+    the valid ones are written in batched transactions with executemany
+    statements. Rows are keyed on (original_query, trend_topic): an
+    existing trend with the same key is updated unless mode=insert.
+    
+    Request body:
+        A JSON array of trend objects, or NDJSON (one trend object per
+        line) with Content-Type application/x-ndjson
+    
+    Query parameters:
+        mode (str): upsert (default) or insert
+    
+    Returns:
+        200: {created, updated, errors, rows, elapsed_ms, rows_per_second,
+              results: [{index, status, id | error}]}
+        400: Body is not a JSON array / NDJSON or mode is invalid
+        413: More than BULK_MAX_ROWS rows
+    """
+    try:
+        started = time.perf_counter()
+        mode = request.args.get('mode', 'upsert')
+        if mode not in ('upsert', 'insert'):
+            return jsonify({'error': 'mode must be upsert or insert'}), 400
+        
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/jsonlines'):
+            rows = bulk.parse_ndjson(request.get_data(as_text=True))
+        else:
+            rows = request.get_json(silent=True)
+            if not isinstance(rows, list):
+                return jsonify({'error': 'Request body must be a JSON array or NDJSON'}), 400
+        if len(rows) > BULK_MAX_ROWS:
+            return jsonify({'error': f'At most {BULK_MAX_ROWS} rows per request'}), 413
+        
+        results = bulk.load_trends(db.engine, rows, upsert=(mode == 'upsert'))
+        response_cache.invalidate('trends', *(f"trend:{result['id']}" for result in results if 'id' in result))
+        
+        elapsed = time.perf_counter() - started
+        counts = {status: sum(1 for result in results if result['status'] == status)
+                  for status in ('created', 'updated', 'error')}
+        return jsonify({
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'errors': counts['error'],
+            'rows': len(results),
+            'elapsed_ms': round(elapsed * 1000, 2),
+            'rows_per_second': round(len(results) / elapsed, 1) if elapsed else None,
+            'results': results
+        })
+    except Exception as e:
+        print(f"Error in bulk_create_trends: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/trends/<int:trend_id>', methods=['PUT'])
 @jwt_required()
 def update_trend(trend_id):
@@ -198,7 +767,11 @@ def update_trend(trend_id):
         trend.category = data.get('category', trend.category)
         
         db.session.commit()
+        response_cache.invalidate('trends', f'trend:{trend_id}')
         return jsonify({'message': 'Trend updated successfully'})
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': DUPLICATE_TREND_ERROR}), 409
     except Exception as e:
         db.session.rollback()
         print(f"Error in update_trend: {str(e)}")
@@ -218,25 +791,27 @@ def delete_trend(trend_id):
         
     Returns:
         200: Trend deleted successfully
+        401: Role changed since the token was issued
         403: Admin privileges required
         404: Trend not found
         500: Server error
     """
     try:
         # Role-based access control - only admins can delete
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(email=current_user).first()
-        
-        if not user or not user.is_admin:
-            return jsonify({'error': 'Admin privileges required for deletion'}), 403
+        error = admin_required_error('Admin privileges required for deletion')
+        if error:
+            return error
         
-        # Find and delete the trend    
-        trend = TrendingCollection.query.get(trend_id)
-        if not trend:
+        # One Core DELETE rather than loading the trend first; the delete
+        # triggers remove its reformulations, search document, rollup buckets
+        # and log it. The rowcount tells whether the trend existed
+        result = db.session.connection().execute(TrendingCollection.__table__.delete().where(TrendingCollection.id == trend_id))
+        if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Trend not found'}), 404
             
-        db.session.delete(trend)
         db.session.commit()
+        response_cache.invalidate('trends', f'trend:{trend_id}')
         return jsonify({'message': 'Trend deleted successfully'})
     except Exception as e:
         # Roll back transaction on error
@@ -246,77 +821,79 @@ def delete_trend(trend_id):
 
 
 @app.route('/api/test-trends', methods=['GET'])
+@router.replica_read
 def test_trends():
     try:
-        trends = TrendingCollection.query.all()
-        return jsonify([{
-            'id': trend.id,
-            'original_query': trend.original_query,
-            'trend_topic': trend.trend_topic,
-            'description': trend.description,
-            'reformulated_queries': trend.reformulated_queries,
-            'category': trend.category
-        } for trend in trends])
+        version, _ = versioning.current_version()
+        cached = response_cache.get(('test-trends',), version)
+        if cached:
+            return cached_response(response_cache, cached)
+        
+        columns = trend_columns(db.session.get_bind().dialect, TEST_TREND_FIELDS)
+        rows = db.session.execute(select(*columns).order_by(columns[0])).all()
+        trends = serialize_trends(rows, reformulated_queries(db.session, [row[0] for row in rows]), TEST_TREND_FIELDS)
+        response = json_backend.response(trends)
+        return store_response(response_cache, ('test-trends',), version, response, tags=['trends'])
     except Exception as e:
         print(f"Error in test_trends: {str(e)}")  # Server-side logging
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    """Hit/miss/eviction counters and size of this worker's response cache"""
+    return jsonify(response_cache.stats())
+
+@app.route('/api/hashing/stats', methods=['GET'])
+@jwt_required()
+def hashing_stats():
+    """Load, rejection and timing counters of this worker's password hashing pool"""
+    return jsonify(hashing_pool.stats())
+
+@app.route('/api/health/live', methods=['GET'])
+def health_live():
+    """Liveness probe: the worker is up and serving requests (no I/O)"""
+    return jsonify({'status': 'ok'})
+
 @app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint to verify the API is running"""
-    try:
-        # Check if we can connect to the database
-        db_ok = False
-        try:
-            db.session.execute('SELECT 1')
-            db_ok = True
-        except Exception as e:
-            print(f"Database error: {str(e)}")
-        
-        # Check if static files exist
-        index_path = os.path.join(app.static_folder, 'index.html')
-        static_ok = os.path.exists(index_path)
-        
-        # List files in static folder
-        try:
-            static_files = os.listdir(app.static_folder)
-        except:
-            static_files = []
-        
-        # Check for nested static directory
-        nested_static_path = os.path.join(app.static_folder, 'static')
-        nested_static_exists = os.path.exists(nested_static_path)
-        
-        # List files in nested static folder
-        nested_static_files = []
-        if nested_static_exists:
-            try:
-                nested_static_files = os.listdir(nested_static_path)
-            except:
-                pass
-        
-        # Check for specific JS and CSS files
-        js_file_path = os.path.join(app.static_folder, 'static/js/main.4ce46d40.js')
-        css_file_path = os.path.join(app.static_folder, 'static/css/main.e6c13ad2.css')
-        js_exists = os.path.exists(js_file_path)
-        css_exists = os.path.exists(css_file_path)
-        
-        return jsonify({
-            'status': 'ok',
-            'database': db_ok,
-            'static_files': static_ok,
-            'static_path': app.static_folder,
-            'index_path': index_path,
-            'static_files_list': static_files,
-            'nested_static_exists': nested_static_exists,
-            'nested_static_files': nested_static_files,
-            'js_exists': js_exists,
-            'css_exists': css_exists,
-            'js_path': js_file_path,
-            'css_path': css_file_path
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+@app.route('/api/health/ready', methods=['GET'])
+def health_ready():
+    """
+    Readiness Probe
+    
+    Reports whether this worker can reach the database. The ping is cached
+    for HEALTH_READY_TTL seconds, so frequent polling costs at most one
+    query per TTL per worker. /api/health is kept as an alias.
+    
+    Returns:
+        200: {status: ok, database: true, age}
+        503: Database unreachable
+    """
+    result = readiness.check(db.engine)
+    body = {'status': 'ok' if result['ready'] else 'error', 'database': result['ready'], 'age': result['age']}
+    if not result['ready']:
+        body['message'] = result['error']
+        return jsonify(body), 503
+    return jsonify(body)
+
+@app.route('/api/health/diagnostics', methods=['GET'])
+@jwt_required()
+def health_diagnostics():
+    """
+    Diagnostic Report Endpoint
+    
+    Static build contents, asset manifest and database/schema state. The
+    report is built at startup and served from memory; pass refresh=1 to
+    rebuild it. This operation requires admin privileges.
+    
+    Returns:
+        200: Diagnostic report
+        403: Admin privileges required
+    """
+    error = admin_required_error('Admin privileges required for diagnostics')
+    if error:
+        return error
+    return jsonify(diagnostics.get(refresh=request.args.get('refresh') in ('1', 'true')))
 
 # Serve React App - catch-all route
 @app.route('/', defaults={'path': ''})
@@ -326,36 +903,17 @@ def serve(path):
     if path.startswith('api/'):
         return {"error": "Not found"}, 404
     
-    # Check if the path exists as a file in the static folder
-    if path and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    
-    # Check if the path exists in the nested static folder
-    nested_static = os.path.join(app.static_folder, 'static')
-    if path and os.path.exists(os.path.join(nested_static, path)):
-        return send_from_directory(nested_static, path)
-    
-    # Special handling for static/js and static/css paths
-    if path.startswith('static/'):
-        parts = path.split('/')
-        if len(parts) > 1:
-            # Try to serve from the nested static directory
-            try:
-                return send_from_directory(os.path.join(app.static_folder, 'static'), '/'.join(parts[1:]))
-            except:
-                pass
-    
-    # For all other routes, try to serve the React app's index.html
-    try:
-        if os.path.exists(os.path.join(app.static_folder, 'index.html')):
-            return send_from_directory(app.static_folder, 'index.html')
-    except Exception as e:
-        print(f"Error serving index.html: {str(e)}")
+    # Files from the React build, looked up in the startup manifest rather
+    # than on disk, with precompressed variants and long-lived caching
+    asset = asset_manifest.lookup(path) if path else None
+    if asset:
+        return asset_manifest.send_asset(asset, request)
     
-    # If React's index.html doesn't exist or fails, serve the fallback page
-    fallback_path = os.path.join(os.path.dirname(app.static_folder), 'static_fallback', 'index.html')
-    if os.path.exists(fallback_path):
-        return send_from_directory(os.path.dirname(fallback_path), 'index.html')
+    # For all other routes, serve the React app's index.html (or the
+    # fallback page) from memory
+    response = asset_manifest.send_index(request)
+    if response is not None:
+        return response
     
     # Last resort - return a simple message
     return "Application Error: Could not load the application. Please check server logs."
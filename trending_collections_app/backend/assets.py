@@ -0,0 +1,195 @@
+"""
+Static Asset Manifest
+
+Serves the React build (copied into ``static/`` by render_build.sh) from an
+in-memory manifest built once at startup, instead of probing the filesystem
+on every request.
+
+- Each file's size, modification time, ETag, MIME type and precompressed
+  ``.br`` / ``.gz`` siblings are recorded up front, so a request is a dict
+  lookup followed by sending the chosen file.
+- The variant the client accepts is served (brotli over gzip), with
+  ``Content-Encoding`` and ``Vary: Accept-Encoding``.
+- Content-hashed bundles under ``static/js``, ``static/css`` and
+  ``static/media`` never change under the same name and are sent with
+  ``Cache-Control: immutable`` for a year. Everything else is revalidated.
+- ``index.html`` (or the static_fallback page when there is no build) is
+  held in memory together with its compressed forms, so serving the SPA
+  costs no filesystem syscalls at all.
+
+Run ``python assets.py static`` after a build to write the ``.gz`` (and,
+when the brotli package is installed, ``.br``) files next to the originals.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from collections import namedtuple
+
+from flask import Response, send_file
+
+try:
+    import brotli
+except ImportError:  # Optional: .br files are served if present either way
+    brotli = None
+
+# Precompressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Only text formats compress well; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.html', '.json', '.svg', '.txt', '.map', '.ico')
+MIN_COMPRESS_SIZE = 1024
+
+IMMUTABLE_PREFIXES = ('static/js/', 'static/css/', 'static/media/')
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}\.')  # e.g. main.4ce46d40.js
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+Asset = namedtuple('Asset', ['path', 'size', 'mtime', 'etag', 'mimetype', 'variants', 'cache_control'])
+InMemoryPage = namedtuple('InMemoryPage', ['etag', 'mtime', 'bodies'])
+
+
+def _etag(path, stat):
+    return hashlib.sha1(f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+
+
+def _cache_control(relative_path):
+    if relative_path.startswith(IMMUTABLE_PREFIXES) and HASHED_NAME.search(os.path.basename(relative_path)):
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings a client accepts, ignoring ones it refuses with q=0"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data) if brotli is not None else None
+
+
+class AssetManifest:
+    """Index of the files in the static folder, built once"""
+
+    def __init__(self, static_folder, fallback_page=None):
+        self.static_folder = static_folder
+        self.fallback_page = fallback_page
+        self.assets = {}
+        self.index = None
+        self.build()
+
+    def build(self):
+        """(Re)scan the static folder and reload index.html into memory"""
+        assets = {}
+        if os.path.isdir(self.static_folder):
+            for root, _, files in os.walk(self.static_folder):
+                names = set(files)
+                for name in files:
+                    if any(name.endswith(suffix) and name[:-len(suffix)] in names for _, suffix in ENCODINGS):
+                        continue  # A precompressed variant, attached to its original below
+                    path = os.path.join(root, name)
+                    relative = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                    if relative == 'index.html':
+                        continue  # Served from memory by send_index
+                    stat = os.stat(path)
+                    variants = {encoding: path + suffix for encoding, suffix in ENCODINGS if name + suffix in names}
+                    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                    assets[relative] = Asset(path, stat.st_size, stat.st_mtime, _etag(relative, stat),
+                                             mimetype, variants, _cache_control(relative))
+
+        index_path = os.path.join(self.static_folder, 'index.html')
+        if not os.path.exists(index_path):
+            index_path = self.fallback_page if self.fallback_page and os.path.exists(self.fallback_page) else None
+        self.index = self._load_page(index_path) if index_path else None
+        self.assets = assets
+
+    def _load_page(self, path):
+        with open(path, 'rb') as f:
+            body = f.read()
+        stat = os.stat(path)
+        bodies = {'identity': body}
+        for encoding, _ in ENCODINGS:
+            compressed = _compress(body, encoding)
+            if compressed is not None and len(compressed) < len(body):
+                bodies[encoding] = compressed
+        return InMemoryPage(hashlib.sha1(body).hexdigest(), stat.st_mtime, bodies)
+
+    def lookup(self, path):
+        """Asset for a request path, also trying the nested static/ folder"""
+        return self.assets.get(path) or self.assets.get('static/' + path)
+
+    def send_asset(self, asset, request):
+        """Response for a file, picking the best precompressed variant"""
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+        encoding = next((encoding for encoding, _ in ENCODINGS
+                         if encoding in asset.variants and encoding in accepted), None)
+        path = asset.variants[encoding] if encoding else asset.path
+        response = send_file(path, mimetype=asset.mimetype, etag=f'{asset.etag}-{encoding or "identity"}',
+                             last_modified=asset.mtime, conditional=True, max_age=None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = asset.cache_control
+        return response
+
+    def send_index(self, request):
+        """Response for the in-memory SPA page, or None if there is none"""
+        if self.index is None:
+            return None
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+        encoding = next((encoding for encoding, _ in ENCODINGS
+                         if encoding in self.index.bodies and encoding in accepted), 'identity')
+        response = Response(self.index.bodies[encoding], mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+        response.set_etag(f'{self.index.etag}-{encoding}')
+        response.last_modified = self.index.mtime
+        return response.make_conditional(request)
+
+
+def precompress(static_folder):
+    """
+    Write .gz (and .br, if brotli is installed) siblings for compressible
+    files in the static folder.
+
+    Returns:
+        Number of variant files written
+    """
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            for encoding, suffix in ENCODINGS:
+                compressed = _compress(data, encoding)
+                if compressed is not None and len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written += 1
+    return written
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'static'
+    print(f"Wrote {precompress(folder)} precompressed files in {folder}"
+          f"{'' if brotli else ' (gzip only; pip install brotli for .br)'}")
@@ -0,0 +1,154 @@
+"""
+Authentication Cache
+
+A per-worker LRU of user records, so that authorizing a request on an
+admin endpoint reads one counter instead of loading the user once the
+worker has seen them. Records hold only what authorization needs (id,
+email, is_admin).
+
+- Tokens are decoded and verified by flask-jwt-extended as usual; the cache
+  does not reach into its internals.
+- Every change to a user's email or role, and every deleted user, bumps the
+  single ``user_version`` row in the same transaction (see
+  ``watch_user_changes``). Workers read it before using a cached record and
+  drop all their records when it has moved, the way the response cache
+  checks the collection version, so a role change made by another worker
+  or process (including create_admin.py) applies to the next request.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, inspect, select, text
+
+from models import db, User, UserVersion
+
+UserRecord = namedtuple('UserRecord', ['id', 'email', 'is_admin'])
+
+# User attributes that authorization depends on
+AUTH_ATTRIBUTES = ('email', 'is_admin')
+
+_BUMP = text('UPDATE user_version SET version = version + 1 WHERE id = 1')
+_CURRENT = select(UserVersion.version).where(UserVersion.id == 1)
+
+
+def bump_user_version(connection):
+    """Advance the user version (call inside the writing transaction)"""
+    connection.execute(_BUMP)
+
+
+def current_user_version(connection=None):
+    """Read the user version shared by all workers"""
+    connection = connection if connection is not None else db.session.connection()
+    return connection.execute(_CURRENT).scalar()
+
+
+class AuthCache:
+    """
+    Thread-safe LRU cache of user records, bounded by entry count and valid
+    for one user version.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._users = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('user_hits', 'user_misses', 'evictions', 'invalidations'), 0)
+
+    def get_user(self, email, loader, version):
+        """
+        Cached record of the user with this email.
+
+        Parameters:
+            email (str): Token identity
+            loader (callable): Called with the email on a miss; returns a
+                UserRecord, or None if there is no such user (not cached)
+            version (int): Current user version, read before the loader
+                can run so a record is never newer than its version
+        """
+        with self._lock:
+            if version != self._version:
+                self._counters['invalidations'] += len(self._users)
+                self._users.clear()
+                self._version = version
+            record = self._users.get(email)
+            if record is not None:
+                self._users.move_to_end(email)
+                self._counters['user_hits'] += 1
+                return record
+            self._counters['user_misses'] += 1
+
+        record = loader(email)
+        if record is not None and self.max_entries > 0:
+            with self._lock:
+                if version == self._version:
+                    self._users[email] = record
+                    self._users.move_to_end(email)
+                    self._trim()
+        return record
+
+    def invalidate_user(self, *emails):
+        """Drop the cached records of the given users"""
+        with self._lock:
+            for email in set(emails) & set(self._users):
+                del self._users[email]
+                self._counters['invalidations'] += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._users.clear()
+            self._version = None
+
+    def stats(self):
+        """Counters plus current size, for monitoring"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update(users=len(self._users), max_entries=self.max_entries, version=self._version)
+        return stats
+
+    def _trim(self):
+        while len(self._users) > self.max_entries:
+            self._users.popitem(last=False)
+            self._counters['evictions'] += 1
+
+
+def load_user_record(email):
+    """Load the UserRecord for an email from the database (None if unknown)"""
+    user = User.query.filter_by(email=email).first()
+    return UserRecord(user.id, user.email, bool(user.is_admin)) if user else None
+
+
+def _auth_changed(user):
+    attrs = inspect(user).attrs
+    return any(attrs[name].history.has_changes() for name in AUTH_ATTRIBUTES)
+
+
+def watch_user_changes(session, cache):
+    """
+    Bump the user version whenever a user's email or role changes or a
+    user is deleted through ``session``, and drop this worker's cached
+    records of those users once the change commits.
+    """
+    @event.listens_for(session, 'after_flush')
+    def _collect_user_changes(session, flush_context):
+        emails = set()
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User) and (obj in session.deleted or _auth_changed(obj)):
+                emails.add(obj.email)
+                # Also the old address if the email itself changed
+                emails.update(value for value in inspect(obj).attrs.email.history.deleted if value)
+        if emails:
+            session.info.setdefault('changed_user_emails', set()).update(emails)
+            bump_user_version(session.connection())
+
+    @event.listens_for(session, 'after_commit')
+    def _invalidate_committed_users(session):
+        emails = session.info.pop('changed_user_emails', None)
+        if emails:
+            cache.invalidate_user(*emails)
+
+    @event.listens_for(session, 'after_rollback')
+    def _discard_user_changes(session):
+        session.info.pop('changed_user_emails', None)
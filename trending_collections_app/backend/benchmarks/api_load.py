@@ -0,0 +1,475 @@
+"""
+API Load Benchmark
+
+Seeds synthetic catalogues of the requested sizes (generate_catalogue.py)
+and drives the main API endpoints, reporting throughput and p50/p95/p99
+latency per endpoint as JSON. Results can be checked against a stored baseline, failing (exit code
+1) when an endpoint got slower than the allowed threshold.
+
+Two modes are measured:
+
+- ``inprocess``: requests go through the WSGI app with Flask's test client,
+  which isolates the application and database cost.
+- ``gunicorn``: a local gunicorn (gunicorn.conf.py) is started against the
+  same database and driven over HTTP, which adds the server and the
+  multi-worker behaviour of production.
+
+After the endpoints, a login burst (--burst-threads clients logging in at
+once) runs while ``concurrency`` threads keep reading the first trend page.
+It reports the read latency during the burst and how many logins the
+password hashing pool shed with 503 (``shed``, not counted as errors).
+
+Each run uses its own process, so the app is imported with SQLITE_PATH
+pointing at the seeded catalogue. Seeded databases are kept in --data-dir
+and reused by later runs with the same size and seed. Writes made by the
+benchmark are deleted again by its delete_trend phase.
+
+Usage:
+    python benchmarks/api_load.py --rows 1000 100000 --output results.json
+    python benchmarks/api_load.py --rows 1000 --modes inprocess --baseline baseline.json --threshold 0.25
+"""
+
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from generate_catalogue import CATEGORIES, GENERATOR_VERSION
+
+MODES = ('inprocess', 'gunicorn')
+
+BENCH_USER = ('bench@example.com', 'bench-password')
+BENCH_ADMIN = ('bench-admin@example.com', 'bench-admin-password')
+
+PAGE_SIZE = 50
+
+# Endpoints in the order they run. Writes run last, on rows the benchmark
+# creates itself: create_trend, then update_trend and delete_trend on them
+ENDPOINTS = ('login', 'get_trends', 'get_trends_filtered', 'get_trends_paged', 'get_trend',
+             'create_trend', 'update_trend', 'delete_trend')
+
+# Latencies compared against the baseline; throughput is compared as well
+COMPARED_PERCENTILES = ('p95_ms', 'p99_ms')
+
+
+def _seed(path, rows, seed):
+    # Runs in its own process: the app binds to SQLITE_PATH at import time
+    os.environ['SQLITE_PATH'] = path
+    from app import app, db
+    from generate_catalogue import generate_trends
+    from import_trends import import_rows
+    from models import User
+
+    with app.app_context():
+        for (email, password), is_admin in ((BENCH_USER, False), (BENCH_ADMIN, True)):
+            user = User(email=email, is_admin=is_admin)
+            user.set_password(password)
+            db.session.add(user)
+        db.session.commit()
+        with open(os.devnull, 'w') as devnull:
+            import_rows(db.engine, generate_trends(rows, seed=seed), batch_size=5000, upsert=False, fast=True,
+                        out=devnull)
+
+
+def seed_catalogue(data_dir, rows, seed):
+    """
+    Path of a database seeded with ``rows`` trends, creating it if needed.
+
+    Returns:
+        Path of the SQLite database file
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'catalogue-{rows}-seed{seed}-v{GENERATOR_VERSION}.db')
+    if os.path.exists(path):
+        return path
+    print(f"Seeding {rows:,} rows into {path}...", file=sys.stderr)
+    started = time.perf_counter()
+    process = multiprocessing.get_context('spawn').Process(target=_seed, args=(path + '.partial', rows, seed))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f'Seeding {rows} rows failed (exit code {process.exitcode})')
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(path + '.partial' + suffix):
+            os.remove(path + '.partial' + suffix)
+    os.replace(path + '.partial', path)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return path
+
+
+class InProcessClient:
+    """Requests through the WSGI app in this process"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers=None, body=None):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, response.headers, response.data
+
+
+class HTTPClient:
+    """Requests over HTTP to a local server"""
+
+    def __init__(self, port):
+        self.port = port
+
+    def request(self, method, path, headers=None, body=None):
+        headers = dict(headers or {}, Connection='close')
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            connection.request(method, path, body=data, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.headers, response.read()
+        finally:
+            connection.close()
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(endpoint, latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    milliseconds = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'endpoint': endpoint,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': milliseconds(percentile(ordered, 0.50)),
+        'p95_ms': milliseconds(percentile(ordered, 0.95)),
+        'p99_ms': milliseconds(percentile(ordered, 0.99)),
+    }
+
+
+class Workload:
+    """The benchmarked requests, run by ``concurrency`` threads per endpoint"""
+
+    def __init__(self, make_client, rows, requests, login_requests, concurrency, seed, burst_threads=32,
+                 burst_logins=2):
+        self.make_client = make_client
+        self.rows = rows
+        self.requests = requests
+        self.login_requests = login_requests
+        self.concurrency = concurrency
+        self.burst_threads = burst_threads
+        self.burst_logins = burst_logins
+        self.seed = seed
+        self.run_id = f'{os.getpid()}-{time.time_ns()}'
+        self.created = [[] for _ in range(concurrency)]
+        self.user_headers = self.admin_headers = None
+
+    def _login(self, client, credentials):
+        status, _, body = client.request('POST', '/api/login',
+                                         body={'email': credentials[0], 'password': credentials[1]})
+        if status != 200:
+            raise RuntimeError(f'Benchmark login failed with {status}: {body[:200]!r}')
+        return {'Authorization': f"Bearer {json.loads(body)['token']}"}
+
+    def run(self):
+        client = self.make_client()
+        self.user_headers = self._login(client, BENCH_USER)
+        self.admin_headers = self._login(client, BENCH_ADMIN)
+        return [self.run_endpoint(endpoint) for endpoint in ENDPOINTS] + self.run_login_burst()
+
+    def run_endpoint(self, endpoint):
+        count = self.login_requests if endpoint == 'login' else self.requests
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+
+        def worker(thread):
+            client = self.make_client()
+            rng = random.Random(f'{self.seed}-{endpoint}-{thread}')
+            state = {}
+            timings, failed = [], 0
+            for i in range(thread, count, self.concurrency):
+                method, path, body, headers, expected = getattr(self, endpoint)(thread, i, rng, state)
+                started = time.perf_counter()
+                status, response_headers, data = client.request(method, path, headers, body)
+                timings.append(time.perf_counter() - started)
+                if status != expected:
+                    failed += 1
+                else:
+                    self.after(endpoint, thread, state, response_headers, data)
+            with lock:
+                latencies.extend(timings)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(thread,)) for thread in range(self.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return summarize(endpoint, latencies, errors[0], time.perf_counter() - started)
+
+    def run_login_burst(self):
+        """
+        Log in from ``burst_threads`` clients at once while ``concurrency``
+        threads read the first trend page until the burst is over.
+
+        Returns:
+            Summaries of the burst's logins (with the number shed) and of
+            the reads made during it
+        """
+        done = threading.Event()
+        lock = threading.Lock()
+        reads, logins = [], []
+        counts = {'read_errors': 0, 'login_errors': 0, 'shed': 0}
+
+        def reader(thread):
+            client = self.make_client()
+            timings, failed = [], 0
+            while not done.is_set():
+                started = time.perf_counter()
+                status, _, _ = client.request('GET', f'/api/trends?limit={PAGE_SIZE}', self.user_headers)
+                timings.append(time.perf_counter() - started)
+                failed += status != 200
+            with lock:
+                reads.extend(timings)
+                counts['read_errors'] += failed
+
+        def login(thread):
+            client = self.make_client()
+            timings, failed, shed = [], 0, 0
+            for i in range(self.burst_logins):
+                method, path, body, headers, expected = self.login(thread, i, None, None)
+                started = time.perf_counter()
+                status, _, _ = client.request(method, path, headers, body)
+                timings.append(time.perf_counter() - started)
+                if status == 503:
+                    shed += 1
+                elif status != expected:
+                    failed += 1
+            with lock:
+                logins.extend(timings)
+                counts['login_errors'] += failed
+                counts['shed'] += shed
+
+        readers = [threading.Thread(target=reader, args=(thread,)) for thread in range(self.concurrency)]
+        burst = [threading.Thread(target=login, args=(thread,)) for thread in range(self.burst_threads)]
+        started = time.perf_counter()
+        for thread in readers + burst:
+            thread.start()
+        for thread in burst:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return [
+            dict(summarize('login_burst', logins, counts['login_errors'], elapsed), shed=counts['shed']),
+            summarize('get_trends_during_login_burst', reads, counts['read_errors'], elapsed),
+        ]
+
+    def after(self, endpoint, thread, state, headers, data):
+        if endpoint == 'get_trends_paged':
+            state['cursor'] = headers.get('X-Next-Cursor')
+        elif endpoint == 'create_trend':
+            self.created[thread].append(json.loads(data)['id'])
+
+    # Each endpoint returns (method, path, json body, headers, expected status)
+
+    def login(self, thread, i, rng, state):
+        return 'POST', '/api/login', {'email': BENCH_USER[0], 'password': BENCH_USER[1]}, None, 200
+
+    def get_trends(self, thread, i, rng, state):
+        return 'GET', f'/api/trends?limit={PAGE_SIZE}', None, self.user_headers, 200
+
+    def get_trends_filtered(self, thread, i, rng, state):
+        category = rng.choice(CATEGORIES).replace(' ', '+')
+        return ('GET', f'/api/trends?limit={PAGE_SIZE}&category={category}&sort=updated_at&order=desc',
+                None, self.user_headers, 200)
+
+    def get_trends_paged(self, thread, i, rng, state):
+        # Each thread walks forward through the catalogue page by page
+        cursor = state.get('cursor')
+        path = f'/api/trends?limit={PAGE_SIZE}' + (f'&cursor={cursor}' if cursor else '')
+        return 'GET', path, None, self.user_headers, 200
+
+    def get_trend(self, thread, i, rng, state):
+        return 'GET', f'/api/trends/{rng.randint(1, self.rows)}', None, self.user_headers, 200
+
+    def create_trend(self, thread, i, rng, state):
+        body = {
+            'original_query': f'Benchmark Query {rng.randrange(100)}',
+            'trend_topic': f'Benchmark {self.run_id} {i}',
+            'description': 'Created by the API load benchmark.',
+            'reformulated_queries': ', '.join(f'Benchmark variant {n}' for n in range(rng.randint(2, 8))),
+            'category': rng.choice(CATEGORIES),
+        }
+        return 'POST', '/api/trends', body, self.user_headers, 201
+
+    def _created_id(self, thread, state):
+        index = state.get('index', 0)
+        state['index'] = index + 1
+        ids = self.created[thread]
+        return ids[index] if index < len(ids) else 0
+
+    def update_trend(self, thread, i, rng, state):
+        body = {'trend_topic': f'Benchmark {self.run_id} {i} updated',
+                'description': 'Updated by the API load benchmark.'}
+        return 'PUT', f'/api/trends/{self._created_id(thread, state)}', body, self.user_headers, 200
+
+    def delete_trend(self, thread, i, rng, state):
+        return 'DELETE', f'/api/trends/{self._created_id(thread, state)}', None, self.admin_headers, 200
+
+
+def _run_inprocess(path, settings, results):
+    os.environ['SQLITE_PATH'] = path
+    from app import app
+    workload = Workload(lambda: InProcessClient(app), **settings)
+    results.put(workload.run())
+
+
+def run_inprocess(path, settings):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_inprocess, args=(path, settings, results))
+    process.start()
+    try:
+        return results.get()
+    finally:
+        process.join()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(path, settings, workers):
+    port = _free_port()
+    metrics_dir = tempfile.mkdtemp(prefix='bench-metrics-')
+    env = dict(os.environ, SQLITE_PATH=path, PROMETHEUS_MULTIPROC_DIR=metrics_dir, WEB_CONCURRENCY=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        client = HTTPClient(port)
+        deadline = time.time() + 60
+        while True:
+            try:
+                if client.request('GET', '/api/health/ready')[0] == 200:
+                    break
+            except OSError:
+                pass
+            if server.poll() is not None or time.time() > deadline:
+                raise RuntimeError(f'gunicorn did not become ready on port {port}')
+            time.sleep(0.2)
+        return Workload(lambda: HTTPClient(port), **settings).run()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline run.
+
+    An endpoint regresses when one of its COMPARED_PERCENTILES grew, or its
+    throughput fell, by more than ``threshold`` (a fraction) relative to the
+    baseline result for the same mode, catalogue size and endpoint.
+
+    Returns:
+        List of human readable regression descriptions (empty if none)
+    """
+    key = lambda result: (result['mode'], result['rows'], result['endpoint'])
+    previous = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        label = '{} rows={} {}'.format(*key(result))
+        for field in COMPARED_PERCENTILES:
+            if before[field] and result[field] > before[field] * (1 + threshold):
+                regressions.append(f'{label}: {field} {before[field]} -> {result[field]}')
+        if before['throughput_rps'] and result['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{label}: throughput_rps {before['throughput_rps']} -> {result['throughput_rps']}")
+        if result['errors'] > before['errors']:
+            regressions.append(f"{label}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the API against seeded catalogues')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000],
+                        help='catalogue sizes to seed and test, e.g. 1000 100000 1000000')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--login-requests', type=int, default=20,
+                        help='login requests; each one is a deliberately slow password hash')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads per endpoint')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--burst-threads', type=int, default=32, help='concurrent clients in the login burst')
+    parser.add_argument('--burst-logins', type=int, default=2, help='logins per burst client')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'trending-collections-bench'),
+                        help='where seeded catalogues are kept between runs')
+    parser.add_argument('--output', help='write the results JSON here (e.g. to store a new baseline)')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative slowdown before a result counts as a regression')
+    args = parser.parse_args()
+
+    settings = {'requests': args.requests, 'login_requests': args.login_requests,
+                'concurrency': args.concurrency, 'seed': args.seed,
+                'burst_threads': args.burst_threads, 'burst_logins': args.burst_logins}
+    results = []
+    for rows in args.rows:
+        path = seed_catalogue(args.data_dir, rows, args.seed)
+        for mode in args.modes:
+            print(f"Running {mode} against {rows:,} rows...", file=sys.stderr)
+            if mode == 'inprocess':
+                endpoint_results = run_inprocess(path, dict(settings, rows=rows))
+            else:
+                endpoint_results = run_gunicorn(path, dict(settings, rows=rows), args.workers)
+            for result in endpoint_results:
+                results.append(dict(mode=mode, rows=rows, **result))
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'settings': dict(settings, workers=args.workers),
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} of the baseline", file=sys.stderr)
@@ -0,0 +1,107 @@
+"""
+Serialization Benchmark
+
+Times how a list of trends is turned into a JSON response body, on a
+generated catalogue (generate_catalogue.py) in a temporary SQLite database:
+
+- ``orm+jsonify``: ORM instances with selectin-loaded reformulated queries,
+  a dict literal per trend with datetime.isoformat(), and Flask's jsonify
+  (the endpoints before serializers.py)
+- ``tuples+stdlib``: Core tuples from trend_columns() and serialize_trends(),
+  encoded with the standard library backend
+- ``tuples+orjson``: the same rows encoded with orjson (when installed)
+
+Each path is run --repeat times and the fastest run is reported, split into
+fetching and building the dicts, and encoding them.
+
+Usage:
+    python benchmarks/serialization.py [--rows 100000] [--repeat 3]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database  # noqa: F401 - applies the SQLite connection pragmas
+from generate_catalogue import generate_trends
+from import_trends import import_rows
+from models import TrendingCollection, db
+from serializers import JSON_BACKENDS, reformulated_queries, serialize_trends, trend_columns
+
+
+def orm_jsonify(engine, app):
+    started = time.perf_counter()
+    with Session(engine) as session:
+        trends = [{
+            'id': trend.id,
+            'original_query': trend.original_query,
+            'trend_topic': trend.trend_topic,
+            'description': trend.description,
+            'reformulated_queries': trend.reformulated_queries,
+            'category': trend.category,
+            'created_at': trend.created_at.isoformat() if trend.created_at else None,
+            'updated_at': trend.updated_at.isoformat() if trend.updated_at else None
+        } for trend in session.query(TrendingCollection).order_by(TrendingCollection.id)]
+    built = time.perf_counter()
+    with app.app_context():
+        body = jsonify(trends).get_data()
+    return built - started, time.perf_counter() - built, len(body)
+
+
+def tuples(engine, backend):
+    dumps = JSON_BACKENDS[backend]
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        columns = trend_columns(connection.dialect)
+        rows = connection.execute(select(*columns).order_by(columns[0])).all()
+        trends = serialize_trends(rows, reformulated_queries(connection, [row[0] for row in rows]))
+    built = time.perf_counter()
+    body = dumps(trends)
+    return built - started, time.perf_counter() - built, len(body)
+
+
+def best_of(repeat, run):
+    runs = [run() for _ in range(repeat)]
+    return min(runs, key=lambda result: result[0] + result[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare trend list serialization paths')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'serialization.db')}")
+        db.metadata.create_all(engine)
+        import_rows(engine, generate_trends(args.rows), batch_size=5000, upsert=False, fast=True, out=io.StringIO())
+        app = Flask(__name__)
+
+        paths = {'orm+jsonify': lambda: orm_jsonify(engine, app)}
+        for backend in JSON_BACKENDS:
+            paths[f'tuples+{backend}'] = lambda backend=backend: tuples(engine, backend)
+
+        baseline = None
+        for name, run in paths.items():
+            build, encode, size = best_of(args.repeat, run)
+            total = build + encode
+            baseline = baseline or total
+            print(json.dumps({
+                'path': name,
+                'rows': args.rows,
+                'build_seconds': round(build, 3),
+                'encode_seconds': round(encode, 3),
+                'total_seconds': round(total, 3),
+                'speedup': round(baseline / total, 2),
+                'body_bytes': size,
+            }))
+        engine.dispose()
@@ -0,0 +1,140 @@
+"""
+SQLite Mode Benchmark
+
+Compares the stock SQLite settings with the tuned settings from database.py
+under the access pattern of several gunicorn workers: writer processes
+inserting trends in small transactions while reader processes page through
+the table.
+
+For each mode it reports write and read throughput and how many operations
+failed with "database is locked".
+
+Usage:
+    python benchmarks/sqlite_modes.py [--writers 4] [--readers 4] [--seconds 5]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import SQLITE_PRAGMAS
+
+MODES = {
+    # Python's sqlite3 defaults: rollback journal, full fsync, 5s driver timeout
+    'default': {'pragmas': (), 'timeout': 5.0},
+    # Rollback journal without waiting for locks, as a worst case
+    'default-no-wait': {'pragmas': (), 'timeout': 0.0},
+    'tuned': {'pragmas': SQLITE_PRAGMAS, 'timeout': 0.0},
+}
+
+SCHEMA = '''
+    CREATE TABLE trending_collection (
+        id INTEGER PRIMARY KEY,
+        original_query VARCHAR(200) NOT NULL,
+        trend_topic VARCHAR(200) NOT NULL,
+        description TEXT NOT NULL,
+        category VARCHAR(100)
+    )
+'''
+SEED_ROWS = 10000
+PAGE_SIZE = 100
+
+
+def connect(path, mode):
+    connection = sqlite3.connect(path, timeout=MODES[mode]['timeout'], isolation_level=None)
+    for name, value in MODES[mode]['pragmas']:
+        connection.execute(f'PRAGMA {name} = {value}')
+    return connection
+
+
+def writer(path, mode, deadline, results):
+    connection = connect(path, mode)
+    done = locked = 0
+    while time.time() < deadline:
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'INSERT INTO trending_collection (original_query, trend_topic, description, category) '
+                'VALUES (?, ?, ?, ?)', ('Bench Query', f'Topic {os.getpid()} {done}', 'x' * 500, 'Bench'))
+            connection.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            locked += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+    results.put(('write', done, locked))
+
+
+def reader(path, mode, deadline, results):
+    connection = connect(path, mode)
+    done = locked = 0
+    last_id = 0
+    while time.time() < deadline:
+        try:
+            rows = connection.execute(
+                'SELECT id, original_query, trend_topic, description, category FROM trending_collection '
+                'WHERE id > ? ORDER BY id LIMIT ?', (last_id, PAGE_SIZE)).fetchall()
+            last_id = rows[-1][0] if len(rows) == PAGE_SIZE else 0
+            done += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            locked += 1
+    results.put(('read', done, locked))
+
+
+def run_mode(mode, writers, readers, seconds):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        connection = connect(path, mode)
+        connection.execute(SCHEMA)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO trending_collection (original_query, trend_topic, description, category) '
+            'VALUES (?, ?, ?, ?)', [('Seed Query', f'Seed {i}', 'x' * 500, 'Seed') for i in range(SEED_ROWS)])
+        connection.execute('COMMIT')
+        connection.close()
+
+        results = multiprocessing.Queue()
+        deadline = time.time() + seconds
+        processes = [multiprocessing.Process(target=writer, args=(path, mode, deadline, results))
+                     for _ in range(writers)]
+        processes += [multiprocessing.Process(target=reader, args=(path, mode, deadline, results))
+                      for _ in range(readers)]
+        for process in processes:
+            process.start()
+        totals = {'writes': 0, 'write_locked': 0, 'reads': 0, 'read_locked': 0}
+        for _ in processes:
+            kind, done, locked = results.get()
+            totals[f'{kind}s'] += done
+            totals[f'{kind}_locked'] += locked
+        for process in processes:
+            process.join()
+
+    return {
+        'mode': mode,
+        'writes_per_second': round(totals['writes'] / seconds),
+        'reads_per_second': round(totals['reads'] / seconds),
+        'write_locked_errors': totals['write_locked'],
+        'read_locked_errors': totals['read_locked'],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare SQLite journal/locking settings under concurrency')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        print(json.dumps(run_mode(mode, args.writers, args.readers, args.seconds)))
@@ -0,0 +1,331 @@
+"""
+Bulk Trend Loading
+
+Validation and batched Core insert/upsert of trend collections, shared by
+POST /api/trends/bulk and the command-line loaders.
+
+Rows are written with executemany statements, one transaction per batch,
+instead of one ORM object and one commit per trend. Because this bypasses
+the ORM session, each batch also refreshes the state the session hooks
+normally maintain (search index, rollups, collection version and change
+log) itself. Deleted trends need nothing: delete triggers clean up after
+them (see models.trend_delete_trigger).
+
+Upserts rely on the unique (original_query, trend_topic) index: rows are
+written with INSERT ... ON CONFLICT DO UPDATE, so two loaders writing the
+same key at once cannot both insert it. Plain inserts (mode=insert) fail
+on a key another loader inserted after the batch was checked.
+"""
+
+import json
+from datetime import datetime, timezone
+from operator import itemgetter
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+import changes
+import rollups
+import search
+import versioning
+from models import ReformulatedQuery, TrendingCollection, normalize_query, split_reformulated_queries
+
+DEFAULT_BATCH_SIZE = 500
+
+# Keys or ids per IN list. A key takes two bound parameters, which keeps
+# every lookup under SQLite's historic limit of 999 whatever the batch size
+LOOKUP_CHUNK_SIZE = 400
+
+# Columns an upsert overwrites; created_at keeps its original value
+UPSERT_COLUMNS = ('description', 'category', 'updated_at')
+
+REQUIRED_FIELDS = ('original_query', 'trend_topic', 'description', 'reformulated_queries')
+
+# Maximum lengths of the string columns
+FIELD_LENGTHS = {
+    'original_query': TrendingCollection.original_query.type.length,
+    'trend_topic': TrendingCollection.trend_topic.type.length,
+    'category': TrendingCollection.category.type.length,
+}
+
+# Optional timestamps, e.g. from an export or a generated catalogue; rows
+# without them get the database's current time
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+# How timestamps are passed to the driver: the storage format of the
+# SQLite column type, which PostgreSQL accepts as a timestamp literal too
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+trends_table = TrendingCollection.__table__
+queries_table = ReformulatedQuery.__table__
+
+
+def parse_ndjson(text):
+    """
+    Parse newline-delimited JSON, one object per line.
+
+    Returns:
+        List of parsed rows; lines that are not valid JSON are returned as
+        ValueError instances so they can be reported per row
+    """
+    rows = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError as e:
+            rows.append(ValueError(f'Invalid JSON: {e}'))
+    return rows
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 timestamp (as written by the export endpoint).
+
+    Returns:
+        The timestamp in UTC as a TIMESTAMP_FORMAT string, or None if the
+        value is not a valid timestamp
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+
+def validate_row(row):
+    """
+    Check and clean one incoming trend.
+
+    Returns:
+        (clean_row, error) - exactly one of them is None
+    """
+    if isinstance(row, ValueError):
+        return None, str(row)
+    if not isinstance(row, dict):
+        return None, 'Row must be a JSON object'
+
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+
+    clean = {}
+    for field in REQUIRED_FIELDS + ('category',):
+        value = row.get(field)
+        if value is None:
+            clean[field] = None if field == 'category' else ''
+            continue
+        if field == 'reformulated_queries' and isinstance(value, list):
+            value = ', '.join(str(item) for item in value)
+        if not isinstance(value, str):
+            return None, f'{field} must be a string'
+        value = value.strip() if field != 'description' else value
+        if field in FIELD_LENGTHS and len(value) > FIELD_LENGTHS[field]:
+            return None, f'{field} must be at most {FIELD_LENGTHS[field]} characters'
+        clean[field] = value
+
+    for field in TIMESTAMP_FIELDS:
+        if row.get(field) in (None, ''):
+            continue
+        timestamp = parse_timestamp(row[field])
+        if timestamp is None:
+            return None, f'{field} must be an ISO 8601 timestamp'
+        clean[field] = timestamp
+
+    clean['queries'] = split_reformulated_queries(clean.pop('reformulated_queries'))
+    if not clean['queries']:
+        return None, 'reformulated_queries must contain at least one query'
+    return clean, None
+
+
+def validate_rows(rows):
+    """
+    Validate every row before anything is written.
+
+    Rows repeating the (original_query, trend_topic) key of an earlier row
+    in the same payload are rejected, so each key is written once.
+
+    Returns:
+        (valid, results) where valid is a list of (index, clean_row) and
+        results holds one status dict per input row, pre-filled for errors
+    """
+    valid, results, seen = [], [], {}
+    for index, row in enumerate(rows):
+        clean, error = validate_row(row)
+        if clean is not None:
+            key = (clean['original_query'], clean['trend_topic'])
+            if key in seen:
+                clean, error = None, f'Duplicate of row {seen[key]}'
+            else:
+                seen[key] = index
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+        else:
+            results.append({'index': index, 'status': None})
+            valid.append((index, clean))
+    return valid, results
+
+
+def insert_many(connection, table, rows, statement=None):
+    """
+    executemany an INSERT of plain str/int/None values straight through the
+    DB-API driver. The statement is compiled once; this skips SQLAlchemy's
+    per-row parameter processing, which dominates large batches.
+
+    Parameters:
+        statement: INSERT to run instead of table.insert(), e.g. an upsert
+    """
+    if not rows:
+        return
+    statement = table.insert() if statement is None else statement
+    compiled = statement.compile(dialect=connection.dialect, column_keys=list(rows[0]))
+    if compiled.positional:
+        params = list(map(itemgetter(*compiled.positiontup), rows))
+    else:
+        params = rows
+    connection.exec_driver_sql(str(compiled), params)
+
+
+def upsert_statement(dialect):
+    """
+    INSERT into trending_collection that updates the trend already stored
+    under the same (original_query, trend_topic) key instead of failing.
+    ON CONFLICT needs SQLite 3.24+ or PostgreSQL.
+    """
+    insert = postgresql.insert if dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(trends_table)
+    # excluded.updated_at is the row's own timestamp or the column default
+    return statement.on_conflict_do_update(
+        index_elements=[trends_table.c.original_query, trends_table.c.trend_topic],
+        set_={column: statement.excluded[column] for column in UPSERT_COLUMNS}
+    )
+
+
+def _chunks(items, size=LOOKUP_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _existing_ids(connection, keys):
+    """Map (original_query, trend_topic) keys to existing trend ids"""
+    key_column = tuple_(trends_table.c.original_query, trends_table.c.trend_topic)
+    ids = {}
+    for chunk in _chunks(keys):
+        rows = connection.execute(
+            select(trends_table.c.original_query, trends_table.c.trend_topic, trends_table.c.id)
+            .where(key_column.in_(chunk))
+        )
+        ids.update(((query, topic), trend_id) for query, topic, trend_id in rows)
+    return ids
+
+
+def write_batch(connection, batch, upsert=True, sync=True):
+    """
+    Insert (or upsert) one batch of validated rows inside the caller's
+    transaction, using one executemany statement per kind of write.
+
+    Parameters:
+        connection: SQLAlchemy connection with an open transaction
+        batch (list): (index, clean_row) pairs from validate_rows()
+        upsert (bool): Update rows whose (original_query, trend_topic)
+            already exists; when False they are reported as errors
+        sync (bool): Refresh the search index, rollups and collection
+            version for this batch. Loaders that rebuild them once at the
+            end pass False
+
+    Returns:
+        Dict mapping input index to a status dict
+    """
+    statuses = {}
+    # Only tells created from updated rows (and finds errors for inserts);
+    # the unique index decides what is written
+    existing = _existing_ids(connection, {(row['original_query'], row['trend_topic']) for _, row in batch})
+
+    writes = []
+    for index, row in batch:
+        trend_id = existing.get((row['original_query'], row['trend_topic']))
+        if trend_id is not None and not upsert:
+            statuses[index] = {'index': index, 'status': 'error', 'error': 'Trend already exists', 'id': trend_id}
+        else:
+            writes.append((index, row))
+    if not writes:
+        return statuses
+
+    # insert_many needs the same columns in every row, so rows that bring
+    # their own timestamps are written separately
+    by_columns = {}
+    for _, row in writes:
+        values = {'original_query': row['original_query'], 'trend_topic': row['trend_topic'],
+                  'description': row['description'], 'category': row['category']}
+        values.update((field, row[field]) for field in TIMESTAMP_FIELDS if field in row)
+        by_columns.setdefault(tuple(values), []).append(values)
+    statement = upsert_statement(connection.dialect) if upsert else None
+    for values in by_columns.values():
+        insert_many(connection, trends_table, values, statement)
+
+    # executemany cannot return generated keys, so look them up again
+    # through the (original_query, trend_topic) index
+    keys = {(row['original_query'], row['trend_topic']) for _, row in writes}
+    written_ids = _existing_ids(connection, keys)
+    for index, row in writes:
+        key = (row['original_query'], row['trend_topic'])
+        status = 'updated' if key in existing else 'created'
+        statuses[index] = {'index': index, 'status': status, 'id': written_ids[key]}
+
+    # Replace the reformulated queries of every written trend: a key
+    # reported as created may have been inserted by another loader since
+    for chunk in _chunks(written_ids.values()):
+        connection.execute(queries_table.delete().where(queries_table.c.trend_id.in_(chunk)))
+
+    written = [(statuses[index]['id'], row) for index, row in writes]
+    children = [
+        {'trend_id': trend_id, 'position': position, 'text': query, 'normalized_text': normalize_query(query)}
+        for trend_id, row in written
+        for position, query in enumerate(row['queries'])
+    ]
+    insert_many(connection, queries_table, children)
+
+    if sync:
+        sync_derived_state(connection, [trend_id for trend_id, _ in written])
+    return statuses
+
+
+def sync_derived_state(connection, changed_ids):
+    """
+    Refresh what the ORM session hooks would have maintained for trends
+    written with Core statements: the search index, the rollups, the
+    collection version and the change log. Call inside the writing
+    transaction.
+    """
+    changed_ids = set(changed_ids)
+    if not changed_ids:
+        return
+    search.reindex_trends(connection, changed_ids)
+    rollups.sync_trends(connection, changed_ids)
+    versioning.bump_version(connection)
+    changes.record_changes(connection, changed_ids)
+
+
+def load_trends(engine, rows, upsert=True, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validate all rows, then write the valid ones in batched transactions.
+
+    Returns:
+        List with one status dict per input row, in input order
+    """
+    valid, results = validate_rows(rows)
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        with engine.begin() as connection:
+            for index, status in write_batch(connection, batch, upsert).items():
+                results[index] = status
+    return results
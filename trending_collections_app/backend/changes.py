@@ -0,0 +1,140 @@
+"""
+Trend Change Feed
+
+A change log behind GET /api/trends/changes, so clients can stay in sync by
+fetching only what changed since their last sync instead of the collection.
+
+- ``trend_change`` holds one row per trend: the collection version (see
+  versioning.py) of its latest change, and whether that change deleted it.
+  Deleted trends keep their row as a tombstone.
+- The collection version is bumped in every writing transaction and its
+  row lock serializes writers, so versions increase in commit order. Unlike
+  updated_at, they have no second resolution or clock skew to lose changes
+  to.
+- Clients page through the log in (version, trend_id) order with a cursor.
+  A trend that changes again moves to the end of the log, so a client sees
+  it again however far it has read. A full sync (no cursor) starts without
+  tombstones; later pages may carry tombstones of trends the client never
+  received, which it ignores.
+- Changes are logged right after the version bump: by the session hook in
+  versioning.py for ORM writes, and by bulk.sync_derived_state for Core
+  writes. Deletes are bumped and logged by a delete trigger, whatever
+  deletes the trend.
+- Loads that bypass the log (import_trends.py --fast, populate_db.py) call
+  ``reset_log``, which bumps the collection version, logs every trend at
+  the new version and moves the ``trend_change_horizon`` there. Every cursor
+  issued before is then older than the horizon and refused, so those
+  clients sync again from scratch.
+
+Usage:
+    python changes.py    # reset the change log of the application database
+"""
+
+from sqlalchemy import select, text
+
+from models import db, TrendChange, TrendChangeHorizon, TrendingCollection, trend_delete_trigger
+from pagination import DEFAULT_PAGE_SIZE, apply_keyset
+from serializers import QUERIES_FIELD, TREND_FIELDS, reformulated_queries, serialize_trends, trend_columns
+
+# Sort field recorded in change cursors (see pagination.encode_cursor)
+CURSOR_FIELD = 'change'
+
+changes_table = TrendChange.__table__
+horizon_table = TrendChangeHorizon.__table__
+trends_table = TrendingCollection.__table__
+
+# The version subquery reads this transaction's own bump, so call after
+# versioning.bump_version. ON CONFLICT needs SQLite 3.24+ or PostgreSQL
+_RECORD = text(
+    "INSERT INTO trend_change (trend_id, version, deleted) "
+    "VALUES (:trend_id, (SELECT version FROM collection_version WHERE id = 1), :deleted) "
+    "ON CONFLICT (trend_id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted"
+)
+
+
+# Same bump as versioning.bump_version, which imports this module
+_BUMP = "UPDATE collection_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1"
+
+trend_delete_trigger('trend_change_delete', [
+    _BUMP,
+    "INSERT INTO trend_change (trend_id, version, deleted) "
+    "VALUES (OLD.id, (SELECT version FROM collection_version WHERE id = 1), TRUE) "
+    "ON CONFLICT (trend_id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted",
+])
+
+
+def record_changes(connection, changed_ids):
+    """Log trends as changed at the current collection version"""
+    params = [{'trend_id': trend_id, 'deleted': False} for trend_id in sorted(set(changed_ids))]
+    if params:
+        connection.execute(_RECORD, params)
+
+
+def reset_log(connection):
+    """
+    Bump the collection version, log every trend as changed at the new
+    version and move the horizon there, after writes that were not logged.
+    """
+    changes_table.create(bind=connection, checkfirst=True)
+    horizon_table.create(bind=connection, checkfirst=True)
+    connection.execute(text(_BUMP))
+    connection.execute(changes_table.delete())
+    connection.execute(text(
+        "INSERT INTO trend_change (trend_id, version, deleted) "
+        "SELECT id, (SELECT version FROM collection_version WHERE id = 1), :deleted FROM trending_collection"
+    ), {'deleted': False})
+    connection.execute(text(
+        "UPDATE trend_change_horizon SET version = (SELECT version FROM collection_version WHERE id = 1) "
+        "WHERE id = 1"
+    ))
+
+
+def horizon(connection):
+    """Oldest collection version a sync cursor may point at"""
+    return connection.execute(select(horizon_table.c.version).where(horizon_table.c.id == 1)).scalar() or 0
+
+
+def read_changes(connection, fields=TREND_FIELDS, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Read one page of the change log.
+
+    Parameters:
+        connection: SQLAlchemy connection
+        fields (tuple): Trend fields to return for changed trends
+        after (tuple): (version, trend_id) of the last change the client
+            has applied; None starts a full sync, which skips tombstones
+        limit (int): Maximum number of changes
+
+    Returns:
+        (trends, deleted_ids, last, has_more): changed trends in log order,
+        ids of deleted trends, the (version, trend_id) position of the
+        page's last change (None if the page is empty) and whether more
+        changes follow
+    """
+    query = (
+        select(*trend_columns(connection.dialect, fields), changes_table.c.deleted,
+               changes_table.c.version, changes_table.c.trend_id)
+        .select_from(changes_table.outerjoin(trends_table, trends_table.c.id == changes_table.c.trend_id))
+    )
+    if after is None:
+        query = query.where(changes_table.c.deleted.is_(False))
+    query = apply_keyset(query, changes_table.c.version, changes_table.c.trend_id, 'asc', after)
+
+    rows = connection.execute(query.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # A trend deleted after its change was logged reads as a tombstone too
+    changed = [row for row in rows if not row[-3] and row[0] is not None]
+    deleted = [row[-1] for row in rows if row[-3] or row[0] is None]
+    queries = reformulated_queries(connection, [row[0] for row in changed]) if QUERIES_FIELD in fields else None
+    last = (rows[-1][-2], rows[-1][-1]) if rows else None
+    return serialize_trends(changed, queries, fields), deleted, last, has_more
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            reset_log(connection)
+            print(f"Reset the trend change log at version {horizon(connection)}")
@@ -0,0 +1,143 @@
+"""
+Response Compression
+
+Compresses API responses (JSON, NDJSON and CSV) with the content coding the
+client accepts, brotli over gzip, negotiated from ``Accept-Encoding`` in an
+after_request hook. Trend lists are highly repetitive (the same field names,
+categories and query prefixes on every row), so they shrink several times.
+
+- Buffered bodies under COMPRESSION_MIN_SIZE bytes are sent as they are:
+  below roughly a packet, compression costs more CPU than it saves time.
+  A compressed body that is not smaller than the original is not used.
+- COMPRESSION_LEVEL sets the gzip level (1-9, 0 disables compression) and
+  COMPRESSION_BROTLI_QUALITY the brotli quality (0-11). The defaults favour
+  speed, since dynamic responses are compressed while the client waits.
+- Streamed responses (the export) are compressed chunk by chunk with an
+  incremental compressor that is flushed after every chunk, so the client
+  still receives rows as they are produced.
+- Responses built from, or stored in, the response cache carry their cache
+  entry (``response.cache_slot``); the compressed body is kept in the entry,
+  so a cache hit is served without compressing anything again.
+- A compressed representation gets its own strong ETag, the identity ETag
+  with the coding appended (``v42-gzip``), and every eligible response is
+  sent with ``Vary: Accept-Encoding``. versioning.not_modified_response
+  accepts either form on revalidation.
+
+Static assets are not handled here: assets.py serves precompressed files.
+"""
+
+import gzip
+import zlib
+
+from flask import request
+
+from assets import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # Optional: responses are gzip-compressed only
+    brotli = None
+
+# Content codings applied to responses, in order of preference
+CODINGS = ('br', 'gzip')
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+
+
+def encoded_etag(etag, coding):
+    """ETag of the ``coding`` representation of a response tagged ``etag``"""
+    return f'{etag}-{coding}'
+
+
+def _gzip_stream(chunks, level):
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class Compressor:
+    """Registers the after_request hook that compresses API responses"""
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.level = 6
+        self.brotli_quality = 4
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESSION_LEVEL', 6)
+        app.config.setdefault('COMPRESSION_BROTLI_QUALITY', 4)
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.level = app.config['COMPRESSION_LEVEL']
+        self.brotli_quality = app.config['COMPRESSION_BROTLI_QUALITY']
+        app.after_request(self._compress_response)
+
+    def choose_coding(self, accept_encoding):
+        """The preferred coding the client accepts, or None for identity"""
+        if self.level <= 0:
+            return None
+        accepted = accepted_encodings(accept_encoding)
+        for coding in CODINGS:
+            if coding in accepted and (coding != 'br' or brotli is not None):
+                return coding
+        return None
+
+    def compress(self, data, coding):
+        """Compress a complete body"""
+        if coding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def compress_stream(self, chunks, coding):
+        """Compress an iterable of body chunks incrementally"""
+        chunks = (chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in chunks)
+        if coding == 'br':
+            return _brotli_stream(chunks, self.brotli_quality)
+        return _gzip_stream(chunks, self.level)
+
+    def _compress_response(self, response):
+        if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers or self.level <= 0):
+            return response
+        response.vary.add('Accept-Encoding')
+        coding = self.choose_coding(request.headers.get('Accept-Encoding'))
+        if coding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self.compress_stream(response.response, coding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            slot = getattr(response, 'cache_slot', None)
+            data = slot.entry.variants.get(coding) if slot is not None else None
+            if data is None:
+                data = self.compress(body, coding)
+                if slot is not None:
+                    slot.cache.add_variant(slot.entry, coding, data)
+            if len(data) >= len(body):
+                return response
+            response.set_data(data)
+
+        response.headers['Content-Encoding'] = coding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(encoded_etag(etag, coding), weak)
+        return response
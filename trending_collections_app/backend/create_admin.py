@@ -6,7 +6,15 @@ def create_admin(email, password):
         # Check if admin already exists
         existing_admin = User.query.filter_by(email=email).first()
         if existing_admin:
-            print(f"Admin user {email} already exists")
+            if existing_admin.is_admin:
+                print(f"Admin user {email} already exists")
+                return
+            # Promote the existing user. Committing bumps the user version,
+            # so running workers drop their cached records on the next
+            # request and the user's old tokens are rejected
+            existing_admin.is_admin = True
+            db.session.commit()
+            print(f"User {email} promoted to admin")
             return
 
         # Create new admin user
@@ -0,0 +1,83 @@
+"""
+Catalogue Export
+
+Generators that stream the whole trend catalogue as NDJSON or CSV for
+GET /api/trends/export.
+
+Trend rows are read from a single streaming cursor (``stream_results``, a
+server-side cursor on PostgreSQL) in fixed-size partitions and serialized
+by serializers.py. Reformulated queries are fetched with one query per
+partition, and every partition is encoded and yielded before the next one
+is read, so memory use stays constant and the first bytes go out as soon
+as the first partition is read. NDJSON rows are encoded with the app's
+JSON backend (serializers.JSONBackend), like every other JSON response.
+"""
+
+import csv
+import io
+
+from sqlalchemy import select
+
+from serializers import QUERIES_FIELD, TREND_FIELDS, reformulated_queries, serialize_trends, trend_columns
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FIELDS = TREND_FIELDS
+
+
+def iter_trend_chunks(connection, chunk_size=EXPORT_CHUNK_SIZE, fields=EXPORT_FIELDS):
+    """
+    Yield lists of trend dicts (ordered by id), one list per partition
+    read from the streaming cursor, with only the given fields.
+    """
+    columns = trend_columns(connection.dialect, fields)
+    result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(
+        select(*columns).order_by(columns[0])
+    )
+    for partition in result.partitions(chunk_size):
+        queries = None
+        if QUERIES_FIELD in fields:
+            queries = reformulated_queries(connection, [row[0] for row in partition])
+        yield serialize_trends(partition, queries, fields)
+
+
+def ndjson_stream(chunks, json_backend, fields=EXPORT_FIELDS):
+    """
+    Encode trend chunks as NDJSON with ``json_backend`` (a
+    serializers.JSONBackend), one bytes string per chunk; keys come from
+    the dicts.
+    """
+    dumps = json_backend.dumps
+    for chunk in chunks:
+        yield b''.join(dumps(row) + b'\n' for row in chunk)
+
+
+def csv_stream(chunks, json_backend, fields=EXPORT_FIELDS):
+    """
+    Encode trend chunks as CSV with a header row of ``fields``, one string
+    per chunk. ``json_backend`` is unused: CSV cells are plain text.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson', ndjson_stream),
+    'csv': ('text/csv', 'csv', csv_stream),
+}
+
+
+def export_stream(engine, encode, json_backend, chunk_size=EXPORT_CHUNK_SIZE, fields=EXPORT_FIELDS):
+    """
+    Stream the catalogue through ``encode`` on a dedicated connection that
+    lives exactly as long as the response body.
+    """
+    with engine.connect() as connection:
+        yield from encode(iter_trend_chunks(connection, chunk_size, fields), json_backend, fields)
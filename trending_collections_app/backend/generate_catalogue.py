@@ -0,0 +1,265 @@
+"""
+Synthetic Catalogue Generator
+
+Generates production-shaped trend catalogues of any size for benchmarks,
+index tuning and capacity planning, in the footwear and sock domain of
+populate_db.py. The output is deterministic: the same seed and options
+always produce the same rows.
+
+- original_query values follow a Zipf (long-tail) distribution over a
+  vocabulary of modifier/product/audience combinations, so a few queries
+  own many trends and most own one or two.
+- Trend topics are unique per original query, matching the
+  (original_query, trend_topic) key the bulk loader upserts on.
+- Each trend has a varying number of reformulated queries of varying
+  length, a skewed category (a few trends have none) and a description of
+  one to four sentences.
+- created_at grows denser towards the end of the time window, like a
+  catalogue that keeps growing, and ids follow creation order. About 60% of
+  trends have been updated some days after they were created.
+
+Rows are written to JSONL or CSV (readable by import_trends.py), or loaded
+straight into the application database through the same fast path.
+
+Usage:
+    python generate_catalogue.py --rows 100000 --output catalogue.jsonl
+    python generate_catalogue.py --rows 1000000 --seed 7 --output catalogue.csv
+    python generate_catalogue.py --rows 100000 --database
+"""
+
+import argparse
+import bisect
+import csv
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Bump when a change alters the rows generated for a given seed, so cached
+# catalogues (e.g. benchmarks/api_load.py's) are regenerated
+GENERATOR_VERSION = 1
+
+FIELDS = ('original_query', 'trend_topic', 'description', 'reformulated_queries', 'category',
+          'created_at', 'updated_at')
+
+PRODUCTS = ('Socks', 'Shoes', 'Running Shoes', 'Sneakers', 'Boots', 'Winter Boots', 'Dress Shoes',
+            'Athletic Socks', 'Casual Shoes', 'Slippers', 'Sandals', 'Beach Shoes', 'Hiking Boots',
+            'Loafers', 'Ankle Boots', 'Compression Socks', 'Wool Socks', 'Trail Runners', 'Flip Flops',
+            'Clogs', 'Rain Boots', 'Work Boots', 'Ballet Flats', 'Heels', 'Espadrilles', 'Mules',
+            'No Show Socks', 'Knee High Socks', 'Crew Socks', 'Basketball Shoes')
+AUDIENCES = ('', 'for Men', 'for Women', 'for Kids', 'for Girls', 'for Boys', 'for Toddlers', 'for Seniors')
+MODIFIERS = ('', 'Cheap', 'Best', 'Waterproof', 'Wide', 'Vegan', 'Black', 'White', 'Designer',
+             'Orthopedic', 'Lightweight', 'Cute', 'Funny', 'Warm', 'Breathable', 'Non Slip', 'Leather',
+             'Sustainable')
+
+THEMES = ('Star Wars', 'Superhero', 'Argyle', 'Neon', 'Retro', 'Vintage', 'Eco', 'Memory Foam',
+          'Animal Print', 'Floral', 'Camo', 'Tie Dye', 'Glitter', 'Pastel', 'Plaid', 'Striped',
+          'Polka Dot', 'Holiday', 'Gaming', 'Anime', 'Minimalist', 'Chunky', 'Metallic', 'Faux Fur',
+          'Quilted', 'Knit', 'Suede', 'Canvas', 'Mesh', 'Bamboo', 'Light Up', 'Coral Safe', 'Urban',
+          'Moisture Wick', 'Cushioned', 'Heritage', 'Tropical', 'Galaxy', 'Checkerboard', 'Western')
+STYLES = ('Ankle', 'Crew', 'Low Top', 'High Top', 'Slip On', 'Lace Up', 'Platform', 'Trainers',
+          'Runners', 'Flats', 'Classics', 'Edition', 'Collection', 'Pro', 'Lite', 'Max', 'Originals',
+          'Essentials', 'Series', 'Line')
+COLORS = ('Navy', 'Black', 'White', 'Red', 'Olive', 'Beige', 'Pink', 'Grey', 'Tan', 'Burgundy', 'Teal')
+EXTRAS = ('with Arch Support', 'for Running', 'for Walking', 'Pack of 3', 'Pack of 6', 'Size 10',
+          'on Sale', 'Gift Set', 'for Wide Feet', 'for Winter', 'for Summer', 'Limited Edition')
+
+# Category names and how common they are (heaviest first)
+CATEGORIES = ('Fashion Footwear', 'Athletic Wear', 'Comfort Footwear', 'Winter Wear', 'Formal Wear',
+              "Children's Wear", 'Home Comfort', 'Summer Wear', 'Sustainable Fashion', 'Movie Theme',
+              'Superhero Theme', 'Gaming Theme', 'Fitness Gear', 'Outdoor Gear', 'Workwear')
+CATEGORY_WEIGHTS = tuple(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(CATEGORIES))))
+UNCATEGORIZED_SHARE = 0.03
+
+SENTENCES = ('Designed for all-day comfort.', 'Made from responsibly sourced materials.',
+             'A customer favourite this season.', 'Available in a wide range of sizes.',
+             'Machine washable and quick to dry.', 'Pairs well with both casual and smart outfits.',
+             'Reinforced heel and toe for durability.', 'Searches for this look are climbing fast.')
+
+MAX_REFORMULATIONS = 15
+MEAN_REFORMULATIONS = 4.5
+UPDATED_SHARE = 0.6
+MEAN_UPDATE_DELAY_DAYS = 30
+
+DEFAULT_END = '2024-06-30T00:00:00'
+DEFAULT_DAYS = 3 * 365
+
+
+def query_vocabulary(size, rng):
+    """
+    Distinct original_query strings in popularity order.
+
+    Plain queries ("Socks for Men") come before modified ones ("Vegan Socks
+    for Men"), which is roughly how real search demand ranks them.
+    """
+    plain = [f'{product} {audience}'.strip() for product in PRODUCTS for audience in AUDIENCES]
+    modified = [f'{modifier} {product} {audience}'.strip()
+                for modifier in MODIFIERS[1:] for product in PRODUCTS for audience in AUDIENCES]
+    rng.shuffle(plain)
+    rng.shuffle(modified)
+    return (plain + modified)[:size]
+
+
+def zipf_weights(size, exponent):
+    """Cumulative Zipf weights for ranks 1..size, for bisecting a uniform draw"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def generate_trends(count, seed=42, queries=2000, zipf=1.1, end=DEFAULT_END, days=DEFAULT_DAYS):
+    """
+    Yield ``count`` synthetic trend rows.
+
+    Parameters:
+        count (int): Number of rows
+        seed (int): Random seed; equal seeds give equal catalogues
+        queries (int): Size of the original_query vocabulary (at most the
+            number of modifier/product/audience combinations)
+        zipf (float): Zipf exponent of the original_query distribution;
+            larger values concentrate more trends on the top queries
+        end (str): ISO timestamp of the newest created_at
+        days (int): Length of the created_at window, in days
+
+    Returns:
+        Generator of dicts with the FIELDS keys, in the format
+        import_trends.py and POST /api/trends/bulk accept
+    """
+    rng = random.Random(seed)
+    draw = rng.random
+    vocabulary = query_vocabulary(queries, rng)
+    query_weights = zipf_weights(len(vocabulary), zipf)
+    total_weight = query_weights[-1]
+    audiences = [next((audience for audience in AUDIENCES[1:] if query.endswith(audience)), '')
+                 for query in vocabulary]
+    products = [query[:-len(audience)].strip() if audience else query
+                for query, audience in zip(vocabulary, audiences)]
+    # Topics per query walk the theme/style grid with a stride coprime to
+    # its size, from a per-query offset, so they stay unique per query
+    topics = [(theme, style) for theme in THEMES for style in STYLES]
+    stride = next(step for step in range(len(topics) // 3, len(topics)) if math.gcd(step, len(topics)) == 1)
+    offsets = [rng.randrange(len(topics)) for _ in vocabulary]
+    used = [0] * len(vocabulary)
+
+    end_time = datetime.fromisoformat(end)
+    span = days * 86400
+    start_time = end_time - timedelta(seconds=span)
+    mean_update_delay = MEAN_UPDATE_DELAY_DAYS * 86400
+
+    for i in range(count):
+        query_index = min(bisect.bisect_left(query_weights, draw() * total_weight), len(vocabulary) - 1)
+        n = used[query_index]
+        used[query_index] = n + 1
+        theme, style = topics[(offsets[query_index] + n * stride) % len(topics)]
+        trend_topic = f'{theme} {style}' if n < len(topics) else f'{theme} {style} {n // len(topics) + 1}'
+        product, audience = products[query_index], audiences[query_index]
+
+        # Stratified draws keep created_at increasing with the row number;
+        # the square root makes recent months busier than old ones
+        created_offset = int(span * math.sqrt((i + draw()) / count))
+        created_at = start_time + timedelta(seconds=created_offset)
+        updated_at = created_at
+        if draw() < UPDATED_SHARE:
+            delay = rng.expovariate(1 / mean_update_delay)
+            updated_at = created_at + timedelta(seconds=int(min(delay, span - created_offset)))
+
+        if draw() < UNCATEGORIZED_SHARE:
+            category = None
+        else:
+            category = CATEGORIES[bisect.bisect_left(CATEGORY_WEIGHTS, draw() * CATEGORY_WEIGHTS[-1])]
+
+        yield {
+            'original_query': vocabulary[query_index],
+            'trend_topic': trend_topic,
+            'description': _description(draw, theme, style, product),
+            'reformulated_queries': ', '.join(_reformulations(rng, theme, style, product, audience)),
+            'category': category,
+            'created_at': created_at.isoformat(),
+            'updated_at': updated_at.isoformat(),
+        }
+
+
+def _reformulations(rng, theme, style, product, audience):
+    # Gamma-distributed counts: most trends have 2-6 queries, a few many more
+    count = min(MAX_REFORMULATIONS, 1 + int(rng.gammavariate(2.0, (MEAN_REFORMULATIONS - 1) / 2)))
+    draw = rng.random
+    queries = {}
+    for _ in range(count * 3):  # A few attempts per query, since duplicates are skipped
+        query = f'{theme} {style} {product}' if draw() >= 0.2 else f'{theme} {product}'
+        if draw() < 0.4:
+            query = f'{COLORS[int(draw() * len(COLORS))]} {query}'
+        if audience and draw() < 0.5:
+            query = f'{query} {audience}'
+        if draw() < 0.3:
+            query = f'{query} {EXTRAS[int(draw() * len(EXTRAS))]}'
+        queries[query] = None
+        if len(queries) == count:
+            break
+    return queries
+
+
+def _description(draw, theme, style, product):
+    first = f'{theme} {style.lower()} {product.lower()} for everyday wear.'
+    start, extra = int(draw() * len(SENTENCES)), int(draw() * 4)
+    if not extra:
+        return first
+    return ' '.join((first,) + (SENTENCES * 2)[start:start + extra])
+
+
+def write_jsonl(rows, path):
+    """Write rows as JSON lines; returns the number of rows written"""
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row))
+            f.write('\n')
+            written += 1
+    return written
+
+
+def write_csv(rows, path):
+    """Write rows as CSV with a header row; returns the number of rows written"""
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic trend catalogue')
+    parser.add_argument('--rows', type=int, required=True, help='number of trends to generate')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--queries', type=int, default=2000, help='distinct original queries (default %(default)s)')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of the original queries')
+    parser.add_argument('--end', default=DEFAULT_END, help='newest created_at (default %(default)s)')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='created_at window in days')
+    destination = parser.add_mutually_exclusive_group(required=True)
+    destination.add_argument('--output', help='.jsonl or .csv file to write')
+    destination.add_argument('--database', action='store_true',
+                             help='load into the application database (import_trends.py --fast)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per transaction with --database')
+    args = parser.parse_args()
+
+    rows = generate_trends(args.rows, seed=args.seed, queries=args.queries, zipf=args.zipf,
+                           end=args.end, days=args.days)
+    started = time.perf_counter()
+    if args.database:
+        from app import app, db
+        from import_trends import import_rows
+
+        with app.app_context():
+            totals = import_rows(db.engine, rows, batch_size=args.batch_size, upsert=False, fast=True)
+        written = totals['created']
+    elif args.output.endswith('.csv'):
+        written = write_csv(rows, args.output)
+    elif args.output.endswith(('.jsonl', '.ndjson')):
+        written = write_jsonl(rows, args.output)
+    else:
+        parser.error('--output must end in .jsonl, .ndjson or .csv')
+    elapsed = time.perf_counter() - started
+    print(f"Generated {written:,} trends in {elapsed:.1f}s - {written / elapsed:,.0f} rows/sec", file=sys.stderr)
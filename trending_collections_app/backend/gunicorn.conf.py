@@ -0,0 +1,53 @@
+"""
+Gunicorn Configuration
+
+Prepares the shared directory prometheus_client uses to aggregate metrics
+across workers (see metrics.py), and creates/migrates the database once in
+the master so workers booting together do not race on it.
+
+Workers are threaded (gthread). A login waits on the password hashing pool
+(see hashing.py) in its request thread, so each worker gets more threads
+than the pool admits hashes: once HASHING_POOL_WORKERS + HASHING_POOL_MAX_QUEUE
+logins are pending, further logins are shed with a 503 while the remaining
+READ_THREADS keep serving reads.
+
+Start the server with:
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+
+# Request threads left for other endpoints when hashing admission is full
+READ_THREADS = int(os.environ.get('READ_THREADS', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', int(os.environ.get('HASHING_POOL_WORKERS', 2))
+                             + int(os.environ.get('HASHING_POOL_MAX_QUEUE', 16)) + READ_THREADS))
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+# Must be set before prometheus_client is first imported: it picks its
+# in-memory or mmap-backed value store at import time, and workers inherit
+# the master's modules
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'trending-collections-metrics'))
+
+
+def on_starting(server):
+    """Give every worker a clean multiprocess metrics directory"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+    # Tables and migrations before any worker imports the app
+    subprocess.run([sys.executable, 'migrations.py'], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,105 @@
+"""
+Password Hashing Pool
+
+PBKDF2 password hashing for login and register runs on a small dedicated
+thread pool instead of directly in the request worker. hashlib releases the
+GIL while it hashes, so the pool's threads use their own cores while the
+request threads keep serving reads.
+
+Admission is bounded: at most ``max_workers`` hashes run at once and at most
+``max_queue`` more wait for a thread. Beyond that ``submit`` raises
+HashingBusy straight away, which the API turns into a 503 with Retry-After,
+so a login storm is shed instead of starving every other endpoint.
+
+The work factor comes from PASSWORD_HASH_ITERATIONS. Hashes made with a
+different method are reported by ``needs_rehash`` so login can upgrade them.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# PBKDF2 work factor for new password hashes (werkzeug's default)
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 260000))
+PASSWORD_HASH_METHOD = f'pbkdf2:sha256:{PASSWORD_HASH_ITERATIONS}'
+
+
+def needs_rehash(password_hash, method=PASSWORD_HASH_METHOD):
+    """Whether a stored hash was made with a different method or work factor"""
+    return password_hash.split('$', 1)[0] != method
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated and a request is refused"""
+
+
+class HashingPool:
+    """
+    Size-limited executor for password hashing with queue-depth admission
+    control and timing counters.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hashing')
+        self._admission = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._counters = dict.fromkeys(('submitted', 'rejected', 'completed', 'failed'), 0)
+        self._timings = {'wait_seconds': 0.0, 'hash_seconds': 0.0, 'max_wait_seconds': 0.0, 'max_pending': 0}
+
+    def submit(self, func, *args):
+        """
+        Run ``func(*args)`` on the pool and wait for its result.
+
+        Raises:
+            HashingBusy: if max_workers + max_queue calls are already pending
+        """
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise HashingBusy('Password hashing is saturated')
+
+        with self._lock:
+            self._counters['submitted'] += 1
+            self._pending += 1
+            self._timings['max_pending'] = max(self._timings['max_pending'], self._pending)
+        try:
+            return self._executor.submit(self._timed, time.perf_counter(), func, args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._admission.release()
+
+    def _timed(self, queued_at, func, args):
+        started = time.perf_counter()
+        outcome = 'failed'
+        try:
+            result = func(*args)
+            outcome = 'completed'
+            return result
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._counters[outcome] += 1
+                self._timings['wait_seconds'] += started - queued_at
+                self._timings['hash_seconds'] += finished - started
+                self._timings['max_wait_seconds'] = max(self._timings['max_wait_seconds'], started - queued_at)
+
+    def stats(self):
+        """Counters, timings and current load, for sizing the pool"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update(self._timings)
+            stats.update(pending=self._pending, max_workers=self.max_workers, max_queue=self.max_queue,
+                         iterations=PASSWORD_HASH_ITERATIONS)
+        finished = stats['completed'] + stats['failed']
+        stats['avg_wait_ms'] = stats['wait_seconds'] * 1000 / finished if finished else 0.0
+        stats['avg_hash_ms'] = stats['hash_seconds'] * 1000 / finished if finished else 0.0
+        return stats
+
+    def shutdown(self):
+        """Stop the pool's threads once pending work is done"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,216 @@
+"""
+Bulk Import Command
+
+Streams trend collections from CSV, JSONL/NDJSON or JSON files into the
+database using the batched Core writes in bulk.py.
+
+Input is read and validated one batch at a time, so files of any size load
+in constant memory. Each batch is committed on its own and progress is
+reported as rows/sec; an interrupted load can be picked up again with
+--resume-from (or --checkpoint) without re-importing committed rows.
+
+With --fast the load is tuned for throughput: on SQLite the WAL journal, a
+larger page cache and in-memory temp storage are enabled, secondary indexes
+the loader does not need are dropped for the duration of the load, and the
+search index and rollups are rebuilt once at the end instead of after every
+batch. The change log is reset, so sync clients start over.
+
+CSV files need a header row with the trend field names; reformulated
+queries are a comma-separated string. created_at and updated_at are
+optional ISO 8601 timestamps, so exports load back unchanged.
+
+Usage:
+    python import_trends.py trends.csv more_trends.jsonl
+    python import_trends.py --fast --batch-size 5000 catalogue.jsonl
+    python import_trends.py --checkpoint load.offset catalogue.jsonl   # resumable
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import bulk
+import changes
+import rollups
+import search
+from models import ReformulatedQuery, TrendingCollection
+
+# Indexes the loader itself never reads. They are dropped during --fast
+# loads and rebuilt in one pass at the end, which is much cheaper than
+# maintaining them row by row. The (original_query, trend_topic) and
+# (trend_id, position) indexes stay, since upserts look rows up by them.
+DEFERRABLE_INDEXES = ('ix_trend_category_updated', 'ix_trend_topic_id', 'ix_trend_created_id',
+                      'ix_trend_updated_id', 'ix_reformulated_query_normalized')
+
+# Connection settings for --fast loads on SQLite
+SQLITE_LOAD_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -262144',  # 256 MB page cache
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Number of rejected rows printed before only counting them
+MAX_REPORTED_ERRORS = 20
+
+
+def read_rows(path):
+    """Yield rows from one input file, choosing the parser by extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    elif extension in ('.jsonl', '.ndjson'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield ValueError(f'Invalid JSON: {e}')
+    elif extension == '.json':
+        # A JSON array has to be parsed whole; prefer JSONL for large files
+        with open(path, encoding='utf-8') as f:
+            yield from json.load(f)
+    else:
+        raise ValueError(f'Unsupported file type: {path} (expected .csv, .jsonl, .ndjson or .json)')
+
+
+def _deferred_indexes():
+    tables = (TrendingCollection.__table__, ReformulatedQuery.__table__)
+    return [index for table in tables for index in table.indexes if index.name in DEFERRABLE_INDEXES]
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, offset):
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    with open(path + '.tmp', 'w') as f:
+        f.write(str(offset))
+    os.replace(path + '.tmp', path)
+
+
+def import_files(engine, paths, **options):
+    """
+    Import rows from the given files in order, as one stream of rows.
+
+    Takes the same options as import_rows() and returns its totals.
+    """
+    return import_rows(engine, (row for path in paths for row in read_rows(path)), **options)
+
+
+def import_rows(engine, rows, batch_size=bulk.DEFAULT_BATCH_SIZE, upsert=True, fast=False,
+                resume_from=0, checkpoint=None, out=sys.stdout):
+    """
+    Import rows from any iterable, e.g. a file reader or generate_catalogue.
+
+    Parameters:
+        engine: SQLAlchemy engine to load into
+        rows (iterable): Trend dicts (or ValueErrors for unparseable input)
+        batch_size (int): Rows validated and committed per transaction
+        upsert (bool): Update existing (original_query, trend_topic) keys
+            instead of reporting them as errors
+        fast (bool): Apply the load tuning described in the module docstring
+        resume_from (int): Number of input rows to skip (already committed)
+        checkpoint (str): File that records the committed offset after every
+            batch; when it exists its offset is used as resume_from
+
+    Returns:
+        Dict with created, updated, errors, rows, elapsed and rows_per_second
+    """
+    if checkpoint and not resume_from:
+        resume_from = _read_checkpoint(checkpoint)
+
+    rows = islice(rows, resume_from, None)
+    offset = resume_from
+    totals = {'created': 0, 'updated': 0, 'errors': 0, 'rows': 0}
+    sqlite = engine.dialect.name == 'sqlite'
+    deferred = _deferred_indexes() if fast else []
+
+    if resume_from:
+        print(f"Resuming after row {resume_from}", file=out)
+
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        if fast and sqlite:
+            for pragma in SQLITE_LOAD_PRAGMAS:
+                connection.exec_driver_sql(pragma)
+        with connection.begin():
+            for index in deferred:
+                index.drop(bind=connection, checkfirst=True)
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                valid, results = bulk.validate_rows(batch)
+                with connection.begin():
+                    statuses = bulk.write_batch(connection, valid, upsert=upsert, sync=not fast)
+                for index, status in statuses.items():
+                    results[index] = status
+
+                for result in results:
+                    if result['status'] == 'error':
+                        totals['errors'] += 1
+                        if totals['errors'] <= MAX_REPORTED_ERRORS:
+                            print(f"Row {offset + result['index']}: {result['error']}", file=out)
+                    else:
+                        totals[result['status']] += 1
+                offset += len(batch)
+                totals['rows'] += len(batch)
+                if checkpoint:
+                    _write_checkpoint(checkpoint, offset)
+
+                elapsed = time.perf_counter() - started
+                print(f"Committed through row {offset}: {totals['rows'] / elapsed:,.0f} rows/sec", file=out)
+        finally:
+            if fast:
+                print("Rebuilding deferred indexes, search index and rollups...", file=out)
+                with connection.begin():
+                    for index in deferred:
+                        index.create(bind=connection, checkfirst=True)
+                    search.rebuild_index(connection)
+                    rollups.rebuild_rollups(connection)
+                    changes.reset_log(connection)
+            if fast and sqlite:
+                connection.exec_driver_sql('PRAGMA optimize')
+
+    elapsed = time.perf_counter() - started
+    totals['elapsed'] = elapsed
+    totals['rows_per_second'] = totals['rows'] / elapsed if elapsed else 0.0
+    return totals
+
+
+if __name__ == '__main__':
+    from app import app, db
+
+    parser = argparse.ArgumentParser(description='Bulk import trend collections from CSV/JSONL/JSON files')
+    parser.add_argument('paths', nargs='+', help='input files, imported in order')
+    parser.add_argument('--batch-size', type=int, default=bulk.DEFAULT_BATCH_SIZE,
+                        help='rows per transaction (default %(default)s)')
+    parser.add_argument('--insert-only', action='store_true',
+                        help='report existing (original_query, trend_topic) keys as errors instead of updating them')
+    parser.add_argument('--fast', action='store_true',
+                        help='tune the database for a large load (see module docstring)')
+    parser.add_argument('--resume-from', type=int, default=0, metavar='ROW',
+                        help='skip this many input rows, e.g. the offset printed by an interrupted run')
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help='record the committed offset here and resume from it on the next run')
+    args = parser.parse_args()
+
+    with app.app_context():
+        totals = import_files(db.engine, args.paths, batch_size=args.batch_size, upsert=not args.insert_only,
+                              fast=args.fast, resume_from=args.resume_from, checkpoint=args.checkpoint)
+    print(f"Imported {totals['rows']:,} rows ({totals['created']:,} created, {totals['updated']:,} updated, "
+          f"{totals['errors']:,} rejected) in {totals['elapsed']:.1f}s - {totals['rows_per_second']:,.0f} rows/sec")
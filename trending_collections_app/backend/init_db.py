@@ -1,5 +1,6 @@
 from app import app, db
 from models import User, TrendingCollection
+import bulk
 
 # Sample trend data - 10 records
 trend_data = [
@@ -99,18 +100,8 @@ def init_db():
         
         # Check if trends exist
         if TrendingCollection.query.count() == 0:
-            # Add sample trends
-            for trend in trend_data:
-                new_trend = TrendingCollection(
-                    original_query=trend['original_query'],
-                    trend_topic=trend['trend_topic'],
-                    description=trend['description'],
-                    reformulated_queries=trend['reformulated_queries'],
-                    category=trend['category']
-                )
-                db.session.add(new_trend)
-            
-            db.session.commit()
+            # Add sample trends with batched inserts (see import_trends.py for files)
+            bulk.load_trends(db.engine, trend_data)
             print(f"Added {len(trend_data)} sample trends")
         else:
             print(f"Trends already exist ({TrendingCollection.query.count()} records)")
@@ -0,0 +1,143 @@
+"""
+Prometheus Metrics
+
+Request, database, cache and password-hashing metrics exported at /metrics
+in the Prometheus text format.
+
+Under gunicorn every worker is a separate process, so metrics are written to
+prometheus_client's mmap-backed multiprocess store when
+PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py sets it up) and /metrics
+aggregates the files of all workers, whichever worker serves the scrape.
+Without it, e.g. under the Flask dev server, the in-process registry is used.
+
+Per-request metrics are labelled by route template (``/api/trends/<int:trend_id>``),
+never by raw path, to keep label cardinality bounded.
+"""
+
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+from profiler import current_profile
+
+# Request latency buckets (seconds), dense around the API's expected range
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests', ['method', 'route', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time to produce the response',
+                            ['method', 'route'], buckets=LATENCY_BUCKETS)
+REQUEST_SIZE = Histogram('http_request_size_bytes', 'Request body size', ['method', 'route'],
+                         buckets=SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size (buffered responses only)',
+                          ['method', 'route', 'status'], buckets=SIZE_BUCKETS)
+DB_QUERIES = Histogram('db_queries_per_request', 'SQL statements executed per request', ['route'],
+                       buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram('db_time_per_request_seconds', 'Time spent in SQL statements per request', ['route'],
+                    buckets=LATENCY_BUCKETS)
+CACHE_EVENTS = Counter('cache_events_total', 'Cache lookups and maintenance by outcome', ['cache', 'event'])
+HASHING_EVENTS = Counter('password_hashing_total', 'Password hashing pool submissions by outcome', ['outcome'])
+HASHING_SECONDS = Counter('password_hashing_seconds_total', 'Time hashing requests spent queued or hashing',
+                          ['phase'])
+HASHING_PENDING = Gauge('password_hashing_pending', 'Hashes running or queued', multiprocess_mode='livesum')
+
+# Counters in the per-worker cache/pool stats that map to CACHE_EVENTS
+CACHE_COUNTERS = ('hits', 'misses', 'stale', 'expired', 'evictions', 'invalidations', 'user_hits', 'user_misses')
+
+
+def multiprocess_enabled():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+class _DeltaTracker:
+    """
+    Feeds monotonically increasing counters kept elsewhere (cache and pool
+    stats) into Prometheus counters, by adding only what changed since the
+    last call. Each worker adds its own deltas, so the sums stay correct.
+    """
+
+    def __init__(self):
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def delta(self, key, value):
+        with self._lock:
+            change = value - self._last.get(key, 0)
+            self._last[key] = value
+        return change if change > 0 else 0
+
+
+class Metrics:
+    """Registers the Flask and SQLAlchemy hooks that feed the metrics"""
+
+    def __init__(self, app=None, caches=None, hashing_pool=None):
+        self.caches = caches or {}
+        self.hashing_pool = hashing_pool
+        self._deltas = _DeltaTracker()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method, status = request.method, str(response.status_code)
+
+        REQUESTS.labels(method, route, status).inc()
+        REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+        if request.content_length:
+            REQUEST_SIZE.labels(method, route).observe(request.content_length)
+        if not response.is_streamed:
+            RESPONSE_SIZE.labels(method, route, status).observe(response.calculate_content_length() or 0)
+        profile = current_profile()  # SQL statements, from profiler.py
+        if profile is not None:
+            DB_QUERIES.labels(route).observe(profile.queries)
+            DB_TIME.labels(route).observe(profile.duration)
+        self.collect_pool_stats()
+        return response
+
+    def collect_pool_stats(self):
+        """Copy cache and hashing pool counters into the Prometheus metrics"""
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            for counter in CACHE_COUNTERS:
+                if counter in stats:
+                    change = self._deltas.delta((name, counter), stats[counter])
+                    if change:
+                        CACHE_EVENTS.labels(name, counter).inc(change)
+        if self.hashing_pool is not None:
+            stats = self.hashing_pool.stats()
+            for outcome in ('submitted', 'rejected', 'completed', 'failed'):
+                change = self._deltas.delta(('hashing', outcome), stats[outcome])
+                if change:
+                    HASHING_EVENTS.labels(outcome).inc(change)
+            for phase in ('wait', 'hash'):
+                change = self._deltas.delta(('hashing', phase), stats[f'{phase}_seconds'])
+                if change:
+                    HASHING_SECONDS.labels(phase).inc(change)
+            HASHING_PENDING.set(stats['pending'])
+
+    def export(self):
+        """Prometheus scrape endpoint"""
+        self.collect_pool_stats()
+        if multiprocess_enabled():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
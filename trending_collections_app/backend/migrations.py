@@ -0,0 +1,208 @@
+"""
+Schema Migrations
+
+A small versioned migration runner for the application database.
+
+``db.create_all()`` only creates missing tables; it never adds indexes or
+columns to tables that already exist. Each migration below brings an existing
+``app.db`` up to the current model definitions without touching its data.
+The applied version is recorded in the ``schema_version`` table.
+
+Migrations must be idempotent: a fresh database is created by
+``db.create_all()`` with the latest schema and then runs every migration,
+which should find nothing to do and simply record the version.
+
+Usage:
+    python migrations.py            # apply pending migrations to app.db
+    python migrations.py --status   # show the current schema version
+"""
+
+import argparse
+
+from sqlalchemy import inspect, text
+
+import bulk
+import changes
+import rollups
+import search
+from models import (CollectionVersion, ReformulatedQuery, TrendChange, TrendingCollection, UserVersion,
+                    create_trend_delete_triggers, normalize_query, split_reformulated_queries)
+
+# Rows read per batch when migrating data
+BATCH_SIZE = 1000
+
+
+def _create_model_indexes(connection, *models):
+    """Create every index declared on the given models that is missing"""
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+def _add_trend_indexes(connection):
+    _create_model_indexes(connection, TrendingCollection)
+
+
+def _normalize_reformulated_queries(connection):
+    """
+    Move the comma-separated reformulated_queries blob into one
+    reformulated_query row per query, then drop the blob column.
+    """
+    ReformulatedQuery.__table__.create(bind=connection, checkfirst=True)
+    _create_model_indexes(connection, ReformulatedQuery)
+
+    columns = {column['name'] for column in inspect(connection).get_columns('trending_collection')}
+    if 'reformulated_queries' not in columns:
+        return
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text('SELECT id, reformulated_queries FROM trending_collection '
+                 'WHERE id > :last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        children = [
+            {'trend_id': trend_id, 'position': position, 'text': query, 'normalized_text': normalize_query(query)}
+            for trend_id, blob in rows
+            for position, query in enumerate(split_reformulated_queries(blob))
+        ]
+        if children:
+            connection.execute(ReformulatedQuery.__table__.insert(), children)
+        last_id = rows[-1][0]
+
+    connection.execute(text('ALTER TABLE trending_collection DROP COLUMN reformulated_queries'))
+
+
+def _build_search_index(connection):
+    search.rebuild_index(connection)
+
+
+def _build_rollups(connection):
+    rollups.rebuild_rollups(connection)
+
+
+def _start_change_log(connection):
+    # Changes are logged at collection versions, which older databases lack
+    CollectionVersion.__table__.create(bind=connection, checkfirst=True)
+    changes.reset_log(connection)
+    _create_model_indexes(connection, TrendChange)
+
+
+def _make_trend_keys_unique(connection):
+    """
+    Rename trends that repeat the (original_query, trend_topic) key of an
+    older trend by appending their id to the topic, then add the unique
+    index on the key. No trend is dropped.
+    """
+    duplicates = connection.execute(text(
+        'SELECT id, trend_topic FROM trending_collection AS trend WHERE EXISTS ('
+        'SELECT 1 FROM trending_collection AS older WHERE older.original_query = trend.original_query '
+        'AND older.trend_topic = trend.trend_topic AND older.id < trend.id) ORDER BY id'
+    )).fetchall()
+    if duplicates:
+        length = TrendingCollection.trend_topic.type.length
+        renamed = []
+        for trend_id, topic in duplicates:
+            suffix = f' ({trend_id})'
+            renamed.append({'trend_id': trend_id, 'topic': topic[:length - len(suffix)] + suffix})
+        connection.execute(text('UPDATE trending_collection SET trend_topic = :topic WHERE id = :trend_id'),
+                           renamed)
+        bulk.sync_derived_state(connection, [row['trend_id'] for row in renamed])
+
+    # Databases created from the current models have it as a table constraint
+    inspector = inspect(connection)
+    unique = {tuple(constraint['column_names'])
+              for constraint in inspector.get_unique_constraints('trending_collection')}
+    unique.update(tuple(index['column_names'])
+                  for index in inspector.get_indexes('trending_collection') if index['unique'])
+    if ('original_query', 'trend_topic') not in unique:
+        connection.execute(text(
+            'CREATE UNIQUE INDEX ux_trend_query_topic ON trending_collection (original_query, trend_topic)'))
+
+
+def _add_user_version(connection):
+    UserVersion.__table__.create(bind=connection, checkfirst=True)
+
+
+def _drop_query_topic_index(connection):
+    # Covered by the unique (original_query, trend_topic) key
+    connection.execute(text('DROP INDEX IF EXISTS ix_trend_query_topic'))
+
+
+def _add_trend_delete_triggers(connection):
+    # Registered by models, search, rollups and changes (all imported above)
+    create_trend_delete_triggers(connection)
+
+
+# Ordered list of (version, description, function). Append only.
+MIGRATIONS = [
+    (1, 'Add secondary indexes on trending_collection', _add_trend_indexes),
+    (2, 'Move reformulated queries into the reformulated_query table', _normalize_reformulated_queries),
+    (3, 'Create and populate the trend_search full-text index', _build_search_index),
+    (4, 'Create and populate the trend_rollup reporting tables', _build_rollups),
+    (5, 'Create the trend_change log and record every existing trend', _start_change_log),
+    (6, 'Make (original_query, trend_topic) unique on trending_collection', _make_trend_keys_unique),
+    (7, 'Create the user_version counter for auth cache invalidation', _add_user_version),
+    (8, 'Drop ix_trend_query_topic, covered by the unique trend key', _drop_query_topic_index),
+    (9, 'Clean up after deleted trends with triggers on trending_collection', _add_trend_delete_triggers),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(connection):
+    connection.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    if connection.execute(text('SELECT COUNT(*) FROM schema_version')).scalar() == 0:
+        connection.execute(text('INSERT INTO schema_version (version) VALUES (0)'))
+
+
+def current_version(engine):
+    """Return the schema version recorded in the database (0 if none)"""
+    with engine.begin() as connection:
+        _ensure_version_table(connection)
+        return connection.execute(text('SELECT version FROM schema_version')).scalar()
+
+
+def upgrade(engine, verbose=False):
+    """
+    Apply all pending migrations in order.
+
+    Each migration runs in its own transaction together with the version
+    bump, so a failure leaves the database at the last good version.
+
+    Returns:
+        List of migration versions that were applied
+    """
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        with engine.begin() as connection:
+            _ensure_version_table(connection)
+            # Re-read inside the transaction: another worker may have
+            # applied this migration while we were starting up
+            if connection.execute(text('SELECT version FROM schema_version')).scalar() >= version:
+                continue
+            migrate(connection)
+            connection.execute(text('UPDATE schema_version SET version = :version'), {'version': version})
+        applied.append(version)
+        if verbose:
+            print(f"Applied migration {version}: {description}")
+    return applied
+
+
+if __name__ == '__main__':
+    from app import app, db
+
+    parser = argparse.ArgumentParser(description='Apply schema migrations to the application database')
+    parser.add_argument('--status', action='store_true', help='only print the current schema version')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.status:
+            print(f"Schema version {current_version(db.engine)} (latest {LATEST_VERSION})")
+        else:
+            applied = upgrade(db.engine, verbose=True)
+            if not applied:
+                print(f"Database already at schema version {LATEST_VERSION}")
@@ -1,7 +1,32 @@
-from flask_sqlalchemy import SQLAlchemy
+import time
+
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects import sqlite
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+from hashing import PASSWORD_HASH_METHOD, needs_rehash
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()  # Sessions can read from a replica, see routing.py
+
+# SQLite stores timestamps as text. CURRENT_TIMESTAMP defaults have no
+# fractional part, so bound datetimes must not either, otherwise range and
+# keyset comparisons against server-generated values compare unequal strings.
+Timestamp = db.DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), 'sqlite')
+
+def split_reformulated_queries(value):
+    """
+    Split a comma-separated reformulated queries string (or a list of
+    queries) into clean individual queries, collapsing the newlines and
+    indentation that multi-line literals leave behind.
+    """
+    items = value.split(',') if isinstance(value, str) else (value or [])
+    cleaned = (' '.join(str(item).split()) for item in items)
+    return [item for item in cleaned if item]
+
+def normalize_query(text):
+    """Normalized form of a query used for exact, case-insensitive lookups"""
+    return ' '.join(text.split()).casefold()
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,17 +35,257 @@ class User(db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def needs_rehash(self):
+        return needs_rehash(self.password_hash)
+    
 class TrendingCollection(db.Model):
+    # Secondary indexes for the listing endpoints: filter by original query
+    # or category, and keyset pagination ordered by topic/created/updated
+    # with id as the tie-breaker. (original_query, trend_topic) identifies a
+    # trend, which bulk upserts rely on; its unique index also serves the
+    # original query filter (SQLite indexes carry the rowid id). Existing
+    # databases get these through migrations.py, since db.create_all()
+    # never alters existing tables.
+    __table_args__ = (
+        db.UniqueConstraint('original_query', 'trend_topic', name='ux_trend_query_topic'),
+        db.Index('ix_trend_category_updated', 'category', 'updated_at', 'id'),
+        db.Index('ix_trend_topic_id', 'trend_topic', 'id'),
+        db.Index('ix_trend_created_id', 'created_at', 'id'),
+        db.Index('ix_trend_updated_id', 'updated_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     original_query = db.Column(db.String(200), nullable=False)
     trend_topic = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    reformulated_queries = db.Column(db.Text, nullable=False)  # Store as comma-separated string
     category = db.Column(db.String(100))  # Optional category field
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, server_default=db.func.now(), onupdate=db.func.now())
+    
+    # Reformulated queries live in their own table, one row per query.
+    # 'selectin' loads them for a whole page of trends in one extra query
+    # instead of one query per trend.
+    reformulations = db.relationship(
+        'ReformulatedQuery',
+        order_by='ReformulatedQuery.position',
+        cascade='all, delete-orphan',
+        lazy='selectin',
+        back_populates='trend'
+    )
+    
+    @property
+    def reformulated_queries(self):
+        """Reformulated queries as the comma-separated string the API exposes"""
+        return ', '.join(query.text for query in self.reformulations)
+    
+    @reformulated_queries.setter
+    def reformulated_queries(self, value):
+        queries = split_reformulated_queries(value)
+        if queries == [query.text for query in self.reformulations]:
+            return
+        self.reformulations = [
+            ReformulatedQuery(position=position, text=query, normalized_text=normalize_query(query))
+            for position, query in enumerate(queries)
+        ]
+        # Only child rows changed, so the column onupdate would not fire
+        self.updated_at = db.func.now()
+
+class ReformulatedQuery(db.Model):
+    __tablename__ = 'reformulated_query'
+    __table_args__ = (
+        db.Index('ix_reformulated_query_trend', 'trend_id', 'position'),
+        db.Index('ix_reformulated_query_normalized', 'normalized_text', 'trend_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    trend_id = db.Column(db.Integer, db.ForeignKey('trending_collection.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # Order within the trend
+    text = db.Column(db.String(500), nullable=False)
+    normalized_text = db.Column(db.String(500), nullable=False)  # See normalize_query()
+    
+    trend = db.relationship('TrendingCollection', back_populates='reformulations')
+
+
+class CollectionVersion(db.Model):
+    """
+    Single-row counter bumped on every change to the trend collection.
+    
+    Shared by all workers through the database, it lets readers validate
+    cached responses (ETags) with one primary-key lookup instead of
+    reading any trend rows. See versioning.py.
+    """
+    __tablename__ = 'collection_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(Timestamp, server_default=db.func.now())
+
+class UserVersion(db.Model):
+    """
+    Single-row counter bumped whenever a user's email or role changes or a
+    user is deleted, so every worker can tell when its cached user records
+    are stale. See auth_cache.py.
+    """
+    __tablename__ = 'user_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class TrendRollup(db.Model):
+    """
+    Number of trends per bucket of a reporting dimension (category,
+    original query, creation day, update day), maintained incrementally by
+    rollups.py so reports never aggregate trending_collection itself.
+    """
+    __tablename__ = 'trend_rollup'
+    
+    dimension = db.Column(db.String(20), primary_key=True)
+    bucket = db.Column(db.String(200), primary_key=True)  # '' for trends without a category
+    trend_count = db.Column(db.Integer, nullable=False, default=0)
+
+class TrendRollupMember(db.Model):
+    """
+    The buckets each trend is currently counted in, so a change can take a
+    trend out of its old buckets after its row has been updated or deleted.
+    """
+    __tablename__ = 'trend_rollup_member'
+    
+    trend_id = db.Column(db.Integer, primary_key=True)  # No foreign key: outlives a deleted trend until synced
+    category = db.Column(db.String(100), nullable=False)
+    original_query = db.Column(db.String(200), nullable=False)
+    created_day = db.Column(db.String(10))  # YYYY-MM-DD
+    updated_day = db.Column(db.String(10))
+
+class TrendChange(db.Model):
+    """
+    Latest change of each trend, for the delta sync feed (see changes.py).
+    
+    ``version`` is the collection version of the transaction that made the
+    change, so rows sort in commit order; a deleted trend keeps its row as
+    a tombstone.
+    """
+    __tablename__ = 'trend_change'
+    __table_args__ = (
+        db.Index('ix_trend_change_version', 'version', 'trend_id'),
+    )
+    
+    trend_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # No foreign key: tombstones outlive trends
+    version = db.Column(db.BigInteger, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+class TrendChangeHorizon(db.Model):
+    """
+    Single row holding the oldest collection version the change log is
+    complete from. It moves forward when the log is reset after writes that
+    bypassed it, and older sync cursors are then refused.
+    """
+    __tablename__ = 'trend_change_horizon'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+@event.listens_for(TrendChangeHorizon.__table__, 'after_create')
+def _seed_trend_change_horizon(table, connection, **kw):
+    """Seed the single horizon row whenever the table is created"""
+    connection.execute(table.insert().values(id=1, version=0))
+
+@event.listens_for(CollectionVersion.__table__, 'after_create')
+def _seed_collection_version(table, connection, **kw):
+    """
+    Seed the single counter row whenever the table is created.
+    
+    The counter starts from the current time in microseconds rather than
+    zero, so a database that is dropped and recreated never reissues a
+    version (and therefore an ETag or cache stamp) handed out before.
+    """
+    connection.execute(table.insert().values(id=1, version=time.time_ns() // 1000))
+
+@event.listens_for(UserVersion.__table__, 'after_create')
+def _seed_user_version(table, connection, **kw):
+    """Seed the single counter row, from the current time like the collection version"""
+    connection.execute(table.insert().values(id=1, version=time.time_ns() // 1000))
+
+def trend_changes(session):
+    """
+    Ids of the trends changed by the flush in progress, for use in
+    after_flush hooks.
+    
+    A trend counts as changed when its own row changed or any of its
+    reformulated queries were added, changed or removed. Deleted trends are
+    left out: their derived state is maintained by the delete triggers (see
+    trend_delete_trigger).
+    
+    Returns:
+        Set of trend ids
+    """
+    changed, deleted = set(), set()
+    for instance in session.new:
+        if isinstance(instance, TrendingCollection):
+            changed.add(instance.id)
+        elif isinstance(instance, ReformulatedQuery) and instance.trend_id is not None:
+            changed.add(instance.trend_id)
+    for instance in session.dirty:
+        if not session.is_modified(instance):
+            continue
+        if isinstance(instance, TrendingCollection):
+            changed.add(instance.id)
+        elif isinstance(instance, ReformulatedQuery) and instance.trend_id is not None:
+            changed.add(instance.trend_id)
+    for instance in session.deleted:
+        if isinstance(instance, TrendingCollection):
+            deleted.add(instance.id)
+        elif isinstance(instance, ReformulatedQuery) and instance.trend_id is not None:
+            changed.add(instance.trend_id)
+    return changed - deleted
+
+# AFTER DELETE triggers registered with trend_delete_trigger, in order
+TREND_DELETE_TRIGGERS = []
+
+def trend_delete_trigger(name, statements, dialects=('sqlite', 'postgresql')):
+    """
+    Run SQL statements in the database for every deleted trend, whatever
+    deletes it (the ORM session, a Core statement or a bulk delete).
+    
+    Derived state is cleaned up by triggers rather than by session hooks, so
+    deleting a trend costs one statement from the application. The trigger
+    is created with the trending_collection table; create_trend_delete_triggers
+    adds it to existing databases.
+    
+    Parameters:
+        name (str): Trigger (and on PostgreSQL, trigger function) name
+        statements (list): SQL statements; OLD.id is the deleted trend's id
+        dialects (tuple): Databases the trigger is created on
+    """
+    body = ''.join(f'{statement}; ' for statement in statements)
+    ddls = []
+    if 'sqlite' in dialects:
+        ddls.append(DDL(
+            f"CREATE TRIGGER IF NOT EXISTS {name} AFTER DELETE ON trending_collection "
+            f"FOR EACH ROW BEGIN {body}END"
+        ).execute_if(dialect='sqlite'))
+    if 'postgresql' in dialects:
+        ddls += [DDL(statement).execute_if(dialect='postgresql') for statement in (
+            f"CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$ "
+            f"BEGIN {body}RETURN NULL; END $$",
+            f"DROP TRIGGER IF EXISTS {name} ON trending_collection",
+            f"CREATE TRIGGER {name} AFTER DELETE ON trending_collection "
+            f"FOR EACH ROW EXECUTE PROCEDURE {name}()",
+        )]
+    for ddl in ddls:
+        event.listen(TrendingCollection.__table__, 'after_create', ddl)
+    TREND_DELETE_TRIGGERS.extend(ddls)
+
+def create_trend_delete_triggers(connection):
+    """Create (or replace) the registered delete triggers on an existing database"""
+    for ddl in TREND_DELETE_TRIGGERS:
+        ddl(TrendingCollection.__table__, connection)
+
+# Reformulated queries go with their trend. PostgreSQL enforces the foreign
+# key's ON DELETE CASCADE; SQLite only does with foreign keys enabled
+trend_delete_trigger('trend_delete_queries', ["DELETE FROM reformulated_query WHERE trend_id = OLD.id"],
+                     dialects=('sqlite',))
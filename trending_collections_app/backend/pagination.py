@@ -0,0 +1,93 @@
+"""
+Keyset Pagination Helpers
+
+Cursor tokens and keyset filters used by the trend listing endpoints.
+
+A cursor records the sort field, direction and the (sort value, id) pair of
+the last row on a page. The next page is then fetched with a
+``(sort_value, id) > (last_value, last_id)`` predicate instead of an OFFSET,
+so every page costs the same index range scan however deep the client pages.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import literal, tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+SORT_ORDERS = ('asc', 'desc')
+
+
+class CursorError(ValueError):
+    """Raised when a pagination cursor or page size cannot be used"""
+
+
+def parse_limit(raw_limit, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse the ``limit`` query parameter, clamping it to ``maximum``"""
+    if raw_limit in (None, ''):
+        return default
+    try:
+        limit = int(raw_limit)
+    except (TypeError, ValueError):
+        raise CursorError('limit must be an integer')
+    if limit < 1:
+        raise CursorError('limit must be a positive integer')
+    return min(limit, maximum)
+
+
+def encode_cursor(sort_field, order, sort_value, row_id):
+    """Build an opaque cursor token pointing just after the given row"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_field, order, sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_field, order, datetime_fields=()):
+    """
+    Decode a cursor token produced by ``encode_cursor``.
+
+    The cursor must have been issued for the same sort field and order,
+    otherwise the keyset predicate would skip or repeat rows.
+
+    Returns:
+        (sort_value, row_id) tuple
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        field, direction, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise CursorError('Invalid cursor')
+
+    if field != sort_field or direction != order or not isinstance(row_id, int):
+        raise CursorError('Cursor does not match the requested sort order')
+
+    if field in datetime_fields and sort_value is not None:
+        try:
+            sort_value = datetime.fromisoformat(sort_value)
+        except (TypeError, ValueError):
+            raise CursorError('Invalid cursor')
+    return sort_value, row_id
+
+
+def apply_keyset(query, sort_column, id_column, order, after=None):
+    """
+    Order ``query`` by (sort_column, id_column) and, when ``after`` is given,
+    restrict it to rows strictly past that (sort value, id) position.
+    """
+    if sort_column is id_column:
+        if after is not None:
+            query = query.filter(id_column > after[1] if order == 'asc' else id_column < after[1])
+        return query.order_by(id_column.asc() if order == 'asc' else id_column.desc())
+
+    if after is not None:
+        # Bind the boundary with the column types so values are rendered
+        # exactly as stored (e.g. SQLite timestamp text formats)
+        position = tuple_(sort_column, id_column)
+        boundary = tuple_(literal(after[0], sort_column.type), literal(after[1], id_column.type))
+        query = query.filter(position > boundary if order == 'asc' else position < boundary)
+    if order == 'asc':
+        return query.order_by(sort_column.asc(), id_column.asc())
+    return query.order_by(sort_column.desc(), id_column.desc())
@@ -1,5 +1,9 @@
 from app import app, db
-from models import TrendingCollection
+from models import TrendingCollection, ReformulatedQuery
+from changes import reset_log
+from rollups import rebuild_rollups
+from search import rebuild_index
+import bulk
 
 trend_data = [
     {
@@ -184,21 +188,21 @@ trend_data = [
 
 def populate_database():
     with app.app_context():
-        # Clear existing data
+        # Clear existing data (bulk deletes skip ORM cascades, so children first)
+        ReformulatedQuery.query.delete()
         TrendingCollection.query.delete()
         
-        # Add new data
-        for trend in trend_data:
-            new_trend = TrendingCollection(
-                original_query=trend['original_query'],
-                trend_topic=trend['trend_topic'],
-                description=trend['description'],
-                reformulated_queries=trend['reformulated_queries'],
-                category=trend['category']
-            )
-            db.session.add(new_trend)
-        
         db.session.commit()
+        
+        # Add new data with batched inserts (see import_trends.py for files)
+        bulk.load_trends(db.engine, trend_data)
+        
+        # The bulk delete above bypassed the search index, rollup and
+        # change log sync
+        with db.engine.begin() as connection:
+            rebuild_index(connection)
+            rebuild_rollups(connection)
+            reset_log(connection)
         print("Database populated successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+"""
+SQL Profiler
+
+Request-scoped accounting of the SQL statements each request executes,
+hooked into SQLAlchemy's engine events.
+
+- Every request counts its statements and total DB time (metrics.py exports
+  them). With SQL_PROFILING_HEADERS enabled the numbers are also returned as
+  ``X-DB-Queries`` and ``Server-Timing: db;dur=...`` response headers.
+- The same statement executed SQL_N_PLUS_ONE_THRESHOLD or more times in one
+  request is reported as a likely N+1 pattern (logged, and counted in the
+  ``X-DB-Repeated-Statements`` header when headers are enabled).
+- Statements slower than SQL_SLOW_QUERY_MS are written with their route to
+  the rotating SQL_SLOW_QUERY_LOG file. Bound parameters can hold user data,
+  so they are only logged with SQL_SLOW_QUERY_LOG_PARAMETERS enabled, and
+  never for statements on the ``user`` table (password hashes, emails).
+
+Statements run outside a request (CLI loaders, startup) are not tracked.
+Streamed responses (the export) run their queries after the response
+headers, the X-DB-* headers and the request metrics have been written, so
+those queries are not counted; slow ones still reach the slow query log.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Longest rendering of bound parameters kept in the slow query log
+MAX_LOGGED_PARAMETERS = 1000
+
+# Statements whose parameters are never logged
+REDACTED_TABLES = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+["`]?user["`]?(?![\w])', re.IGNORECASE)
+
+logger = logging.getLogger('sql_profiler')
+slow_query_logger = logging.getLogger('sql_profiler.slow')
+
+
+class RequestProfile:
+    """SQL statements executed by one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        self.queries += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated_statements(self, threshold):
+        """Statements executed at least ``threshold`` times, with their counts"""
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+def current_profile():
+    """Profile of the current request, or None outside a profiled request"""
+    if has_request_context():
+        return g.get('sql_profile')
+    return None
+
+
+class SQLProfiler:
+    """Registers the request and engine hooks that build RequestProfiles"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SQL_PROFILING_HEADERS', False)
+        app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 3)
+        app.config.setdefault('SQL_SLOW_QUERY_MS', 100.0)
+        app.config.setdefault('SQL_SLOW_QUERY_LOG', None)
+        app.config.setdefault('SQL_SLOW_QUERY_LOG_PARAMETERS', False)
+        if app.config['SQL_SLOW_QUERY_LOG']:
+            handler = RotatingFileHandler(app.config['SQL_SLOW_QUERY_LOG'], maxBytes=10 * 1024 * 1024, backupCount=5)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.INFO)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _start_request(self):
+        g.sql_profile = RequestProfile()
+
+    def _finish_request(self, response):
+        profile = g.get('sql_profile')
+        if profile is None:
+            return response
+        repeated = profile.repeated_statements(self.app.config['SQL_N_PLUS_ONE_THRESHOLD'])
+        for statement, count in repeated.items():
+            logger.warning('Possible N+1 in %s: statement ran %d times: %s', _route(), count, statement)
+        if self.app.config['SQL_PROFILING_HEADERS']:
+            response.headers['X-DB-Queries'] = str(profile.queries)
+            response.headers['X-DB-Repeated-Statements'] = str(len(repeated))
+            response.headers.add('Server-Timing', f'db;dur={profile.duration * 1000:.2f};desc="{profile.queries} queries"')
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._profiler_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._profiler_started
+        profile = current_profile()
+        if profile is not None:
+            profile.record(statement, duration)
+        if duration * 1000 >= self.app.config['SQL_SLOW_QUERY_MS'] and slow_query_logger.handlers:
+            slow_query_logger.info('%.1fms route=%s statement=%s parameters=%s',
+                                   duration * 1000, _route(), ' '.join(statement.split()),
+                                   self._render_parameters(statement, parameters))
+
+    def _render_parameters(self, statement, parameters):
+        if not self.app.config['SQL_SLOW_QUERY_LOG_PARAMETERS']:
+            return '[not logged]'
+        if REDACTED_TABLES.search(statement):
+            return '[redacted]'
+        rendered = repr(parameters)
+        if len(rendered) > MAX_LOGGED_PARAMETERS:
+            rendered = rendered[:MAX_LOGGED_PARAMETERS] + '...'
+        return rendered
+
+
+def _route():
+    if has_request_context():
+        return f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+    return '-'
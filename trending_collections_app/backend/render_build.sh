@@ -36,6 +36,11 @@ if [ -f "trending_collections_app/backend/static/index.html" ]; then
     sed -i 's|"/static/|"static/|g' trending_collections_app/backend/static/index.html
 fi
 
+# Precompress text assets (.gz, plus .br when brotli is installed) so they
+# are served without compressing per request - see assets.py
+echo "Precompressing static assets..."
+(cd trending_collections_app/backend && python assets.py static)
+
 # Debug: List files in static directory
 echo "Files in static directory:"
 ls -la trending_collections_app/backend/static/
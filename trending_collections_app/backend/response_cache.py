@@ -0,0 +1,142 @@
+"""
+Response Cache
+
+A bounded, in-process LRU/TTL cache of serialized response bodies for the
+trend read endpoints.
+
+Every entry remembers the collection version (see versioning.py) it was
+built at, and readers must pass the current version to ``get``. Because the
+version lives in the database and is bumped by every write, an entry that
+another gunicorn worker made stale is detected with one primary-key lookup
+and never served. Writers in this worker additionally drop exactly the
+entries they affect through tags, so memory is released straight away.
+
+Entries also keep the compressed forms of their body once compression.py
+has produced them, so repeated reads are not compressed again.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import Response
+
+CachedResponse = namedtuple('CachedResponse', ['key', 'version', 'expires_at', 'body', 'headers', 'tags',
+                                               'variants'])
+
+# Attached to responses built from (or stored in) the cache as
+# ``response.cache_slot``, so compressed bodies can be stored with the entry
+CacheSlot = namedtuple('CacheSlot', ['cache', 'entry'])
+
+# Response headers worth keeping alongside a cached body
+CACHED_HEADERS = ('Content-Type', 'X-Next-Cursor', 'Link')
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of response bodies, bounded by entry count and
+    total body size, with a time-to-live per entry.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ('hits', 'misses', 'stale', 'expired', 'evictions', 'invalidations'), 0)
+
+    def get(self, key, version):
+        """Return the entry for ``key`` if it was built at ``version`` and is fresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            if entry.version != version:
+                self._remove(key)
+                self._counters['stale'] += 1
+                self._counters['misses'] += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry
+
+    def set(self, key, version, body, headers=(), tags=()):
+        """Store a response body built at ``version``; returns the entry, or None if not stored"""
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return None
+        entry = CachedResponse(key, version, time.monotonic() + self.ttl, body, tuple(headers), frozenset(tags), {})
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            self._evict()
+        return entry
+
+    def add_variant(self, entry, coding, body):
+        """Keep the ``coding`` (e.g. gzip) form of a cached entry's body with it"""
+        with self._lock:
+            if self._entries.get(entry.key) is not entry or coding in entry.variants:
+                return
+            entry.variants[coding] = body
+            self._size += len(body)
+            self._evict()
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of the given tags"""
+        tags = set(tags)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.tags & tags]:
+                self._remove(key)
+                self._counters['invalidations'] += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Counters plus current size, for monitoring"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update(entries=len(self._entries), bytes=self._size,
+                         max_entries=self.max_entries, max_bytes=self.max_bytes, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._counters['evictions'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body) + sum(len(body) for body in entry.variants.values())
+
+
+def store_response(cache, key, version, response, tags):
+    """Cache a successful Flask response and return it unchanged"""
+    if response.status_code == 200:
+        headers = [(name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers]
+        entry = cache.set(key, version, response.get_data(), headers, tags)
+        if entry is not None:
+            response.cache_slot = CacheSlot(cache, entry)
+    return response
+
+
+def cached_response(cache, entry):
+    """Rebuild a Flask response from a cache entry"""
+    response = Response(entry.body, status=200, headers=list(entry.headers))
+    response.cache_slot = CacheSlot(cache, entry)
+    return response
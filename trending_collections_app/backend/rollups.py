@@ -0,0 +1,177 @@
+"""
+Trend Rollups
+
+Trend counts per category, per original query and per day of creation and
+of last update, kept in the ``trend_rollup`` table for GET /api/trends/stats
+and GET /api/trends/facets. Reports read one row per bucket instead of
+grouping trending_collection, so they cost O(buckets) rather than O(trends).
+
+- ``trend_rollup_member`` records the buckets each trend is counted in.
+  Syncing a set of trends subtracts their recorded buckets, re-reads the
+  changed ones and adds their new buckets: at most four statements,
+  whatever the size of the collection.
+- Like the search index, the rollups are synced by an ``after_flush``
+  session hook for ORM writes. Code that writes trends with Core statements
+  must call ``sync_trends`` itself (bulk.sync_derived_state does). Deleted
+  trends are taken out by a delete trigger.
+- Buckets whose count drops to zero are kept (reports skip them) until
+  ``rebuild_rollups`` recomputes everything from trending_collection, e.g.
+  after a backfill.
+
+Usage:
+    python rollups.py    # rebuild the rollups of the application database
+"""
+
+from sqlalchemy import String, event, func, select, text, type_coerce
+
+from models import db, TrendingCollection, TrendRollup, TrendRollupMember, trend_changes, trend_delete_trigger
+
+# Bucketed member columns, one rollup dimension each
+DIMENSIONS = ('category', 'original_query', 'created_day', 'updated_day')
+
+# Dimensions the list endpoint filters by, offered as facets
+FACET_DIMENSIONS = ('original_query', 'category')
+
+rollup_table = TrendRollup.__table__
+members_table = TrendRollupMember.__table__
+trends_table = TrendingCollection.__table__
+
+# Adds (sign=1) or subtracts (sign=-1) the buckets of the selected members.
+# The sign is formatted in rather than bound, so the trigger below can use it.
+# ON CONFLICT needs SQLite 3.24+ or PostgreSQL; the WHERE clause keeps
+# SQLite from parsing ON CONFLICT as a join constraint
+_APPLY_MEMBERS = (
+    "INSERT INTO trend_rollup (dimension, bucket, trend_count) "
+    "SELECT dimension, bucket, {sign} * COUNT(*) FROM ("
+    + ' UNION ALL '.join(
+        f"SELECT '{dimension}' AS dimension, {dimension} AS bucket FROM trend_rollup_member "
+        f"WHERE {dimension} IS NOT NULL AND {{where}}"
+        for dimension in DIMENSIONS
+    )
+    + ") AS buckets WHERE 1 = 1 GROUP BY dimension, bucket "
+    "ON CONFLICT (dimension, bucket) DO UPDATE SET trend_count = trend_rollup.trend_count + excluded.trend_count"
+)
+
+trend_delete_trigger('trend_rollup_delete', [
+    _APPLY_MEMBERS.format(where='trend_id = OLD.id', sign=-1),
+    "DELETE FROM trend_rollup_member WHERE trend_id = OLD.id",
+])
+
+
+def _id_list(trend_ids):
+    # Integer ids only, so inlining them is safe (see search.py)
+    return ', '.join(str(int(trend_id)) for trend_id in trend_ids)
+
+
+def _day(column, dialect):
+    if dialect.name == 'sqlite':
+        # Stored as 'YYYY-MM-DD HH:MM:SS' text
+        return func.substr(type_coerce(column, String), 1, 10)
+    return func.to_char(column, 'YYYY-MM-DD')
+
+
+def _insert_members(connection, where=None):
+    dialect = connection.dialect
+    query = select(trends_table.c.id, func.coalesce(trends_table.c.category, ''), trends_table.c.original_query,
+                   _day(trends_table.c.created_at, dialect), _day(trends_table.c.updated_at, dialect))
+    if where is not None:
+        query = query.where(where)
+    connection.execute(members_table.insert().from_select(
+        ['trend_id', 'category', 'original_query', 'created_day', 'updated_day'], query))
+
+
+def sync_trends(connection, changed_ids):
+    """Move changed trends to their current buckets"""
+    if not changed_ids:
+        return
+    ids = _id_list(changed_ids)
+    connection.execute(text(_APPLY_MEMBERS.format(where=f'trend_id IN ({ids})', sign=-1)))
+    connection.execute(text(f"DELETE FROM trend_rollup_member WHERE trend_id IN ({ids})"))
+    _insert_members(connection, text(f"trending_collection.id IN ({ids})"))
+    connection.execute(text(_APPLY_MEMBERS.format(where=f'trend_id IN ({ids})', sign=1)))
+
+
+def rebuild_rollups(connection):
+    """Recompute every rollup from trending_collection"""
+    rollup_table.create(bind=connection, checkfirst=True)
+    members_table.create(bind=connection, checkfirst=True)
+    connection.execute(rollup_table.delete())
+    connection.execute(members_table.delete())
+    _insert_members(connection)
+    connection.execute(text(_APPLY_MEMBERS.format(where='1 = 1', sign=1)))
+
+
+def bucket_counts(connection, dimensions=DIMENSIONS):
+    """
+    Non-empty buckets of the given dimensions, read through the primary key.
+
+    Returns:
+        Dict mapping each dimension to a {bucket: count} dict
+    """
+    counts = {dimension: {} for dimension in dimensions}
+    rows = connection.execute(
+        select(rollup_table.c.dimension, rollup_table.c.bucket, rollup_table.c.trend_count)
+        .where(rollup_table.c.dimension.in_(dimensions), rollup_table.c.trend_count > 0)
+    )
+    for dimension, bucket, count in rows:
+        counts[dimension][bucket] = count
+    return counts
+
+
+def trend_stats(connection):
+    """
+    Collection report read from the rollups.
+
+    Returns:
+        Dict with the trend total, counts per category and per original
+        query (largest first) and created/updated counts per day (oldest
+        first). Trends without a category are counted under None.
+    """
+    counts = bucket_counts(connection)
+
+    def ranked(dimension, name):
+        buckets = sorted(counts[dimension].items(), key=lambda item: (-item[1], item[0]))
+        return [{name: bucket or None, 'count': count} for bucket, count in buckets]
+
+    days = sorted(set(counts['created_day']) | set(counts['updated_day']))
+    return {
+        'total': sum(counts['category'].values()),
+        'categories': ranked('category', 'category'),
+        'original_queries': ranked('original_query', 'original_query'),
+        'activity': [{'date': day, 'created': counts['created_day'].get(day, 0),
+                      'updated': counts['updated_day'].get(day, 0)} for day in days],
+    }
+
+
+def trend_facets(connection):
+    """
+    Distinct values of the filterable fields with their trend counts.
+
+    Returns:
+        Dict mapping original_query and category to lists of
+        {'value', 'count'} dicts ordered by value; trends without a
+        category are counted under None, listed last
+    """
+    counts = bucket_counts(connection, FACET_DIMENSIONS)
+    return {
+        dimension: [{'value': bucket or None, 'count': count}
+                    for bucket, count in sorted(counts[dimension].items(), key=lambda item: (not item[0], item[0]))]
+        for dimension in FACET_DIMENSIONS
+    }
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_rollups(session, flush_context):
+    """Move the trends touched by this flush to their current buckets"""
+    changed = trend_changes(session)
+    if changed:
+        sync_trends(session.connection(), changed)
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            rebuild_rollups(connection)
+            print(f"Rebuilt trend rollups: {trend_stats(connection)['total']} trends")
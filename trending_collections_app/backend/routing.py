@@ -0,0 +1,124 @@
+"""
+Read/Write Routing
+
+Sends the queries of read-only endpoints to a replica database while every
+write, and every read inside a write request, goes to the primary.
+
+The replica is the ``replica`` entry of SQLALCHEMY_BINDS (set from
+DATABASE_REPLICA_URL). Views decorated with ``replica_read`` mark their
+request's session as read-only, and ``RoutingSession.get_bind`` then hands
+out the replica engine for everything except flushes. Without a configured
+replica everything runs on the primary as before.
+
+Replicas lag behind the primary, so a user who has just written is pinned
+to the primary for READ_YOUR_WRITES_SECONDS afterwards. The pin is recorded
+in this worker by JWT identity and in a short-lived cookie, so browsers stay
+pinned whichever worker serves their next read.
+"""
+
+import functools
+import threading
+import time
+
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+
+REPLICA_BIND = 'replica'
+
+# Session.info key set for requests whose reads may go to the replica
+READ_ONLY = 'read_only'
+
+STICKY_COOKIE = 'db_primary_until'
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Identities remembered per worker before the oldest pins are pruned
+MAX_PINNED_IDENTITIES = 10000
+
+
+class RoutingSession(SignallingSession):
+    """Session that reads from the replica when marked read-only"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get(READ_ONLY) and not self._flushing and has_replica(self.app):
+            return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension whose sessions are RoutingSessions"""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def has_replica(app):
+    """Whether a replica database is configured for the app"""
+    return REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+class ReadRouter:
+    """
+    Tracks recent writers and decides per request whether reads may use
+    the replica.
+    """
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        self._pinned = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        app.config.setdefault('READ_YOUR_WRITES_SECONDS', 5.0)
+        app.after_request(self._pin_writer)
+
+    def replica_read(self, view):
+        """Decorator for read-only views; apply below @jwt_required()"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if has_replica(current_app) and not self.is_pinned():
+                self.db.session.info[READ_ONLY] = True
+            return view(*args, **kwargs)
+        return wrapper
+
+    def is_pinned(self):
+        """Whether the current client wrote recently and must read the primary"""
+        now = time.time()
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        identity = self._identity()
+        with self._lock:
+            return identity is not None and self._pinned.get(identity, 0) > now
+
+    def _identity(self):
+        try:
+            verify_jwt_in_request(optional=True)
+            return get_jwt_identity()
+        except Exception:
+            return None
+
+    def _pin_writer(self, response):
+        # Only authenticated writes pin; login and register carry no identity
+        if request.method not in WRITE_METHODS or response.status_code >= 400 or not has_replica(current_app):
+            return response
+        identity = self._identity()
+        if identity is None:
+            return response
+
+        window = current_app.config['READ_YOUR_WRITES_SECONDS']
+        until = time.time() + window
+        with self._lock:
+            if len(self._pinned) >= MAX_PINNED_IDENTITIES:
+                now = time.time()
+                self._pinned = {key: value for key, value in self._pinned.items() if value > now}
+            self._pinned[identity] = until
+        response.set_cookie(STICKY_COOKIE, f'{until:.3f}', max_age=max(1, int(window + 0.999)),
+                            httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,204 @@
+"""
+Full-Text Search
+
+SQLite FTS5 index over trend topics, descriptions, original queries and
+reformulated queries, used by GET /api/trends/search.
+
+The ``trend_search`` virtual table stores one document per trend with
+rowid = trending_collection.id. It is kept in sync by an ``after_flush``
+session hook, so every ORM create and update (including changes to a
+trend's reformulated queries) updates the index in the same transaction.
+Code that writes with Core statements instead of the ORM session must call
+``reindex_trends`` itself. Deleted trends are removed by a delete trigger,
+however they are deleted.
+
+FTS5 is SQLite specific; on other databases the table and trigger are not
+created and the sync hook does nothing.
+"""
+
+import html
+import re
+
+from sqlalchemy import DDL, event, text
+
+from models import db, TrendingCollection, trend_changes, trend_delete_trigger
+
+SEARCH_TABLE = 'trend_search'
+
+# Column order matters: it is the column index used by highlight() and the
+# order of the BM25 weights below
+SEARCH_COLUMNS = ('trend_topic', 'description', 'original_query', 'reformulated_queries')
+
+# BM25 column weights: a hit in the topic counts for more than one in the
+# description
+BM25_WEIGHTS = (10.0, 2.0, 5.0, 4.0)
+
+# Prefix lengths FTS5 keeps extra index entries for. Prefix queries shorter
+# than this would have to scan the whole term dictionary, so shorter words
+# are matched exactly instead (see build_match_query)
+PREFIX_LENGTHS = (2, 3, 4)
+
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+
+# FTS5 delimits matches with these private-use characters; the text is
+# HTML-escaped first and only then are they replaced with the <mark> tags,
+# so stored trend text can never inject markup
+_MATCH_OPEN = '\ue000'
+_MATCH_CLOSE = '\ue001'
+SNIPPET_TOKENS = 12
+
+CREATE_SEARCH_TABLE = DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    f"{', '.join(SEARCH_COLUMNS)}, tokenize = 'porter unicode61 remove_diacritics 2', "
+    f"prefix = '{' '.join(str(length) for length in PREFIX_LENGTHS)}')"
+)
+DROP_SEARCH_TABLE = DDL(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+event.listen(TrendingCollection.__table__, 'after_create', CREATE_SEARCH_TABLE.execute_if(dialect='sqlite'))
+event.listen(TrendingCollection.__table__, 'before_drop', DROP_SEARCH_TABLE.execute_if(dialect='sqlite'))
+trend_delete_trigger('trend_search_delete', [f"DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id"],
+                     dialects=('sqlite',))
+
+# Documents are rebuilt from the committed tables rather than from ORM
+# objects, so the hook never needs to load relationships mid-flush
+_INDEX_SELECT = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)})
+    SELECT t.id, t.trend_topic, t.description, t.original_query,
+           (SELECT group_concat(r.text, ', ') FROM reformulated_query r WHERE r.trend_id = t.id)
+    FROM trending_collection t
+"""
+
+
+def is_supported(connection):
+    """Whether full-text search is available on this connection's database"""
+    return connection.dialect.name == 'sqlite'
+
+
+def _id_list(trend_ids):
+    # Integer ids only, so inlining them is safe and avoids one bound
+    # parameter per id (SQLite limits the number of parameters)
+    return ', '.join(str(int(trend_id)) for trend_id in trend_ids)
+
+
+def remove_trends(connection, trend_ids):
+    """Remove the given trends from the search index"""
+    if trend_ids and is_supported(connection):
+        connection.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({_id_list(trend_ids)})"))
+
+
+def reindex_trends(connection, trend_ids):
+    """(Re)build the search documents of the given trends"""
+    if not trend_ids or not is_supported(connection):
+        return
+    remove_trends(connection, trend_ids)
+    connection.execute(text(f"{_INDEX_SELECT} WHERE t.id IN ({_id_list(trend_ids)})"))
+
+
+def rebuild_index(connection):
+    """Drop and rebuild the whole search index from trending_collection"""
+    if not is_supported(connection):
+        return
+    connection.execute(CREATE_SEARCH_TABLE)
+    connection.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    connection.execute(text(_INDEX_SELECT))
+    connection.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    """Mirror the trends touched by this flush into the search index"""
+    changed = trend_changes(session)
+    if changed:
+        reindex_trends(session.connection(), changed)
+
+
+def build_match_query(raw_query):
+    """
+    Turn free text typed by a user into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted term (so FTS5 operators and punctuation in
+    the input cannot cause syntax errors) and all terms must match. The last
+    word is a prefix term, so results update as the user types, unless it
+    is too short to be served from a prefix index.
+
+    Returns:
+        MATCH expression, or None if the input contains no searchable words
+    """
+    words = re.findall(r'\w+', raw_query or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= PREFIX_LENGTHS[0]:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight_html(text):
+    """HTML-escape FTS5 output and turn its match delimiters into <mark> tags"""
+    if text is None:
+        return None
+    return html.escape(text).replace(_MATCH_OPEN, HIGHLIGHT_OPEN).replace(_MATCH_CLOSE, HIGHLIGHT_CLOSE)
+
+
+def search_trends(connection, match_query, limit, after=None):
+    """
+    Run a ranked full-text search.
+
+    Results are ordered by BM25 score (lower is better in SQLite) with the
+    trend id as tie-breaker, and paged by keyset on (score, id). Snippets
+    and highlights are only computed for the rows of the returned page.
+
+    Parameters:
+        connection: SQLAlchemy connection
+        match_query (str): Expression from build_match_query()
+        limit (int): Maximum number of hits to return
+        after (tuple): (score, id) of the last hit of the previous page
+
+    Returns:
+        List of hit dicts in rank order. trend_topic and snippet are HTML:
+        the escaped stored text with matches wrapped in <mark> tags
+    """
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    params = {'match': match_query, 'limit': limit}
+    keyset = ''
+    if after is not None:
+        keyset = 'WHERE (score, id) > (:after_score, :after_id)'
+        params.update(after_score=after[0], after_id=after[1])
+
+    # Phase 1: rank the matches, carrying only (id, score) through the sort
+    ranked = connection.execute(text(f"""
+        SELECT id, score FROM (
+            SELECT rowid AS id, bm25({SEARCH_TABLE}, {weights}) AS score
+            FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match
+        ) {keyset}
+        ORDER BY score, id
+        LIMIT :limit
+    """), params).fetchall()
+    if not ranked:
+        return []
+
+    # Phase 2: snippets and display fields for this page only
+    details = connection.execute(text(f"""
+        SELECT {SEARCH_TABLE}.rowid,
+               highlight({SEARCH_TABLE}, 0, :open, :close),
+               snippet({SEARCH_TABLE}, -1, :open, :close, '...', :tokens),
+               t.original_query, t.category
+        FROM {SEARCH_TABLE} JOIN trending_collection t ON t.id = {SEARCH_TABLE}.rowid
+        WHERE {SEARCH_TABLE} MATCH :match AND {SEARCH_TABLE}.rowid IN ({_id_list(row.id for row in ranked)})
+    """), {'match': match_query, 'open': _MATCH_OPEN, 'close': _MATCH_CLOSE,
+           'tokens': SNIPPET_TOKENS}).fetchall()
+    details_by_id = {row[0]: row for row in details}
+
+    hits = []
+    for trend_id, score in ranked:
+        _, topic, snippet, original_query, category = details_by_id[trend_id]
+        hits.append({
+            'id': trend_id,
+            'trend_topic': highlight_html(topic),
+            'original_query': original_query,
+            'category': category,
+            'snippet': highlight_html(snippet),
+            'score': score
+        })
+    return hits
@@ -0,0 +1,172 @@
+"""
+Trend Serialization
+
+The one place that turns trend rows into the JSON the API returns, and the
+JSON encoder that writes it.
+
+- Trends are built straight from Core result tuples selected with
+  ``trend_columns`` instead of ORM instances, so no identity map,
+  attribute instrumentation or relationship loading is involved. The
+  reformulated queries of a whole page come from one IN query.
+- On SQLite, timestamps are read as the text they are stored as and only
+  have their separator swapped for 'T', instead of being parsed into
+  datetimes and formatted back with isoformat(). The output is the same.
+- A ``fields`` projection narrows the SELECT itself, and the reformulated
+  query lookup is skipped entirely when they are not requested.
+- Encoding uses orjson when it is installed and the standard library
+  otherwise; the JSON_BACKEND setting picks one explicitly.
+"""
+
+import json
+from collections import defaultdict
+
+from flask import Response
+from sqlalchemy import String, select, type_coerce
+
+from models import ReformulatedQuery, TrendingCollection
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+# Fields of a serialized trend, in output order
+TREND_FIELDS = ('id', 'original_query', 'trend_topic', 'description', 'reformulated_queries',
+                'category', 'created_at', 'updated_at')
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+# Not a trend column: joined from the reformulated_query rows
+QUERIES_FIELD = 'reformulated_queries'
+
+# Trend ids per reformulated query lookup, within SQLite's bound parameter
+# limit (the same batch size the ORM's selectin loading uses)
+IN_BATCH_SIZE = 500
+
+trends_table = TrendingCollection.__table__
+queries_table = ReformulatedQuery.__table__
+
+
+class FieldsError(ValueError):
+    """Raised when a fields= projection names unknown fields"""
+
+
+def parse_fields(raw, default=TREND_FIELDS):
+    """
+    Parse a comma-separated ``fields`` query parameter.
+
+    Returns:
+        Tuple of the requested fields in TREND_FIELDS order, or ``default``
+        when the parameter is absent
+    """
+    if raw in (None, ''):
+        return default
+    requested = {field.strip() for field in raw.split(',') if field.strip()}
+    unknown = requested.difference(TREND_FIELDS)
+    if unknown:
+        raise FieldsError(f"Unknown fields: {', '.join(sorted(unknown))} "
+                          f"(available: {', '.join(TREND_FIELDS)})")
+    if not requested:
+        raise FieldsError('fields must name at least one field')
+    return tuple(field for field in TREND_FIELDS if field in requested)
+
+
+def _stored_fields(fields):
+    # id always comes first: it joins the reformulated queries and ends cursors
+    return ['id'] + [field for field in fields if field not in ('id', QUERIES_FIELD)]
+
+
+def trend_columns(dialect, fields=TREND_FIELDS):
+    """
+    Columns to select for serialize_trends(): id, then the stored fields
+    among ``fields`` in order. Callers may append further columns (e.g. a
+    cursor value); serialize_trends() ignores them.
+    """
+    columns = []
+    for field in _stored_fields(fields):
+        column = trends_table.c[field]
+        if field in TIMESTAMP_FIELDS and dialect.name == 'sqlite':
+            column = type_coerce(column, String).label(field)
+        columns.append(column)
+    return columns
+
+
+def reformulated_queries(executor, trend_ids):
+    """
+    Joined reformulated queries for the given trends, keyed by trend id.
+
+    ``executor`` is a connection or session, so the query runs wherever the
+    caller's rows came from (e.g. the replica).
+    """
+    queries = defaultdict(list)
+    trend_ids = list(trend_ids)
+    for start in range(0, len(trend_ids), IN_BATCH_SIZE):
+        rows = executor.execute(
+            select(queries_table.c.trend_id, queries_table.c.text)
+            .where(queries_table.c.trend_id.in_(trend_ids[start:start + IN_BATCH_SIZE]))
+            .order_by(queries_table.c.trend_id, queries_table.c.position)
+        )
+        for trend_id, text in rows:
+            queries[trend_id].append(text)
+    return {trend_id: ', '.join(texts) for trend_id, texts in queries.items()}
+
+
+def _isoformat(value):
+    if isinstance(value, str):
+        return value.replace(' ', 'T', 1)
+    return value.isoformat() if value is not None else None
+
+
+def serialize_trends(rows, queries=None, fields=TREND_FIELDS):
+    """
+    Trend dicts from rows selected with trend_columns(fields).
+
+    Parameters:
+        rows (iterable): Result tuples
+        queries (dict): reformulated_queries() for the rows; only used when
+            ``fields`` includes reformulated_queries
+        fields (tuple): Fields to include
+
+    Returns:
+        List of dicts, in row order
+    """
+    names = _stored_fields(fields)
+    timestamps = [field for field in names if field in TIMESTAMP_FIELDS]
+    with_queries = QUERIES_FIELD in fields
+    drop_id = 'id' not in fields
+    trends = []
+    for row in rows:
+        trend = dict(zip(names, row))
+        for field in timestamps:
+            trend[field] = _isoformat(trend[field])
+        if with_queries:
+            trend[QUERIES_FIELD] = queries.get(row[0], '')
+        if drop_id:
+            del trend['id']
+        trends.append(trend)
+    return trends
+
+
+def _stdlib_dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+JSON_BACKENDS = {'stdlib': _stdlib_dumps}
+if orjson is not None:
+    JSON_BACKENDS['orjson'] = orjson.dumps
+
+
+class JSONBackend:
+    """JSON encoder chosen once at startup: 'auto', 'orjson' or 'stdlib'"""
+
+    def __init__(self, name='auto'):
+        if name == 'auto':
+            name = 'orjson' if 'orjson' in JSON_BACKENDS else 'stdlib'
+        if name not in JSON_BACKENDS:
+            raise ValueError(f"Unknown or unavailable JSON backend '{name}' "
+                             f"(available: {', '.join(JSON_BACKENDS)})")
+        self.name = name
+        self.dumps = JSON_BACKENDS[name]
+
+    def response(self, value, status=200):
+        """application/json response for ``value``"""
+        return Response(self.dumps(value), status=status, mimetype='application/json')
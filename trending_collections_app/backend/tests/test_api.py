@@ -1,13 +1,32 @@
 import unittest
+import csv
+import gzip
+import io
 import json
 import sys
 import os
-from datetime import datetime
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
 
 # Add the parent directory to the path so we can import the app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import app, db
-from models import User, TrendingCollection
+from app import app, auth_cache, db, response_cache
+from hashing import HashingPool
+from serializers import JSON_BACKENDS, JSONBackend
+from routing import REPLICA_BIND, STICKY_COOKIE
+from assets import AssetManifest, IMMUTABLE_CACHE_CONTROL, precompress
+from werkzeug.http import http_date
+from werkzeug.security import check_password_hash, generate_password_hash
+from flask_jwt_extended import decode_token
+from models import User, TrendingCollection, ReformulatedQuery
+import bulk
+import changes
+from auth_cache import bump_user_version
+import rollups
+import versioning
 
 class ApiTestCase(unittest.TestCase):
     def setUp(self):
@@ -16,6 +35,7 @@ class ApiTestCase(unittest.TestCase):
         self.app.config['TESTING'] = True
         self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         self.client = self.app.test_client()
+        auth_cache.clear()
         
         with self.app.app_context():
             db.create_all()
@@ -81,6 +101,91 @@ class ApiTestCase(unittest.TestCase):
             json={'email': 'test@example.com', 'password': 'wrongpassword'})
         self.assertEqual(response.status_code, 401)
     
+    def test_login_rehashes_old_password_hash(self):
+        """Test hashes with an outdated work factor are upgraded on login"""
+        with self.app.app_context():
+            user = User.query.filter_by(email='test@example.com').first()
+            user.password_hash = generate_password_hash('password123', method='pbkdf2:sha256:1000')
+            db.session.commit()
+        
+        self.get_auth_token()
+        with self.app.app_context():
+            user = User.query.filter_by(email='test@example.com').first()
+            self.assertFalse(user.needs_rehash())
+            self.assertTrue(user.check_password('password123'))
+    
+    def test_login_when_hashing_saturated(self):
+        """Test login is shed with 503 and Retry-After when hashing is saturated"""
+        saturated = HashingPool(max_workers=1, max_queue=0)
+        release = threading.Event()
+        worker = threading.Thread(target=saturated.submit, args=(release.wait,))
+        worker.start()
+        try:
+            while saturated.stats()['pending'] == 0:
+                time.sleep(0.01)
+            with patch('app.hashing_pool', saturated):
+                response = self.client.post('/api/login',
+                    json={'email': 'test@example.com', 'password': 'password123'})
+        finally:
+            release.set()
+            worker.join()
+            saturated.shutdown()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(saturated.stats()['rejected'], 1)
+    
+    def test_reads_served_during_login_burst(self):
+        """Test reads are answered while a login burst queues on, and is shed by, the hashing pool"""
+        pool = HashingPool(max_workers=1, max_queue=1)
+        started, release = threading.Event(), threading.Event()
+        def slow_check(password_hash, password):
+            started.set()
+            release.wait(5)
+            return check_password_hash(password_hash, password)
+        
+        statuses = []
+        def login():
+            response = self.app.test_client().post('/api/login',
+                json={'email': 'test@example.com', 'password': 'password123'})
+            statuses.append(response.status_code)
+        
+        # Request threads need a database they can share
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmpdir, 'burst.db')}"
+            try:
+                with self.app.app_context():
+                    db.create_all()
+                    user = User(email='test@example.com', is_admin=False)
+                    user.set_password('password123')
+                    db.session.add(user)
+                    db.session.commit()
+                token = self.get_auth_token()
+                
+                burst = [threading.Thread(target=login) for _ in range(6)]
+                with patch('app.hashing_pool', pool), patch('app.check_password_hash', slow_check):
+                    try:
+                        for thread in burst:
+                            thread.start()
+                        started.wait(5)
+                        began = time.perf_counter()
+                        response = self.client.get('/api/trends', headers={'Authorization': f'Bearer {token}'})
+                        read_seconds = time.perf_counter() - began
+                        self.assertEqual(response.status_code, 200)
+                        self.assertFalse(release.is_set())
+                    finally:
+                        release.set()
+                        for thread in burst:
+                            thread.join()
+                        pool.shutdown()
+            finally:
+                with self.app.app_context():
+                    db.session.remove()
+                    db.get_engine(self.app).dispose()
+                self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.assertLess(read_seconds, 1)
+        # One hash running and one queued; the other logins were shed
+        self.assertEqual(sorted(statuses), [200, 200, 503, 503, 503, 503])
+    
     def test_register_success(self):
         """Test successful registration"""
         response = self.client.post('/api/register', 
@@ -123,6 +228,28 @@ class ApiTestCase(unittest.TestCase):
             headers={'Authorization': f'Bearer {token}'})
         self.assertEqual(response.status_code, 201)
     
+    def test_create_duplicate_trend(self):
+        """Test that (original_query, trend_topic) identifies a trend"""
+        token = self.get_auth_token()
+        duplicate = {
+            'original_query': 'Test Query',
+            'trend_topic': 'Test Topic',
+            'description': 'Duplicate Description',
+            'reformulated_queries': 'Duplicate Queries'
+        }
+        response = self.client.post('/api/trends',
+            json=duplicate,
+            headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 409)
+        
+        self.add_trends(1)
+        with self.app.app_context():
+            trend_id = TrendingCollection.query.filter_by(trend_topic='Topic 00').one().id
+        response = self.client.put(f'/api/trends/{trend_id}',
+            json={'original_query': 'Test Query', 'trend_topic': 'Test Topic'},
+            headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 409)
+    
     def test_update_trend(self):
         """Test updating a trend"""
         token = self.get_auth_token()
@@ -159,6 +286,50 @@ class ApiTestCase(unittest.TestCase):
             headers={'Authorization': f'Bearer {token}'})
         self.assertEqual(response.status_code, 200)
     
+    def test_login_role_claim(self):
+        """Test tokens carry the user's role as a claim"""
+        with self.app.app_context():
+            self.assertTrue(decode_token(self.get_auth_token(is_admin=True))['is_admin'])
+            self.assertFalse(decode_token(self.get_auth_token())['is_admin'])
+    
+    def test_role_change_invalidates_auth_cache(self):
+        """Test a promoted user must log in again before deleting"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        response = self.client.delete('/api/trends/1', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(auth_cache.stats()['users'], 1)
+        
+        with self.app.app_context():
+            user = User.query.filter_by(email='test@example.com').first()
+            user.is_admin = True
+            db.session.commit()
+        self.assertEqual(auth_cache.stats()['users'], 0)
+        
+        response = self.client.delete('/api/trends/1', headers=headers)
+        self.assertEqual(response.status_code, 401)
+        
+    def test_role_change_in_another_process(self):
+        """Test a role change that bypasses this worker's session reaches its auth cache"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        response = self.client.delete('/api/trends/1', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        
+        # Another worker commits the change with its own connection
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(User.__table__.update().values(is_admin=True))
+                bump_user_version(connection)
+        self.assertEqual(auth_cache.stats()['users'], 1)
+        
+        response = self.client.delete('/api/trends/1', headers=headers)
+        self.assertEqual(response.status_code, 401)
+        
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        response = self.client.delete('/api/trends/1', headers=headers)
+        self.assertEqual(response.status_code, 200)
+    
     def test_delete_trend_as_user(self):
         """Test deleting a trend as regular user (should fail)"""
         token = self.get_auth_token(is_admin=False)
@@ -173,5 +344,708 @@ class ApiTestCase(unittest.TestCase):
             headers={'Authorization': f'Bearer {token}'})
         self.assertEqual(response.status_code, 403)
 
+    def add_trends(self, count, original_query='Paged Query', category='Paged Category'):
+        """Helper method to seed additional trends"""
+        with self.app.app_context():
+            for i in range(count):
+                db.session.add(TrendingCollection(
+                    original_query=original_query,
+                    trend_topic=f'Topic {i:02d}',
+                    description='Paged Description',
+                    reformulated_queries='Paged Reformulated Queries',
+                    category=category
+                ))
+            db.session.commit()
+    
+    def test_get_trends_pagination(self):
+        """Test following next-page cursors through the whole collection"""
+        self.add_trends(5)
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        for sort in ('id', 'trend_topic', 'created_at', 'updated_at'):
+            seen = []
+            url = f'/api/trends?limit=2&sort={sort}&order=desc'
+            for _ in range(10):
+                if not url:
+                    break
+                response = self.client.get(url, headers=headers)
+                self.assertEqual(response.status_code, 200)
+                page = json.loads(response.data)
+                self.assertLessEqual(len(page), 2)
+                seen.extend(trend['id'] for trend in page)
+                cursor = response.headers.get('X-Next-Cursor')
+                url = f'/api/trends?limit=2&sort={sort}&order=desc&cursor={cursor}' if cursor else None
+            self.assertEqual(len(seen), 6)
+            self.assertEqual(len(set(seen)), 6)
+    
+    def test_get_trends_filter_and_sort(self):
+        """Test filtering by original query and category with server-side sorting"""
+        self.add_trends(3)
+        token = self.get_auth_token()
+        response = self.client.get('/api/trends?original_query=Paged%20Query&sort=trend_topic&order=desc',
+            headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([trend['trend_topic'] for trend in data], ['Topic 02', 'Topic 01', 'Topic 00'])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        
+        response = self.client.get('/api/trends?category=Test%20Category',
+            headers={'Authorization': f'Bearer {token}'})
+        data = json.loads(response.data)
+        self.assertEqual([trend['trend_topic'] for trend in data], ['Test Topic'])
+    
+    def test_get_trends_invalid_parameters(self):
+        """Test that bad sort, limit and cursor values are rejected"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        for query in ('sort=description', 'order=sideways', 'limit=0', 'limit=abc', 'cursor=not-a-cursor'):
+            response = self.client.get(f'/api/trends?{query}', headers=headers)
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_get_trends_by_reformulated_query(self):
+        """Test finding trends that contain a given reformulated query"""
+        token = self.get_auth_token()
+        self.client.post('/api/trends',
+            json={
+                'original_query': 'Socks for Men',
+                'trend_topic': 'Star Wars Argyle',
+                'description': 'Navy argyle socks',
+                'reformulated_queries': """Men's Star Wars Argyle Socks,
+                    Navy Argyle Socks""",
+                'category': 'Movie Theme'
+            },
+            headers={'Authorization': f'Bearer {token}'})
+        response = self.client.get('/api/trends?reformulated_query=navy%20ARGYLE%20socks',
+            headers={'Authorization': f'Bearer {token}'})
+        data = json.loads(response.data)
+        self.assertEqual([trend['trend_topic'] for trend in data], ['Star Wars Argyle'])
+        self.assertEqual(data[0]['reformulated_queries'], "Men's Star Wars Argyle Socks, Navy Argyle Socks")
+
+    def test_search_trends(self):
+        """Test ranked full-text search stays in sync with writes"""
+        token = self.get_auth_token(is_admin=True)
+        headers = {'Authorization': f'Bearer {token}'}
+        response = self.client.post('/api/trends',
+            json={
+                'original_query': 'Running Shoes',
+                'trend_topic': 'Neon Trainers',
+                'description': 'High-visibility running shoes',
+                'reformulated_queries': 'Fluorescent Training Shoes, Bright Orange Trainers',
+                'category': 'Athletic Wear'
+            },
+            headers=headers)
+        trend_id = json.loads(response.data)['id']
+        
+        # Matches on the topic and on reformulated queries, with prefix search
+        response = self.client.get('/api/trends/search?q=fluoresc', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([hit['id'] for hit in data], [trend_id])
+        self.assertIn('<mark>', data[0]['snippet'])
+        
+        response = self.client.get('/api/trends/search?q=neon', headers=headers)
+        data = json.loads(response.data)
+        self.assertEqual(data[0]['trend_topic'], '<mark>Neon</mark> Trainers')
+        
+        # Updates and deletes are reflected in the index
+        self.client.put(f'/api/trends/{trend_id}', json={'reformulated_queries': 'Glow Sneakers'}, headers=headers)
+        response = self.client.get('/api/trends/search?q=fluorescent', headers=headers)
+        self.assertEqual(json.loads(response.data), [])
+        response = self.client.get('/api/trends/search?q=glow', headers=headers)
+        self.assertEqual(len(json.loads(response.data)), 1)
+        
+        self.client.delete(f'/api/trends/{trend_id}', headers=headers)
+        response = self.client.get('/api/trends/search?q=glow', headers=headers)
+        self.assertEqual(json.loads(response.data), [])
+    
+    def test_search_highlights_are_escaped(self):
+        """Test stored markup is escaped in search highlights and snippets"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        response = self.client.post('/api/trends', headers=headers, json={
+            'original_query': 'Markup Query',
+            'trend_topic': '<script>alert(1)</script> Gadget',
+            'description': 'A <img src=x onerror=alert(1)> gadget & more',
+            'reformulated_queries': 'Gadget A'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get('/api/trends/search?q=gadget', headers=headers)
+        self.assertEqual(response.content_type, 'application/json')
+        hit = json.loads(response.data)[0]
+        self.assertEqual(hit['trend_topic'], '&lt;script&gt;alert(1)&lt;/script&gt; <mark>Gadget</mark>')
+        self.assertNotIn('<img', hit['snippet'])
+        self.assertNotIn('<script', hit['snippet'])
+        self.assertIn('<mark>', hit['snippet'])
+    
+    def test_search_trends_pagination(self):
+        """Test paging through search results with cursors"""
+        self.add_trends(5)
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        response = self.client.get('/api/trends/search?q=paged&limit=3', headers=headers)
+        first_page = json.loads(response.data)
+        self.assertEqual(len(first_page), 3)
+        cursor = response.headers['X-Next-Cursor']
+        
+        response = self.client.get(f'/api/trends/search?q=paged&limit=3&cursor={cursor}', headers=headers)
+        second_page = json.loads(response.data)
+        self.assertEqual(len(second_page), 2)
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        self.assertEqual(len({hit['id'] for hit in first_page + second_page}), 5)
+        
+        response = self.client.get('/api/trends/search?q=%22%2A', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get_trends(self):
+        """Test ETag revalidation returns 304 until the collection changes"""
+        token = self.get_auth_token(is_admin=True)
+        headers = {'Authorization': f'Bearer {token}'}
+        response = self.client.get('/api/trends', headers=headers)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        trend_id = json.loads(response.data)[0]['id']
+        
+        response = self.client.get('/api/trends', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        
+        # Single-trend reads share the collection version
+        response = self.client.get(f'/api/trends/{trend_id}', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        
+        # Every kind of write invalidates the ETag
+        writes = [
+            lambda: self.client.post('/api/trends', headers=headers, json={
+                'original_query': 'Q', 'trend_topic': 'T', 'description': 'D', 'reformulated_queries': 'R'}),
+            lambda: self.client.put(f'/api/trends/{trend_id}', headers=headers, json={'description': 'Changed'}),
+            lambda: self.client.delete(f'/api/trends/{trend_id}', headers=headers),
+        ]
+        for write in writes:
+            write()
+            response = self.client.get('/api/trends', headers={**headers, 'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+            etag = response.headers['ETag']
+
+    def test_if_modified_since_within_write_second(self):
+        """Test If-Modified-Since cannot hide a second write in the same second"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token(is_admin=True)}'}
+        with self.app.app_context():
+            _, written = versioning.current_version()
+        written = written.replace(microsecond=0)
+        
+        # Still inside the second of the last write: Last-Modified is held
+        # back a second and If-Modified-Since is not trusted
+        with patch('versioning._utcnow', return_value=written):
+            response = self.client.get('/api/trends', headers=headers)
+            self.assertEqual(response.last_modified.replace(tzinfo=None), written - timedelta(seconds=1))
+            response = self.client.get('/api/trends', headers={**headers, 'If-Modified-Since': http_date(written)})
+            self.assertEqual(response.status_code, 200)
+        
+        # Once the second is over, revalidation by date works
+        with patch('versioning._utcnow', return_value=written + timedelta(seconds=1)):
+            response = self.client.get('/api/trends', headers=headers)
+            self.assertEqual(response.last_modified.replace(tzinfo=None), written)
+            response = self.client.get('/api/trends', headers={**headers, 'If-Modified-Since': http_date(written)})
+            self.assertEqual(response.status_code, 304)
+    
+    def test_response_cache(self):
+        """Test repeated reads are served from cache until the version moves"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        hits = lambda: json.loads(self.client.get('/api/cache/stats', headers=headers).data)['hits']
+        
+        first = self.client.get('/api/trends', headers=headers)
+        before = hits()
+        second = self.client.get('/api/trends', headers=headers)
+        self.assertEqual(hits(), before + 1)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        
+        # A write made by another worker only shows up as a version bump
+        with self.app.app_context():
+            db.session.execute('UPDATE trending_collection SET trend_topic = \'Elsewhere\'')
+            versioning.bump_version(db.session.connection())
+            db.session.commit()
+        before = hits()
+        third = self.client.get('/api/trends', headers=headers)
+        self.assertEqual(hits(), before)
+        self.assertEqual(json.loads(third.data)[0]['trend_topic'], 'Elsewhere')
+
+    def test_bulk_upsert(self):
+        """Test bulk loading creates, updates and reports invalid rows"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        rows = [
+            {'original_query': 'Test Query', 'trend_topic': 'Test Topic', 'description': 'Upserted',
+             'reformulated_queries': 'New A, New B', 'category': 'Test Category'},
+            {'original_query': 'Bulk Query', 'trend_topic': 'Bulk Topic', 'description': 'Bulk',
+             'reformulated_queries': ['Bulk A', 'Bulk B']},
+            {'original_query': 'Bulk Query', 'trend_topic': 'Bulk Topic', 'description': 'Again',
+             'reformulated_queries': 'Bulk C'},
+            {'original_query': 'Bulk Query', 'description': 'No topic', 'reformulated_queries': 'X'},
+        ]
+        response = self.client.post('/api/trends/bulk', json=rows, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual((data['created'], data['updated'], data['errors']), (1, 1, 2))
+        self.assertEqual([result['status'] for result in data['results']], ['updated', 'created', 'error', 'error'])
+        
+        response = self.client.get('/api/trends?sort=trend_topic', headers=headers)
+        trends = {trend['trend_topic']: trend for trend in json.loads(response.data)}
+        self.assertEqual(trends['Test Topic']['description'], 'Upserted')
+        self.assertEqual(trends['Test Topic']['reformulated_queries'], 'New A, New B')
+        self.assertEqual(trends['Bulk Topic']['reformulated_queries'], 'Bulk A, Bulk B')
+        
+        # Bulk-loaded trends are searchable
+        response = self.client.get('/api/trends/search?q=bulk', headers=headers)
+        self.assertEqual([hit['trend_topic'] for hit in json.loads(response.data)], ['<mark>Bulk</mark> Topic'])
+    
+    def test_bulk_upsert_chunks_lookups(self):
+        """Test that batches larger than one IN list are looked up in chunks"""
+        count = bulk.LOOKUP_CHUNK_SIZE * 2 + 10
+        rows = [{'original_query': 'Chunk Query', 'trend_topic': f'Chunk Topic {i:04d}', 'description': 'D',
+                 'reformulated_queries': 'A, B'} for i in range(count)]
+        with self.app.app_context():
+            results = bulk.load_trends(db.engine, rows, batch_size=count)
+            self.assertEqual({result['status'] for result in results}, {'created'})
+            for row in rows:
+                row['reformulated_queries'] = 'C'
+            again = bulk.load_trends(db.engine, rows, batch_size=count)
+            self.assertEqual({result['status'] for result in again}, {'updated'})
+            self.assertEqual([result['id'] for result in again], [result['id'] for result in results])
+            self.assertEqual(TrendingCollection.query.filter_by(original_query='Chunk Query').count(), count)
+            self.assertEqual(ReformulatedQuery.query.filter_by(text='C').count(), count)
+            self.assertEqual(ReformulatedQuery.query.filter_by(text='A').count(), 0)
+    
+    def test_bulk_ndjson_insert_mode(self):
+        """Test NDJSON bodies and insert mode rejecting existing keys"""
+        token = self.get_auth_token()
+        body = '\n'.join([
+            json.dumps({'original_query': 'Test Query', 'trend_topic': 'Test Topic', 'description': 'D',
+                        'reformulated_queries': 'R'}),
+            '{not json',
+            json.dumps({'original_query': 'Line Query', 'trend_topic': 'Line Topic', 'description': 'D',
+                        'reformulated_queries': 'R'}),
+        ])
+        response = self.client.post('/api/trends/bulk?mode=insert', data=body,
+            content_type='application/x-ndjson', headers={'Authorization': f'Bearer {token}'})
+        data = json.loads(response.data)
+        self.assertEqual([result['status'] for result in data['results']], ['error', 'error', 'created'])
+        self.assertEqual(data['results'][0]['error'], 'Trend already exists')
+
+    def test_export_trends(self):
+        """Test streaming the catalogue as NDJSON and CSV"""
+        self.add_trends(3)
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        response = self.client.get('/api/trends/export', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], sorted(row['id'] for row in rows))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['reformulated_queries'], 'Test Reformulated Queries')
+        
+        response = self.client.get('/api/trends/export?format=csv', headers=headers)
+        self.assertEqual(response.mimetype, 'text/csv')
+        records = list(csv.DictReader(io.StringIO(response.data.decode())))
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[1]['trend_topic'], 'Topic 00')
+        
+        response = self.client.get('/api/trends/export?format=xml', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_replica_routing(self):
+        """Test reads use the replica except right after the user's own write"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: f"sqlite:///{os.path.join(tmpdir, 'replica.db')}"}
+            try:
+                with self.app.app_context():
+                    replica = db.get_engine(self.app, bind=REPLICA_BIND)
+                    db.metadata.create_all(replica)
+                    with replica.begin() as connection:
+                        connection.execute(TrendingCollection.__table__.insert().values(
+                            original_query='Replica Query', trend_topic='Replica Topic',
+                            description='Replica Description'))
+                
+                token = self.get_auth_token(is_admin=True)
+                headers = {'Authorization': f'Bearer {token}'}
+                response = self.client.get('/api/trends', headers=headers)
+                self.assertEqual([trend['trend_topic'] for trend in json.loads(response.data)], ['Replica Topic'])
+                
+                # The writer reads the primary for a while after writing
+                response = self.client.put('/api/trends/1', headers=headers,
+                    json={'trend_topic': 'Updated Topic'})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(STICKY_COOKIE, response.headers['Set-Cookie'])
+                response = self.client.get('/api/trends', headers=headers)
+                self.assertEqual([trend['trend_topic'] for trend in json.loads(response.data)], ['Updated Topic'])
+                
+                # Other users keep reading the replica
+                other = self.app.test_client()
+                response = other.get('/api/trends',
+                    headers={'Authorization': f'Bearer {self.get_auth_token()}'})
+                self.assertEqual([trend['trend_topic'] for trend in json.loads(response.data)], ['Replica Topic'])
+            finally:
+                with self.app.app_context():
+                    db.get_engine(self.app, bind=REPLICA_BIND).dispose()
+                del self.app.config['SQLALCHEMY_BINDS']
+
+    def test_static_assets(self):
+        """Test the SPA and hashed bundles are served from the asset manifest"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, 'static', 'js'))
+            with open(os.path.join(tmpdir, 'index.html'), 'w') as f:
+                f.write('<html>' + 'Trending Collections ' * 100 + '</html>')
+            with open(os.path.join(tmpdir, 'static', 'js', 'main.4ce46d40.js'), 'w') as f:
+                f.write('console.log("trends");' * 100)
+            precompress(tmpdir)
+            manifest = AssetManifest(tmpdir)
+            
+            with patch('app.asset_manifest', manifest):
+                response = self.client.get('/static/js/main.4ce46d40.js', headers={'Accept-Encoding': 'gzip'})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+                self.assertEqual(response.headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+                self.assertIn('Accept-Encoding', response.headers['Vary'])
+                response.close()
+                
+                response = self.client.get('/js/main.4ce46d40.js')
+                self.assertNotIn('Content-Encoding', response.headers)
+                self.assertTrue(response.data.startswith(b'console.log'))
+                response.close()
+                
+                # Client-side routes get index.html, revalidated by ETag
+                response = self.client.get('/dashboard')
+                self.assertIn(b'Trending Collections', response.data)
+                self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+                response = self.client.get('/dashboard', headers={'If-None-Match': response.headers['ETag']})
+                self.assertEqual(response.status_code, 304)
+
+    def test_health_probes(self):
+        """Test liveness, readiness and admin-only diagnostics"""
+        response = self.client.get('/api/health/live')
+        self.assertEqual(json.loads(response.data)['status'], 'ok')
+        
+        response = self.client.get('/api/health/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.data)['database'])
+        
+        response = self.client.get('/api/health/diagnostics',
+            headers={'Authorization': f'Bearer {self.get_auth_token()}'})
+        self.assertEqual(response.status_code, 403)
+        
+        headers = {'Authorization': f'Bearer {self.get_auth_token(is_admin=True)}'}
+        report = json.loads(self.client.get('/api/health/diagnostics', headers=headers).data)
+        refreshed = json.loads(self.client.get('/api/health/diagnostics?refresh=1', headers=headers).data)
+        self.assertIn('static', report)
+        self.assertTrue(refreshed['database']['ok'])
+        self.assertGreater(refreshed['generated_at'], report['generated_at'])
+
+    def test_metrics_endpoint(self):
+        """Test per-route request, DB and cache metrics are exported"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        self.client.get('/api/trends', headers=headers)
+        self.client.get('/api/trends/1', headers=headers)
+        
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.data.decode()
+        self.assertIn('http_requests_total{method="GET",route="/api/trends/<int:trend_id>",status="200"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{le="0.1",method="GET",route="/api/trends"}', body)
+        self.assertIn('db_queries_per_request_count{route="/api/trends"}', body)
+        self.assertIn('cache_events_total{cache="response",event="misses"}', body)
+        self.assertIn('password_hashing_total{outcome="completed"}', body)
+
+    def test_field_projection(self):
+        """Test fields= narrows the returned trends and skips unneeded queries"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        self.add_trends(4)
+        card_fields = {'id', 'trend_topic', 'original_query', 'category'}
+        self.app.config['SQL_PROFILING_HEADERS'] = True
+        try:
+            response = self.client.get('/api/trends?fields=id,trend_topic,original_query,category', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(all(set(trend) == card_fields for trend in json.loads(response.data)))
+            # Version check and page only: no reformulated query lookup
+            self.assertEqual(response.headers['X-DB-Queries'], '2')
+        finally:
+            self.app.config['SQL_PROFILING_HEADERS'] = False
+        
+        # Paging by a field that is not returned still works
+        topics = []
+        url = '/api/trends?fields=trend_topic&sort=created_at&order=desc&limit=2'
+        while url:
+            response = self.client.get(url, headers=headers)
+            page = json.loads(response.data)
+            self.assertTrue(all(list(trend) == ['trend_topic'] for trend in page))
+            topics += [trend['trend_topic'] for trend in page]
+            cursor = response.headers.get('X-Next-Cursor')
+            url = f'/api/trends?fields=trend_topic&sort=created_at&order=desc&limit=2&cursor={cursor}' if cursor else None
+        self.assertEqual(len(topics), 5)
+        self.assertEqual(len(set(topics)), 5)
+        
+        response = self.client.get('/api/trends/1?fields=reformulated_queries', headers=headers)
+        self.assertEqual(json.loads(response.data), {'reformulated_queries': 'Test Reformulated Queries'})
+        response = self.client.get('/api/trends/export?format=csv&fields=id,category', headers=headers)
+        self.assertEqual(response.get_data(as_text=True).splitlines()[0], 'id,category')
+        for url in ('/api/trends?fields=id,secret', '/api/trends/1?fields=,', '/api/trends/export?fields=nope'):
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 400)
+
+    def test_json_backends(self):
+        """Test every JSON backend returns the same trends"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        self.add_trends(5)
+        bodies = []
+        for name in JSON_BACKENDS:
+            response_cache.clear()
+            backend = JSONBackend(name)
+            with patch('app.json_backend', backend):
+                listed = self.client.get('/api/trends?sort=created_at', headers=headers)
+                single = self.client.get('/api/trends/1', headers=headers)
+                exported = self.client.get('/api/trends/export', headers=headers)
+            self.assertEqual(listed.content_type, 'application/json')
+            # NDJSON lines are encoded by the same backend
+            lines = exported.data.splitlines()
+            rows = [json.loads(line) for line in lines]
+            self.assertEqual(lines, [backend.dumps(row) for row in rows])
+            bodies.append((json.loads(listed.data), json.loads(single.data), rows))
+        trends, trend, rows = bodies[0]
+        self.assertEqual(sorted(rows, key=lambda row: row['id']), sorted(trends, key=lambda row: row['id']))
+        self.assertEqual(len(trends), 6)
+        self.assertEqual(trends[0], trend)
+        self.assertEqual(trend['reformulated_queries'], 'Test Reformulated Queries')
+        datetime.fromisoformat(trend['created_at'])
+        self.assertTrue(all(body == bodies[0] for body in bodies))
+
+    def test_slow_query_log_parameters(self):
+        """Test slow query parameters are opt-in and never logged for the user table"""
+        self.app.config['SQL_SLOW_QUERY_MS'] = 0
+        try:
+            with self.assertLogs('sql_profiler.slow') as logs:
+                token = self.get_auth_token()
+            self.assertTrue(all('parameters=[not logged]' in line for line in logs.output))
+            
+            self.app.config['SQL_SLOW_QUERY_LOG_PARAMETERS'] = True
+            with self.assertLogs('sql_profiler.slow') as logs:
+                self.get_auth_token()
+                self.client.get('/api/trends?original_query=Test+Query',
+                    headers={'Authorization': f'Bearer {token}'})
+            user_lines = [line for line in logs.output if 'FROM user ' in line]
+            self.assertTrue(user_lines)
+            self.assertTrue(all('parameters=[redacted]' in line for line in user_lines))
+            self.assertNotIn('test@example.com', '\n'.join(logs.output))
+            self.assertIn("'Test Query'", '\n'.join(logs.output))
+        finally:
+            self.app.config['SQL_SLOW_QUERY_MS'] = 100.0
+            self.app.config['SQL_SLOW_QUERY_LOG_PARAMETERS'] = False
+
+    def test_query_budgets(self):
+        """Test hot endpoints run a fixed number of SQL statements"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token(is_admin=True)}'}
+        self.add_trends(30)
+        self.app.config['SQL_PROFILING_HEADERS'] = True
+        try:
+            # Version check, page, reformulations for the whole page
+            response = self.client.get('/api/trends?limit=30', headers=headers)
+            self.assertEqual(response.headers['X-DB-Queries'], '3')
+            self.assertEqual(response.headers['X-DB-Repeated-Statements'], '0')
+            self.assertIn('db;dur=', response.headers['Server-Timing'])
+            response = self.client.get('/api/trends?limit=30', headers=headers)
+            self.assertEqual(response.headers['X-DB-Queries'], '1')
+            trend_id = json.loads(response.data)[0]['id']
+            
+            # The first delete loads the user into the auth cache
+            response = self.client.delete('/api/trends/999999', headers=headers)
+            self.assertEqual(response.status_code, 404)
+            
+            # User version check and the delete; the delete triggers clean
+            # up derived state, so this stays at 2 whatever is derived
+            response = self.client.delete(f'/api/trends/{trend_id}', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['X-DB-Queries'], '2')
+        finally:
+            self.app.config['SQL_PROFILING_HEADERS'] = False
+
+    def test_response_compression(self):
+        """Test API responses are gzip-compressed when accepted and large enough"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        self.add_trends(40)
+        plain = self.client.get('/api/trends?limit=40', headers=headers)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        
+        gzip_headers = dict(headers, **{'Accept-Encoding': 'gzip'})
+        compressed = self.client.get('/api/trends?limit=40', headers=gzip_headers)
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertLess(len(compressed.data), len(plain.data) // 3)
+        self.assertEqual(compressed.headers['ETag'], plain.headers['ETag'][:-1] + '-gzip"')
+        
+        # The compressed body is kept with the cache entry and reused
+        with patch('gzip.compress') as compress:
+            again = self.client.get('/api/trends?limit=40', headers=gzip_headers)
+        compress.assert_not_called()
+        self.assertEqual(again.data, compressed.data)
+        
+        # Either ETag revalidates
+        response = self.client.get('/api/trends?limit=40', headers=dict(
+            gzip_headers, **{'If-None-Match': compressed.headers['ETag']}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], compressed.headers['ETag'])
+        
+        # Small bodies and refused codings are sent uncompressed
+        response = self.client.get('/api/trends?limit=1', headers=gzip_headers)
+        self.assertNotIn('Content-Encoding', response.headers)
+        response = self.client.get('/api/trends?limit=40', headers=dict(headers, **{'Accept-Encoding': 'gzip;q=0'}))
+        self.assertNotIn('Content-Encoding', response.headers)
+        
+        # Streamed export is compressed incrementally
+        response = self.client.get('/api/trends/export?format=ndjson', headers=gzip_headers)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(response.data).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 41)
+
+    def test_trend_stats(self):
+        """Test the rollups behind /api/trends/stats follow every kind of write"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token(is_admin=True)}'}
+        self.add_trends(3)
+        self.add_trends(2, original_query='Other Query', category=None)
+        rows = [{'original_query': 'Bulk Query', 'trend_topic': 'Bulk Topic', 'description': 'Bulk',
+                 'reformulated_queries': 'Bulk A', 'category': 'Paged Category'},
+                {'original_query': 'Test Query', 'trend_topic': 'Test Topic', 'description': 'Moved',
+                 'reformulated_queries': 'Moved A', 'category': 'Moved Category'}]
+        self.assertEqual(self.client.post('/api/trends/bulk', json=rows, headers=headers).status_code, 200)
+        response = self.client.put('/api/trends/2', headers=headers, json={
+            'original_query': 'Other Query', 'trend_topic': 'Renamed', 'description': 'Renamed',
+            'reformulated_queries': 'Renamed A', 'category': 'Moved Category'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.delete('/api/trends/6', headers=headers).status_code, 200)
+        
+        response = self.client.get('/api/trends/stats', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.data)
+        self.assertEqual(stats['total'], 6)
+        self.assertEqual(stats['categories'], [
+            {'category': 'Paged Category', 'count': 3},
+            {'category': 'Moved Category', 'count': 2},
+            {'category': None, 'count': 1},
+        ])
+        self.assertEqual(stats['original_queries'], [
+            {'original_query': 'Other Query', 'count': 2},
+            {'original_query': 'Paged Query', 'count': 2},
+            {'original_query': 'Bulk Query', 'count': 1},
+            {'original_query': 'Test Query', 'count': 1},
+        ])
+        self.assertEqual(sum(day['created'] for day in stats['activity']), 6)
+        self.assertEqual(sum(day['updated'] for day in stats['activity']), 6)
+        
+        # Incremental maintenance agrees with a full rebuild
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                rollups.rebuild_rollups(connection)
+                self.assertEqual(rollups.trend_stats(connection), stats)
+        
+        response = self.client.get('/api/trends/stats', headers=dict(headers, **{'If-None-Match': response.headers['ETag']}))
+        self.assertEqual(response.status_code, 304)
+
+    def test_trend_facets(self):
+        """Test /api/trends/facets counts filter values and revalidates by version"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        self.add_trends(3)
+        self.add_trends(2, original_query='Other Query', category=None)
+        self.app.config['SQL_PROFILING_HEADERS'] = True
+        try:
+            response = self.client.get('/api/trends/facets', headers=headers)
+            # Version check and one rollup read, whatever the catalogue size
+            self.assertEqual(response.headers['X-DB-Queries'], '2')
+        finally:
+            self.app.config['SQL_PROFILING_HEADERS'] = False
+        self.assertEqual(json.loads(response.data), {
+            'original_query': [{'value': 'Other Query', 'count': 2}, {'value': 'Paged Query', 'count': 3},
+                               {'value': 'Test Query', 'count': 1}],
+            'category': [{'value': 'Paged Category', 'count': 3}, {'value': 'Test Category', 'count': 1},
+                         {'value': None, 'count': 2}],
+        })
+        etag = response.headers['ETag']
+        response = self.client.get('/api/trends/facets', headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        
+        response = self.client.post('/api/trends', headers=headers, json={
+            'original_query': 'New Query', 'trend_topic': 'New Topic', 'description': 'New',
+            'reformulated_queries': 'New A'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get('/api/trends/facets', headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 200)
+        facets = json.loads(response.data)
+        self.assertIn({'value': 'New Query', 'count': 1}, facets['original_query'])
+        self.assertIn({'value': None, 'count': 3}, facets['category'])
+
+    def sync_changes(self, headers, since=None, limit=2):
+        """Helper method to follow /api/trends/changes until it has no more pages"""
+        trends, deleted = {}, set()
+        while True:
+            url = f'/api/trends/changes?limit={limit}' + (f'&since={since}' if since else '')
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(response.data)
+            for trend in page['changes']:
+                trends[trend['id']] = trend
+                deleted.discard(trend['id'])
+            deleted.update(page['deleted'])
+            since = page['cursor']
+            if not page['has_more']:
+                return trends, deleted, since
+    
+    def test_trend_changes(self):
+        """Test delta sync returns changed trends and tombstones since a cursor"""
+        headers = {'Authorization': f'Bearer {self.get_auth_token(is_admin=True)}'}
+        self.add_trends(4)
+        trends, deleted, cursor = self.sync_changes(headers)
+        self.assertEqual(len(trends), 5)
+        self.assertEqual(deleted, set())
+        
+        # Nothing changed: same cursor, empty page
+        trends, deleted, same = self.sync_changes(headers, cursor)
+        self.assertEqual((trends, deleted, same), ({}, set(), cursor))
+        
+        response = self.client.put('/api/trends/2', headers=headers, json={
+            'original_query': 'Paged Query', 'trend_topic': 'Renamed', 'description': 'Renamed',
+            'reformulated_queries': 'Renamed A'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.delete('/api/trends/3', headers=headers).status_code, 200)
+        rows = [{'original_query': 'Bulk Query', 'trend_topic': 'Bulk Topic', 'description': 'Bulk',
+                 'reformulated_queries': 'Bulk A'}]
+        self.assertEqual(self.client.post('/api/trends/bulk', json=rows, headers=headers).status_code, 200)
+        
+        trends, deleted, cursor = self.sync_changes(headers, cursor)
+        self.assertEqual(sorted(trends), [2, 6])
+        self.assertEqual(trends[2]['trend_topic'], 'Renamed')
+        self.assertEqual(trends[6]['reformulated_queries'], 'Bulk A')
+        self.assertEqual(deleted, {3})
+        
+        # A full sync returns only live trends
+        trends, deleted, _ = self.sync_changes(headers)
+        self.assertEqual(sorted(trends), [1, 2, 4, 5, 6])
+        
+        # Pages differing in fields or limit have their own ETags
+        url = f'/api/trends/changes?since={cursor}'
+        etag = self.client.get(url, headers=headers).headers['ETag']
+        self.assertNotEqual(self.client.get(url + '&fields=id', headers=headers).headers['ETag'], etag)
+        self.assertNotEqual(self.client.get(url + '&limit=5', headers=headers).headers['ETag'], etag)
+        
+        # Cursors from before a log reset are refused, even by a client
+        # revalidating a page it already has
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                changes.reset_log(connection)
+        response = self.client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 410)
+        response = self.client.get('/api/trends/changes?since=bogus', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
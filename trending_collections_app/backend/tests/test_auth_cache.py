@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auth_cache import AuthCache, UserRecord
+
+class AuthCacheTestCase(unittest.TestCase):
+    def test_user_loader_called_once(self):
+        """Test user records are loaded on the first lookup only"""
+        calls = []
+        def loader(email):
+            calls.append(email)
+            return UserRecord(1, email, False)
+        cache = AuthCache()
+        cache.get_user('a@example.com', loader, 1)
+        cache.get_user('a@example.com', loader, 1)
+        self.assertEqual(calls, ['a@example.com'])
+        # Unknown users are not cached
+        cache.get_user('b@example.com', lambda email: None, 1)
+        self.assertEqual(cache.stats()['users'], 1)
+
+    def test_version_change_drops_records(self):
+        """Test records loaded at an older user version are not served"""
+        cache = AuthCache()
+        cache.get_user('a@example.com', lambda email: UserRecord(1, email, False), 1)
+        record = cache.get_user('a@example.com', lambda email: UserRecord(1, email, True), 2)
+        self.assertTrue(record.is_admin)
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        self.assertEqual(cache.stats()['version'], 2)
+
+    def test_invalidate_user(self):
+        """Test invalidating a user drops their record only"""
+        cache = AuthCache()
+        cache.get_user('a@example.com', lambda email: UserRecord(1, email, False), 1)
+        cache.get_user('b@example.com', lambda email: UserRecord(2, email, False), 1)
+        cache.invalidate_user('a@example.com')
+        self.assertEqual(cache.stats()['users'], 1)
+
+    def test_lru_eviction(self):
+        """Test the least recently used record is evicted when full"""
+        cache = AuthCache(max_entries=2)
+        for email in ('a', 'b', 'c'):
+            cache.get_user(email, lambda email: UserRecord(1, email, False), 1)
+        calls = []
+        cache.get_user('a', lambda email: calls.append(email) or UserRecord(1, email, False), 1)
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
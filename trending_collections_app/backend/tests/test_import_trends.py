@@ -0,0 +1,133 @@
+import unittest
+import csv
+import io
+import json
+import sys
+import os
+import tempfile
+
+from sqlalchemy import create_engine, text
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import db
+from import_trends import import_files, import_rows
+from generate_catalogue import generate_trends, write_csv
+import changes
+import rollups
+import search
+
+class ImportTrendsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Create an empty database file and input files before each test"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'import.db')}")
+        db.metadata.create_all(self.engine)
+
+        self.jsonl_path = os.path.join(self.tmpdir.name, 'trends.jsonl')
+        with open(self.jsonl_path, 'w') as f:
+            for i in range(25):
+                f.write(json.dumps({
+                    'original_query': 'Import Query',
+                    'trend_topic': f'Imported Topic {i:02d}',
+                    'description': 'Imported Description',
+                    'reformulated_queries': ['Imported A', 'Imported B'],
+                    'category': 'Import Category'
+                }) + '\n')
+            f.write('{not json\n')
+
+        self.csv_path = os.path.join(self.tmpdir.name, 'trends.csv')
+        with open(self.csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['original_query', 'trend_topic', 'description',
+                                                   'reformulated_queries', 'category'])
+            writer.writeheader()
+            writer.writerow({'original_query': 'Import Query', 'trend_topic': 'Imported Topic 00',
+                             'description': 'Updated From CSV', 'reformulated_queries': 'Csv A, Csv B',
+                             'category': 'Import Category'})
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def count_trends(self):
+        with self.engine.connect() as connection:
+            return connection.execute(text('SELECT COUNT(*) FROM trending_collection')).scalar()
+
+    def test_import_and_upsert(self):
+        """Test importing JSONL then upserting from CSV in small batches"""
+        totals = import_files(self.engine, [self.jsonl_path, self.csv_path], batch_size=10, out=io.StringIO())
+        self.assertEqual(totals['rows'], 27)
+        self.assertEqual(totals['created'], 25)
+        self.assertEqual(totals['updated'], 1)
+        self.assertEqual(totals['errors'], 1)
+        self.assertEqual(self.count_trends(), 25)
+
+        with self.engine.connect() as connection:
+            description = connection.execute(text(
+                "SELECT description FROM trending_collection WHERE trend_topic = 'Imported Topic 00'")).scalar()
+            self.assertEqual(description, 'Updated From CSV')
+            hits = search.search_trends(connection, search.build_match_query('csv'), 10)
+            self.assertEqual(len(hits), 1)
+
+    def test_fast_import_rebuilds_indexes(self):
+        """Test that a fast load restores deferred indexes, the search index, rollups and change log"""
+        totals = import_files(self.engine, [self.jsonl_path], batch_size=10, fast=True, out=io.StringIO())
+        self.assertEqual(totals['created'], 25)
+
+        with self.engine.connect() as connection:
+            index_names = {row[0] for row in connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"))}
+            self.assertIn('ix_trend_category_updated', index_names)
+            self.assertIn('ix_reformulated_query_normalized', index_names)
+            hits = search.search_trends(connection, search.build_match_query('imported topic'), 100)
+            self.assertEqual(len(hits), 25)
+            stats = rollups.trend_stats(connection)
+            self.assertEqual(stats['total'], 25)
+            self.assertEqual(stats['categories'], [{'category': 'Import Category', 'count': 25}])
+            # The change log restarts at the load, with every trend in it
+            trends, deleted, last, has_more = changes.read_changes(connection, limit=100)
+            self.assertEqual((len(trends), deleted, has_more), (25, [], False))
+            self.assertEqual(last[0], changes.horizon(connection))
+
+    def test_resume_from_checkpoint(self):
+        """Test that a checkpointed load skips rows committed by an earlier run"""
+        checkpoint = os.path.join(self.tmpdir.name, 'load.offset')
+        with open(checkpoint, 'w') as f:
+            f.write('20')
+
+        totals = import_files(self.engine, [self.jsonl_path], batch_size=10, checkpoint=checkpoint,
+                              out=io.StringIO())
+        self.assertEqual(totals['rows'], 6)
+        self.assertEqual(self.count_trends(), 5)
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), '26')
+
+    def test_generated_catalogue(self):
+        """Test generated catalogues are deterministic and load with their timestamps"""
+        rows = list(generate_trends(300, seed=7))
+        self.assertEqual(rows, list(generate_trends(300, seed=7)))
+        self.assertNotEqual(rows, list(generate_trends(300, seed=8)))
+        self.assertEqual(len({(row['original_query'], row['trend_topic']) for row in rows}), 300)
+
+        csv_path = os.path.join(self.tmpdir.name, 'generated.csv')
+        self.assertEqual(write_csv(rows, csv_path), 300)
+        totals = import_files(self.engine, [csv_path], batch_size=100, upsert=False, out=io.StringIO())
+        self.assertEqual(totals['created'], 300)
+        self.assertEqual(totals['errors'], 0)
+
+        with self.engine.connect() as connection:
+            first, last = connection.execute(text(
+                'SELECT MIN(created_at), MAX(updated_at) FROM trending_collection')).one()
+        self.assertEqual(first, rows[0]['created_at'].replace('T', ' '))
+        self.assertEqual(last, max(row['updated_at'] for row in rows).replace('T', ' '))
+
+    def test_invalid_timestamp_rejected(self):
+        """Test rows with unparseable timestamps are reported as errors"""
+        row = dict(next(generate_trends(1)), created_at='last tuesday')
+        totals = import_rows(self.engine, [row], out=io.StringIO())
+        self.assertEqual(totals['errors'], 1)
+        self.assertEqual(self.count_trends(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import tempfile
+
+from sqlalchemy import create_engine, inspect, text
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from migrations import LATEST_VERSION, current_version, upgrade
+
+# Schema of an app.db created before the migration runner existed
+LEGACY_SCHEMA = [
+    '''CREATE TABLE user (
+        id INTEGER NOT NULL PRIMARY KEY,
+        email VARCHAR(120) NOT NULL UNIQUE,
+        password_hash VARCHAR(256) NOT NULL,
+        is_admin BOOLEAN
+    )''',
+    '''CREATE TABLE trending_collection (
+        id INTEGER NOT NULL PRIMARY KEY,
+        original_query VARCHAR(200) NOT NULL,
+        trend_topic VARCHAR(200) NOT NULL,
+        description TEXT NOT NULL,
+        reformulated_queries TEXT NOT NULL,
+        category VARCHAR(100),
+        created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+    )''',
+    '''INSERT INTO trending_collection (original_query, trend_topic, description, reformulated_queries, category)
+       VALUES ('Legacy Query', 'Legacy Topic', 'Legacy Description', 'Legacy A,
+            Legacy B', 'Legacy Category')''',
+]
+
+class MigrationsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Create a legacy database file before each test"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'legacy.db')}")
+        with self.engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_upgrade_legacy_database(self):
+        """Test that migrations add indexes without losing data"""
+        self.assertEqual(current_version(self.engine), 0)
+        applied = upgrade(self.engine)
+        self.assertEqual(applied[-1], LATEST_VERSION)
+        self.assertEqual(current_version(self.engine), LATEST_VERSION)
+
+        index_names = {index['name'] for index in inspect(self.engine).get_indexes('trending_collection')}
+        for name in ('ux_trend_query_topic', 'ix_trend_category_updated', 'ix_trend_updated_id'):
+            self.assertIn(name, index_names)
+        self.assertNotIn('ix_trend_query_topic', index_names)
+
+        with self.engine.connect() as connection:
+            row = connection.execute(text('SELECT original_query, trend_topic FROM trending_collection')).one()
+            queries = connection.execute(text(
+                'SELECT position, text, normalized_text FROM reformulated_query ORDER BY position')).fetchall()
+        self.assertEqual(tuple(row), ('Legacy Query', 'Legacy Topic'))
+        self.assertEqual([tuple(query) for query in queries],
+                         [(0, 'Legacy A', 'legacy a'), (1, 'Legacy B', 'legacy b')])
+
+        columns = {column['name'] for column in inspect(self.engine).get_columns('trending_collection')}
+        self.assertNotIn('reformulated_queries', columns)
+
+    def test_upgraded_database_cleans_up_deleted_trends(self):
+        """Test that the delete triggers are added to existing databases"""
+        upgrade(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text('DELETE FROM trending_collection'))
+        with self.engine.connect() as connection:
+            counts = [connection.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+                      for table in ('reformulated_query', 'trend_search', 'trend_rollup_member')]
+            rollup_total = connection.execute(text('SELECT SUM(trend_count) FROM trend_rollup')).scalar()
+            change = connection.execute(text('SELECT deleted FROM trend_change')).one()
+        self.assertEqual(counts, [0, 0, 0])
+        self.assertEqual(rollup_total, 0)
+        self.assertTrue(change[0])
+
+    def test_upgrade_renames_duplicate_keys(self):
+        """Test that trends repeating a key are renamed, not dropped, before the unique index"""
+        with self.engine.begin() as connection:
+            connection.execute(text(LEGACY_SCHEMA[-1]))
+        upgrade(self.engine)
+
+        with self.engine.connect() as connection:
+            topics = connection.execute(text('SELECT id, trend_topic FROM trending_collection ORDER BY id')).fetchall()
+        self.assertEqual([tuple(row) for row in topics], [(1, 'Legacy Topic'), (2, 'Legacy Topic (2)')])
+        indexes = {index['name']: index for index in inspect(self.engine).get_indexes('trending_collection')}
+        self.assertTrue(indexes['ux_trend_query_topic']['unique'])
+
+    def test_upgrade_is_idempotent(self):
+        """Test that a second upgrade has nothing to apply"""
+        upgrade(self.engine)
+        self.assertEqual(upgrade(self.engine), [])
+        self.assertEqual(current_version(self.engine), LATEST_VERSION)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,7 @@ from datetime import datetime
 # Add the parent directory to the path so we can import the app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import app, db
-from models import User, TrendingCollection
+from models import User, TrendingCollection, ReformulatedQuery
 
 class ModelsTestCase(unittest.TestCase):
     def setUp(self):
@@ -120,5 +120,34 @@ class ModelsTestCase(unittest.TestCase):
             retrieved_trend = TrendingCollection.query.filter_by(trend_topic='Test Topic').first()
             self.assertIsNone(retrieved_trend)
 
+    def test_reformulated_queries_normalized(self):
+        """Test reformulated queries are stored as ordered, normalized child rows"""
+        with self.app.app_context():
+            trend = TrendingCollection(
+                original_query='Test Query',
+                trend_topic='Test Topic',
+                description='Test Description',
+                reformulated_queries="""First Query,
+                    Second  Query, , THIRD query""",
+                category='Test Category'
+            )
+            db.session.add(trend)
+            db.session.commit()
+            
+            rows = ReformulatedQuery.query.filter_by(trend_id=trend.id).order_by(ReformulatedQuery.position).all()
+            self.assertEqual([row.text for row in rows], ['First Query', 'Second Query', 'THIRD query'])
+            self.assertEqual([row.normalized_text for row in rows], ['first query', 'second query', 'third query'])
+            self.assertEqual(trend.reformulated_queries, 'First Query, Second Query, THIRD query')
+            
+            # Replacing the queries replaces the child rows
+            trend.reformulated_queries = 'Only Query'
+            db.session.commit()
+            self.assertEqual(ReformulatedQuery.query.filter_by(trend_id=trend.id).count(), 1)
+            
+            # Deleting the trend deletes its queries
+            db.session.delete(trend)
+            db.session.commit()
+            self.assertEqual(ReformulatedQuery.query.count(), 0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+import time
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from response_cache import ResponseCache
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def test_hit_and_version_mismatch(self):
+        """Test entries are only served for the version they were built at"""
+        cache = ResponseCache()
+        cache.set('key', 1, b'body')
+        self.assertEqual(cache.get('key', 1).body, b'body')
+        self.assertIsNone(cache.get('key', 2))
+        # The stale entry is dropped rather than kept around
+        self.assertIsNone(cache.get('key', 1))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stale']), (1, 2, 1))
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted when full"""
+        cache = ResponseCache(max_entries=2)
+        cache.set('a', 1, b'a')
+        cache.set('b', 1, b'b')
+        cache.get('a', 1)
+        cache.set('c', 1, b'c')
+        self.assertIsNotNone(cache.get('a', 1))
+        self.assertIsNone(cache.get('b', 1))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_byte_bound(self):
+        """Test the total body size stays within max_bytes"""
+        cache = ResponseCache(max_bytes=10)
+        cache.set('a', 1, b'x' * 6)
+        cache.set('b', 1, b'x' * 6)
+        cache.set('huge', 1, b'x' * 11)
+        self.assertIsNone(cache.get('a', 1))
+        self.assertIsNone(cache.get('huge', 1))
+        self.assertEqual(cache.stats()['bytes'], 6)
+
+    def test_ttl_expiry(self):
+        """Test entries expire after the TTL"""
+        cache = ResponseCache(ttl=0.01)
+        cache.set('key', 1, b'body')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('key', 1))
+        self.assertEqual(cache.stats()['expired'], 1)
+
+    def test_invalidate_by_tag(self):
+        """Test invalidation drops only the tagged entries"""
+        cache = ResponseCache()
+        cache.set('list', 1, b'list', tags=['trends'])
+        cache.set('one', 1, b'one', tags=['trend:1'])
+        cache.set('two', 1, b'two', tags=['trend:2'])
+        cache.invalidate('trends', 'trend:1')
+        self.assertIsNone(cache.get('list', 1))
+        self.assertIsNone(cache.get('one', 1))
+        self.assertIsNotNone(cache.get('two', 1))
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
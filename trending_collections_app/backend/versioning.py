@@ -0,0 +1,116 @@
+"""
+Collection Versioning and Conditional Requests
+
+A monotonically increasing collection version (the single row of the
+``collection_version`` table) is bumped in the same transaction as every
+change to the trend collection. Read endpoints derive strong ETags and
+Last-Modified from it, so a client revalidating an unchanged collection
+gets a 304 after a single primary-key lookup, without any trend rows being
+read or serialized.
+
+The bump happens in an ``after_flush`` session hook, which covers
+create_trend, update_trend and any other ORM writer, and the touched trends
+are logged for the change feed (changes.py) at the new version. Code that
+writes trends with Core statements must call ``bump_version`` itself
+(bulk.sync_derived_state does both). Deletes are bumped and logged by a
+delete trigger (see changes.py).
+
+Last-Modified only has second resolution, so a write later in the same
+second as a response would be invisible to If-Modified-Since. Until the
+second of the last write is over, responses carry a Last-Modified one
+second earlier and If-Modified-Since is not honoured; clients that
+revalidate with the ETag are unaffected.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import make_response, request
+from sqlalchemy import event, select, text
+
+import changes
+from compression import CODINGS, encoded_etag
+from models import db, CollectionVersion, trend_changes
+
+_BUMP = text(
+    'UPDATE collection_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1'
+)
+_CURRENT = select(CollectionVersion.version, CollectionVersion.updated_at).where(CollectionVersion.id == 1)
+
+
+def bump_version(connection):
+    """Advance the collection version (call inside the writing transaction)"""
+    connection.execute(_BUMP)
+
+
+def current_version(connection=None):
+    """
+    Read the collection version.
+    
+    Returns:
+        (version, last_modified) tuple; last_modified is a naive UTC datetime
+    """
+    connection = connection if connection is not None else db.session.connection()
+    version, updated_at = connection.execute(_CURRENT).one()
+    return version, updated_at
+
+
+@event.listens_for(db.session, 'after_flush')
+def _bump_on_trend_changes(session, flush_context):
+    changed = trend_changes(session)
+    if changed:
+        connection = session.connection()
+        bump_version(connection)
+        changes.record_changes(connection, changed)
+
+
+def make_etag(version, *variant):
+    """Strong ETag for a representation at the given collection version"""
+    return '-'.join(['v' + str(version)] + [str(part) for part in variant])
+
+
+def _utcnow():
+    return datetime.utcnow()
+
+
+def _http_last_modified(last_modified):
+    """
+    Last-Modified to send for ``last_modified``, and whether its second is
+    over (no later write can share it, so If-Modified-Since is reliable)
+    """
+    last_modified = last_modified.replace(microsecond=0)
+    if _utcnow().replace(microsecond=0) > last_modified:
+        return last_modified, True
+    return last_modified - timedelta(seconds=1), False
+
+
+def not_modified_response(etag, last_modified):
+    """
+    Return a 304 response if the request's validators match, else None.
+    
+    If-None-Match takes precedence over If-Modified-Since (RFC 7232). An
+    ETag of a compressed representation (see compression.py) matches too,
+    and is the one sent back with the 304. If-Modified-Since is only
+    honoured once the second of the last write is over.
+    """
+    if request.if_none_match:
+        candidates = [etag] + [encoded_etag(etag, coding) for coding in CODINGS]
+        matched = next((tag for tag in candidates if request.if_none_match.contains_weak(tag)), None)
+        etag = matched or etag
+    elif request.if_modified_since and last_modified:
+        sent, settled = _http_last_modified(last_modified)
+        matched = settled and sent <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        matched = False
+    if not matched:
+        return None
+    return set_validators(make_response('', 304), etag, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    """Attach ETag, Last-Modified and a revalidate-always cache policy"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _http_last_modified(last_modified)[0]
+    # Cacheable by the browser only, and always revalidated with the ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -6,7 +6,9 @@
  * 
  * Features:
  * - Create new trends with a form at the top of the page
- * - View trends with filtering by original query and sorting options
+ * - View trends with server-side filtering by original query, sorting and paging;
+ *   cards load only the fields they show, and the full trend is fetched for editing
+ * - Filter dropdown loaded from the facets endpoint, with trend counts
  * - Edit existing trends
  * - Delete trends (admin only)
  * - Success/error notifications
@@ -45,6 +47,9 @@ import {
   Logout as LogoutIcon
 } from '@mui/icons-material';
 
+// Trend fields shown on the cards; the rest are loaded when a card is edited
+const CARD_FIELDS = 'id,trend_topic,original_query,category';
+
 function Dashboard() {
   // UI state
   // No drawer needed anymore
@@ -52,9 +57,10 @@ function Dashboard() {
   
   // Data state
   const [trends, setTrends] = useState([]);
-  const [queries, setQueries] = useState([]);
+  const [queries, setQueries] = useState([]); // {value, count} facets
   const [selectedQuery, setSelectedQuery] = useState('');
   const [sortOrder, setSortOrder] = useState('asc'); // 'asc' or 'desc'
+  const [nextCursor, setNextCursor] = useState(null);
   const [error, setError] = useState(null);
   
   // Form state
@@ -81,24 +87,37 @@ function Dashboard() {
     severity: 'success'
   });
 
-  // Fetch trends data and check admin status when component mounts
+  // Check admin status when component mounts
   useEffect(() => {
-    fetchTrends();
     const adminStatus = localStorage.getItem('isAdmin') === 'true';
     setIsAdmin(adminStatus);
   }, []);
 
+  // Load the filter dropdown options once on mount
+  useEffect(() => {
+    fetchFacets();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
+  // Fetch the first page of trends whenever the filter or sort order changes
+  useEffect(() => {
+    fetchTrends();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [selectedQuery, sortOrder]);
+
   /**
-   * Fetches trending collections data from the API
+   * Fetches a page of trending collections data from the API
    * 
    * This function:
    * 1. Gets the authentication token from localStorage
-   * 2. Makes an authenticated request to the trends API
-   * 3. Processes the response data
-   * 4. Extracts unique queries for the filter dropdown
-   * 5. Handles any errors that occur during the process
+   * 2. Makes an authenticated request to the trends API, letting the server
+   *    filter by original query, sort by trend topic and paginate
+   * 3. Replaces the list (first page) or appends to it (cursor given)
+   * 4. Handles any errors that occur during the process
+   * 
+   * @param {string|null} cursor - X-Next-Cursor value of the previous page
    */
-  const fetchTrends = async () => {
+  const fetchTrends = async (cursor = null) => {
     try {
       // Get authentication token
       const token = localStorage.getItem('token');
@@ -108,8 +127,16 @@ function Dashboard() {
         return;
       }
 
+      const params = new URLSearchParams({ sort: 'trend_topic', order: sortOrder, fields: CARD_FIELDS });
+      if (selectedQuery) {
+        params.set('original_query', selectedQuery);
+      }
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+
       // Make authenticated API request
-      const response = await fetch('/api/trends', {
+      const response = await fetch(`/api/trends?${params.toString()}`, {
         method: 'GET',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -122,10 +149,8 @@ function Dashboard() {
         
         // Validate and process response data
         if (Array.isArray(data)) {
-          setTrends(data);
-          // Extract unique queries for filtering
-          const uniqueQueries = [...new Set(data.map(trend => trend.original_query))];
-          setQueries(uniqueQueries);
+          setTrends(cursor ? [...trends, ...data] : data);
+          setNextCursor(response.headers.get('X-Next-Cursor'));
           setError(null);
         } else {
           setError('Invalid data format received');
@@ -141,6 +166,40 @@ function Dashboard() {
     }
   };
 
+  /**
+   * Fetches the options of the original query filter dropdown
+   * 
+   * The facets endpoint returns every distinct original query with its
+   * trend count from counters kept by the server, so the dropdown loads in
+   * one small request however large the catalogue is.
+   */
+  const fetchFacets = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      
+      if (!token) {
+        return;
+      }
+
+      const response = await fetch('/api/trends/facets', {
+        method: 'GET',
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json',
+        }
+      });
+
+      if (response.ok) {
+        const data = await response.json();
+        if (Array.isArray(data.original_query)) {
+          setQueries(data.original_query);
+        }
+      }
+    } catch (error) {
+      // Keep the current options; the trend list reports connection errors
+    }
+  };
+
 
   // No drawer toggle needed
   
@@ -148,10 +207,43 @@ function Dashboard() {
     setSortOrder(sortOrder === 'asc' ? 'desc' : 'asc');
   };
   
-  const handleOpenDialog = (trend = null) => {
+  /**
+   * Opens the trend dialog
+   * 
+   * Cards only hold the fields they display, so editing first fetches the
+   * full trend (description and reformulated queries included).
+   * 
+   * @param {object|null} trend - Card to edit, or null to create a trend
+   */
+  const handleOpenDialog = async (trend = null) => {
     if (trend) {
-      setCurrentTrend({...trend});
-      setEditMode(true);
+      try {
+        const token = localStorage.getItem('token');
+        if (!token) {
+          showNotification('No authentication token found', 'error');
+          return;
+        }
+
+        const response = await fetch(`/api/trends/${trend.id}`, {
+          method: 'GET',
+          headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json',
+          }
+        });
+
+        if (!response.ok) {
+          const errorData = await response.json();
+          showNotification(errorData.error || 'Failed to load trend', 'error');
+          return;
+        }
+        const data = await response.json();
+        setCurrentTrend({...data, category: data.category || ''});
+        setEditMode(true);
+      } catch (error) {
+        showNotification('Error connecting to the server', 'error');
+        return;
+      }
     } else {
       setCurrentTrend({
         original_query: '',
@@ -259,6 +351,7 @@ function Dashboard() {
         const message = editMode ? 'Trend updated successfully' : 'Trend created successfully';
         showNotification(message, 'success');
         fetchTrends();
+        fetchFacets();
         handleCloseDialog();
       } else {
         const errorData = await response.json();
@@ -307,6 +400,7 @@ function Dashboard() {
       if (response.ok) {
         showNotification('Trend deleted successfully', 'success');
         fetchTrends();
+        fetchFacets();
       } else {
         const errorData = await response.json();
         showNotification(errorData.error || 'Delete operation failed', 'error');
@@ -464,9 +558,9 @@ function Dashboard() {
               <MenuItem value="">
                 <em>All Queries</em>
               </MenuItem>
-              {queries.map((query, index) => (
-                <MenuItem key={index} value={query}>
-                  {query}
+              {queries.map((facet) => (
+                <MenuItem key={facet.value} value={facet.value}>
+                  {facet.value} ({facet.count})
                 </MenuItem>
               ))}
             </Select>
@@ -484,14 +578,6 @@ function Dashboard() {
         {/* Trends Grid */}
         <Grid container spacing={3} sx={{ justifyContent: 'center' }}>
           {trends
-            .filter(trend => !selectedQuery || trend.original_query === selectedQuery)
-            .sort((a, b) => {
-              if (sortOrder === 'asc') {
-                return a.trend_topic.localeCompare(b.trend_topic);
-              } else {
-                return b.trend_topic.localeCompare(a.trend_topic);
-              }
-            })
             .map((trend) => (
               <Grid item xs={12} md={4} key={trend.id} sx={{ width: '350px' }}>
                 <Card sx={{ 
@@ -499,7 +585,7 @@ function Dashboard() {
                   width: '100%',
                   display: 'flex',
                   flexDirection: 'column',
-                  height: 280
+                  height: 180
                 }}>
                   <CardContent sx={{ 
                     flexGrow: 1,
@@ -511,23 +597,6 @@ function Dashboard() {
                     <Typography variant="body2" color="text.secondary">
                       Original Query: {trend.original_query}
                     </Typography>
-                    <Typography variant="body2" sx={{ 
-                      maxHeight: '100px',
-                      overflow: 'auto',
-                      mb: 2,
-                      mt: 1
-                    }}>
-                      {trend.description || 'No description available'}
-                    </Typography>
-                    <Typography variant="body2" color="text.secondary">
-                      Reformulated Queries:
-                    </Typography>
-                    <Typography variant="body2" sx={{ 
-                      maxHeight: '60px',
-                      overflow: 'auto'
-                    }}>
-                      {trend.reformulated_queries}
-                    </Typography>
                     {trend.category && (
                       <Typography variant="body2" color="text.secondary" sx={{ mt: 1 }}>
                         Category: {trend.category}
@@ -560,6 +629,14 @@ function Dashboard() {
             ))}
         </Grid>
 
+        {nextCursor && (
+          <Box sx={{ display: 'flex', justifyContent: 'center', mt: 3 }}>
+            <Button variant="outlined" onClick={() => fetchTrends(nextCursor)}>
+              Load more
+            </Button>
+          </Box>
+        )}
+
         <Dialog open={openDialog} onClose={handleCloseDialog} maxWidth="md" fullWidth>
           <DialogTitle>{editMode ? 'Edit Trend' : 'Add New Trend'}</DialogTitle>
           <DialogContent>